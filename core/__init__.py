@@ -1,4 +0,0 @@
-# core/__init__.py
-
-from .ai_backend import QwenWorker
-from .image_utils import cv2_to_qpixmap, pil_to_qpixmap, load_thumbnail
\ No newline at end of file
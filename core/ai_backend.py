@@ -2,20 +2,48 @@ import os
 import platform
 import torch
 import gc
+import time
+import threading
 from PySide6.QtCore import QObject, Signal
-from core.image_utils import image_to_base64
+from core.image_utils import image_to_base64, open_image_rgb, pil_to_base64
+from core.model_manager import MODEL_MANAGER
+
+FUSED_HINT = "\n\nHint: an image tagger detected these tags (they may be incomplete or wrong): {tags}"
+
+# --- SHARED LOCAL MODEL ---
+# The loaded Qwen model outlives individual workers so consecutive batches
+# reuse it. The model manager unloads it after it sits idle.
+_qwen_lock = threading.Lock()
+_qwen = {"path": None, "model": None, "processor": None, "device": "cpu", "nbytes": 0}
+
+def unload_qwen_model():
+    with _qwen_lock:
+        _qwen.update(path=None, model=None, processor=None, nbytes=0)
+    gc.collect()
+    try:
+        import torch
+        if torch.cuda.is_available(): torch.cuda.empty_cache()
+    except: pass
+
+def qwen_resident_bytes():
+    return _qwen["nbytes"] if _qwen["model"] is not None else 0
+
+MODEL_MANAGER.register("qwen", "Qwen VL (Captioning)", unload_qwen_model, qwen_resident_bytes)
 
 class QwenWorker(QObject):
     finished = Signal(str, str) # file_path, caption
     error = Signal(str)
     progress = Signal(str)      # Log messages
     
-    def __init__(self, model_path, file_paths, prompt, params=None, api_config=None):
+    def __init__(self, model_path, file_paths, prompt, params=None, api_config=None, fused=None):
         super().__init__()
         self.file_paths = file_paths
         self.prompt = prompt
         self.params = params or {} 
         self.api_config = api_config 
+        # Optional WD14 pass sharing the decoded image:
+        # {"tagger", "threshold", "max_tags", "blacklist", "hints", "output"}
+        self.fused = fused
         
         self.model_path = model_path
         self.model = None
@@ -47,11 +75,21 @@ class QwenWorker(QObject):
                 self.device = "cpu"
                 self.progress.emit("⚠️ GPU NOT DETECTED! Falling back to CPU.")
 
-            self.progress.emit(f"📂 Loading model: {self.model_path}")
-
             if os.path.isfile(self.model_path):
                  self.model_path = os.path.dirname(self.model_path)
 
+            with _qwen_lock:
+                if _qwen["model"] is not None and _qwen["path"] == self.model_path:
+                    self.model = _qwen["model"]
+                    self.processor = _qwen["processor"]
+                    self.device = _qwen["device"]
+                    self.progress.emit("✅ Model already loaded, reusing it.")
+                    return True
+
+            # Switching models: free the old one first
+            unload_qwen_model()
+            self.progress.emit(f"📂 Loading model: {self.model_path}")
+
             self.processor = AutoProcessor.from_pretrained(self.model_path, trust_remote_code=True)
             self.model = AutoModelForImageTextToText.from_pretrained(
                 self.model_path,
@@ -64,14 +102,20 @@ class QwenWorker(QObject):
                 self.model.to(self.device)
             
             self.model.eval()
+            nbytes = sum(p.numel() * p.element_size() for p in self.model.parameters())
+            nbytes += sum(b.numel() * b.element_size() for b in self.model.buffers())
+            with _qwen_lock:
+                _qwen.update(path=self.model_path, model=self.model, processor=self.processor,
+                             device=self.device, nbytes=nbytes)
             self.progress.emit("✅ Model loaded!")
             return True
         except Exception as e:
             self.error.emit(f"Failed to load local model: {str(e)}")
             return False
 
-    def run_api_inference(self, client, fpath):
-        b64_img = image_to_base64(fpath)
+    def run_api_inference(self, client, fpath, image=None, prompt=None):
+        prompt = prompt or self.prompt
+        b64_img = pil_to_base64(image) if image is not None else image_to_base64(fpath)
         if not b64_img: raise Exception("Failed to encode image to Base64")
 
         try:
@@ -82,7 +126,7 @@ class QwenWorker(QObject):
                     {
                         "role": "user",
                         "content": [
-                            {"type": "text", "text": self.prompt},
+                            {"type": "text", "text": prompt},
                             {"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{b64_img}"}},
                         ],
                     }
@@ -100,13 +144,15 @@ class QwenWorker(QObject):
         except Exception as e:
             raise Exception(f"API Call Failed: {e}")
 
-    def run_local_inference(self, fpath):
+    def run_local_inference(self, fpath, image=None, prompt=None):
         import torch
         from qwen_vl_utils import process_vision_info
         
+        # process_vision_info accepts an in-memory PIL image as well as a path
         messages = [{
             "role": "user",
-            "content": [{"type": "image", "image": fpath}, {"type": "text", "text": self.prompt}]
+            "content": [{"type": "image", "image": image if image is not None else fpath},
+                        {"type": "text", "text": prompt or self.prompt}]
         }]
         text = self.processor.apply_chat_template(messages, tokenize=False, add_generation_prompt=True)
         image_inputs, video_inputs = process_vision_info(messages)
@@ -131,6 +177,16 @@ class QwenWorker(QObject):
         )[0]
 
     def run(self):
+        if self.api_config is not None:
+            self.run_batch()
+            return
+        with MODEL_MANAGER.in_use("qwen"):
+            self.run_batch()
+        # Let the model manager decide when the shared model goes away
+        self.model = None
+        self.processor = None
+
+    def run_batch(self):
         is_api = self.api_config is not None
         
         if is_api:
@@ -147,14 +203,19 @@ class QwenWorker(QObject):
                 if not self.load_local_model(): return
 
         total = len(self.file_paths)
+        timings = {"decode": 0.0, "wd14": 0.0, "vlm": 0.0}
         for i, fpath in enumerate(self.file_paths):
             if not self.running: break
             try:
-                if is_api:
+                if self.fused:
+                    output_text = self.run_fused(client if is_api else None, fpath, timings)
+                elif is_api:
                     output_text = self.run_api_inference(client, fpath)
                 else:
                     output_text = self.run_local_inference(fpath)
                 
+                if not is_api: MODEL_MANAGER.touch("qwen")
+                
                 # Check running again after potentially long blocking call
                 if self.running: 
                     self.finished.emit(fpath, output_text)
@@ -162,15 +223,55 @@ class QwenWorker(QObject):
                 
             except Exception as e:
                 self.error.emit(f"Error on {os.path.basename(fpath)}: {str(e)}")
+
+        if self.fused and self.running:
+            self.progress.emit(
+                f"⏱️ Fused pass: decode {timings['decode']:.1f}s, WD14 {timings['wd14']:.1f}s, VLM {timings['vlm']:.1f}s"
+            )
+
+    def run_fused(self, client, fpath, timings):
+        """Decodes once, tags with WD14, then captions the same in-memory image."""
+        t0 = time.perf_counter()
+        image = open_image_rgb(fpath)
+        t1 = time.perf_counter()
+
+        fused = self.fused
+        tags = fused['tagger'].tag_pil_image(
+            image,
+            threshold=fused['threshold'],
+            max_tags=fused['max_tags'],
+            blacklist=fused.get('blacklist')
+        )
+        t2 = time.perf_counter()
+
+        prompt = self.prompt
+        if fused.get('hints') and tags:
+            prompt += FUSED_HINT.format(tags=", ".join(tags))
+
+        if client is not None:
+            caption = self.run_api_inference(client, fpath, image, prompt)
+        else:
+            caption = self.run_local_inference(fpath, image, prompt)
+        t3 = time.perf_counter()
+
+        timings['decode'] += t1 - t0
+        timings['wd14'] += t2 - t1
+        timings['vlm'] += t3 - t2
+
+        caption = caption.strip()
+        tag_text = ", ".join(tags)
+        if not tag_text or fused.get('output') == 'hints':
+            return caption
+        if fused.get('output') == 'append':
+            return f"{caption}, {tag_text}" if caption else tag_text
+        return f"{tag_text}, {caption}" if caption else tag_text
     
     def stop(self):
+        # Only drops this worker's references; the shared model is released
+        # by unload_qwen_model() (Free VRAM button or idle timeout)
         self.running = False
-        try:
-            import torch
-            if torch.cuda.is_available(): torch.cuda.empty_cache()
-        except: pass
         self.model = None
-        gc.collect()
+        self.processor = None
 
 # --- DOWNLOAD WORKER (Unchanged) ---
 class DownloadWorker(QObject):
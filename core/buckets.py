@@ -0,0 +1,106 @@
+import os
+import json
+import math
+import numpy as np
+from core import edit_ops
+
+# No Qt imports: only plans jobs, the resize/crop itself runs through edit_ops in the process pool.
+
+MANIFEST_FILE = "buckets.json"
+PRESETS = {
+    "SD 1.5 (512²)": 512,
+    "SD 2.x (768²)": 768,
+    "SDXL / Flux (1024²)": 1024,
+}
+DEFAULT_STEP = 64
+
+def make_buckets(resolution=1024, step=DEFAULT_STEP):
+    """
+    Every (w, h) with sides a multiple of `step` and an area of at most resolution², sides
+    between resolution / 4 and resolution * 2 (the kohya-ss layout). Sorted by aspect ratio.
+    """
+    max_area = resolution * resolution
+    min_side = max(step, resolution // 4 // step * step)
+    max_side = resolution * 2
+    side = int(math.sqrt(max_area)) // step * step
+    buckets = {(side, side)}
+    w = min_side
+    while w <= max_side:
+        h = min(max_side, max_area // w // step * step)
+        if h >= min_side:
+            buckets.add((w, h))
+            buckets.add((h, w))
+        w += step
+    # Same ratio twice: keep the larger bucket
+    by_ratio = {}
+    for w, h in sorted(buckets, key=lambda b: b[0] * b[1]):
+        by_ratio[w / h] = (w, h)
+    return [by_ratio[r] for r in sorted(by_ratio)]
+
+def own_bucket(w, h, resolution, step):
+    """No-upscale bucket: the image scaled down to the area limit, sides floored to `step`."""
+    scale = min(1.0, resolution / math.sqrt(w * h))
+    bw, bh = int(w * scale) // step * step, int(h * scale) // step * step
+    return (bw, bh) if bw and bh else None
+
+def assign(sizes, resolution=1024, step=DEFAULT_STEP, upscale=True):
+    """
+    [(w, h)] -> [(bw, bh) or None], the bucket with the nearest aspect ratio (compared in log
+    space, so 2:1 and 1:2 are equally far from square). Without `upscale`, images smaller than
+    their bucket get a bucket of their own; None means too small for any.
+    """
+    if not sizes:
+        return []
+    buckets = make_buckets(resolution, step)
+    ratios = np.log([w / h for w, h in buckets])
+    dims = np.asarray(sizes, dtype=np.float64)
+    wanted = np.log(dims[:, 0] / dims[:, 1])
+    # Buckets are sorted by ratio: the nearest is one of the two around the insertion point
+    right = np.clip(np.searchsorted(ratios, wanted), 1, len(ratios) - 1)
+    left = right - 1
+    nearest = np.where(wanted - ratios[left] <= ratios[right] - wanted, left, right)
+
+    result = []
+    for (w, h), i in zip(sizes, nearest.tolist()):
+        bw, bh = buckets[i]
+        if not upscale and (w < bw or h < bh):
+            result.append(own_bucket(w, h, resolution, step))
+        else:
+            result.append((bw, bh))
+    return result
+
+def histogram(buckets):
+    """[(bw, bh) or None] -> [((bw, bh), count)], widest first."""
+    counts = {}
+    for bucket in buckets:
+        if bucket:
+            counts[bucket] = counts.get(bucket, 0) + 1
+    return sorted(counts.items(), key=lambda item: -item[0][0] / item[0][1])
+
+def cover_size(w, h, bw, bh):
+    """Smallest resize of (w, h) that still covers the bucket on both sides."""
+    scale = max(bw / w, bh / h)
+    return max(bw, round(w * scale)), max(bh, round(h * scale))
+
+def bucket_steps(w, h, bucket, focus="Center"):
+    """Resize to cover the bucket, then crop the overflow: one decode and one encode per image."""
+    bw, bh = bucket
+    cw, ch = cover_size(w, h, bw, bh)
+    return [edit_ops.make_step('resize', {'mode': 'force', 'w': cw, 'h': ch}),
+            edit_ops.make_step('crop', {'w': bw, 'h': bh, 'focus': focus})]
+
+def write_manifest(path, settings, images):
+    """
+    images: [(source path, output path, (w, h), (bw, bh))]. Written next to the outputs as
+    {"settings", "buckets": {"WxH": count}, "images": [{file, source, size, bucket}]}.
+    """
+    manifest = {
+        "settings": settings,
+        "buckets": {f"{bw}x{bh}": count for (bw, bh), count in histogram([img[3] for img in images])},
+        "images": [{"file": os.path.basename(out), "source": src, "size": list(size), "bucket": list(bucket)}
+                   for src, out, size, bucket in images],
+    }
+    tmp = path + ".tmp"
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=4)
+    os.replace(tmp, path)
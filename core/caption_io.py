@@ -0,0 +1,32 @@
+import os
+
+# Plain file helpers for caption sidecars. No Qt imports: also used inside the process pool.
+
+def caption_path(image_path):
+    return os.path.splitext(image_path)[0] + ".txt"
+
+def parse_tags(text):
+    """'a, b ,c' -> ['a', 'b', 'c'], case preserved."""
+    return [t.strip() for t in text.split(',') if t.strip()]
+
+def read_caption(image_path):
+    try:
+        with open(caption_path(image_path), 'r', encoding='utf-8') as f:
+            return f.read()
+    except FileNotFoundError:
+        return ""
+    except Exception as e:
+        print(f"Error reading caption for {image_path}: {e}")
+        return ""
+
+def write_atomic(path, text):
+    """Write to a sibling temp file, then rename over the target so readers never see half a caption."""
+    tmp = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp, 'w', encoding='utf-8') as f:
+            f.write(text)
+        os.replace(tmp, path)
+    except Exception:
+        try: os.remove(tmp)
+        except OSError: pass
+        raise
@@ -0,0 +1,130 @@
+from PySide6.QtCore import QObject, Signal
+from core.caption_io import read_caption, parse_tags
+from core.caption_writer import CAPTION_WRITER
+
+class CaptionEntry:
+    __slots__ = ("text", "saved_text", "_tags")
+
+    def __init__(self, text, saved_text=None):
+        self.text = text
+        self.saved_text = text if saved_text is None else saved_text
+        self._tags = None
+
+    @property
+    def tags(self):
+        if self._tags is None:
+            self._tags = parse_tags(self.text)
+        return self._tags
+
+    @property
+    def dirty(self):
+        return self.text != self.saved_text
+
+class CaptionStore(QObject):
+    """
+    Caption text keyed by image path, independent of any widget. Edits, batch
+    operations and undo commands write here; views listen to `changed`, which
+    fires once per operation with the list of paths whose text actually changed.
+    """
+    changed = Signal(list)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.entries = {}
+        CAPTION_WRITER.failed.connect(self.on_write_failed)
+
+    def __contains__(self, path):
+        return path in self.entries
+
+    def __len__(self):
+        return len(self.entries)
+
+    def paths(self):
+        return list(self.entries)
+
+    # --- LOADING ---
+    def load(self, paths, texts=None):
+        """Replaces the store contents with the sidecar captions of `paths` ({path: text} if already known)."""
+        if texts is None:
+            texts = {path: read_caption(path) for path in paths}
+        self.entries = {path: CaptionEntry(texts[path]) for path in paths}
+        self.changed.emit(list(self.entries))
+
+    def clear(self):
+        self.entries.clear()
+
+    def remove(self, path):
+        self.entries.pop(path, None)
+
+    # --- READ ---
+    def text(self, path):
+        entry = self.entries.get(path)
+        return entry.text if entry else ""
+
+    def texts(self, paths):
+        return [self.text(p) for p in paths]
+
+    def tags(self, path):
+        entry = self.entries.get(path)
+        return entry.tags if entry else []
+
+    # --- WRITE ---
+    def set(self, path, text):
+        return self.set_many({path: text})
+
+    def set_many(self, texts):
+        """{path: text} -> list of paths that changed. Emits `changed` once."""
+        changed = []
+        entries = self.entries
+        for path, text in texts.items():
+            entry = entries.get(path)
+            if entry is None:
+                entries[path] = CaptionEntry(text, saved_text="")
+            elif entry.text == text:
+                continue
+            else:
+                entry.text = text
+                entry._tags = None
+            changed.append(path)
+        if changed:
+            self.changed.emit(changed)
+        return changed
+
+    def set_saved(self, texts):
+        """{path: text} that is already on disk (written elsewhere): updates text and saved state."""
+        changed = self.set_many({p: t for p, t in texts.items() if p in self.entries})
+        for path, text in texts.items():
+            entry = self.entries.get(path)
+            if entry:
+                entry.saved_text = text
+        return changed
+
+    # --- PERSISTENCE ---
+    def is_dirty(self, path):
+        entry = self.entries.get(path)
+        return bool(entry and entry.dirty)
+
+    def dirty_paths(self):
+        return [p for p, e in self.entries.items() if e.dirty]
+
+    def mark_saved(self, path, text):
+        entry = self.entries.get(path)
+        if entry:
+            entry.saved_text = text
+
+    def save(self, path):
+        """Queues the caption on the background writer if it changed. Returns True if queued."""
+        entry = self.entries.get(path)
+        if entry is None or not entry.dirty:
+            return False
+        CAPTION_WRITER.write(path, entry.text)
+        entry.saved_text = entry.text
+        return True
+
+    def save_dirty(self):
+        return sum(1 for path in self.dirty_paths() if self.save(path))
+
+    def on_write_failed(self, path, error):
+        entry = self.entries.get(path)
+        if entry:
+            entry.saved_text = None  # Dirty again so the next save retries
@@ -0,0 +1,58 @@
+import atexit
+import threading
+from PySide6.QtCore import QObject, Signal
+from core.caption_io import caption_path, write_atomic
+
+class CaptionWriter(QObject):
+    """
+    Write-behind persistence for caption sidecars. write() only records the
+    latest text per file and returns; a single background thread drains the
+    queue, so repeated edits of the same caption collapse into one write.
+    """
+    failed = Signal(str, str)  # image path, error
+
+    def __init__(self):
+        super().__init__()
+        self.pending = {}
+        self.in_flight = 0
+        self.cond = threading.Condition()
+        self.thread = None
+
+    def write(self, image_path, text):
+        with self.cond:
+            self.pending[image_path] = text
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self._run, name="CaptionWriter", daemon=True)
+                self.thread.start()
+            self.cond.notify_all()
+
+    def pending_count(self):
+        with self.cond:
+            return len(self.pending) + self.in_flight
+
+    def flush(self, timeout=None):
+        """Blocks until everything queued so far is on disk. Returns False on timeout."""
+        with self.cond:
+            return self.cond.wait_for(lambda: not self.pending and not self.in_flight, timeout)
+
+    def _run(self):
+        while True:
+            with self.cond:
+                self.cond.wait_for(lambda: self.pending)
+                batch = self.pending
+                self.pending = {}
+                self.in_flight = len(batch)
+            for image_path, text in batch.items():
+                try:
+                    write_atomic(caption_path(image_path), text)
+                except Exception as e:
+                    print(f"Error saving caption for {image_path}: {e}")
+                    self.failed.emit(image_path, str(e))
+                with self.cond:
+                    self.in_flight -= 1
+                    if not self.pending and not self.in_flight:
+                        self.cond.notify_all()
+
+CAPTION_WRITER = CaptionWriter()
+# Last line of defence, main window also flushes on close
+atexit.register(CAPTION_WRITER.flush)
@@ -0,0 +1,414 @@
+import os
+import json
+import sqlite3
+import hashlib
+import threading
+from core.caption_io import read_caption, parse_tags
+from core.process_pool import run_chunked
+from core.orientation import orientation_of, oriented_size, open_header
+
+# No Qt imports: header/caption reads for new files run in the process pool.
+
+CATALOG_FILE = os.path.join("cache", "catalog.db")
+IMAGE_EXTS = ('.jpg', '.jpeg', '.png', '.webp', '.bmp', '.tiff')
+CHUNK_FILES = 256
+POOL_MIN_FILES = 512   # Below this, reading inline beats pool start-up
+HASH_CHUNK_FILES = 16   # Whole files are read, so chunks stay small
+SCHEMA_VERSION = 6
+
+SORT_MODES = {
+    "name": "Name",
+    "mtime": "Newest first",
+    "size": "Largest file first",
+    "pixels": "Highest resolution first",
+    "sharp": "Sharpest first",
+    "blurry": "Blurriest first",
+    "compressed": "Most compressed JPEG first",
+    "flat": "Least detail first",
+}
+# Sort modes that need core.quality metrics; images not analyzed yet sort last
+QUALITY_SORTS = ("sharp", "blurry", "compressed", "flat")
+_ORDER_BY = {
+    "name": "name COLLATE NOCASE",
+    "mtime": "mtime DESC, name COLLATE NOCASE",
+    "size": "size DESC, name COLLATE NOCASE",
+    "pixels": "width * height DESC, name COLLATE NOCASE",
+    "sharp": "json_extract(quality, '$.blur') IS NULL, json_extract(quality, '$.blur') DESC, name COLLATE NOCASE",
+    "blurry": "json_extract(quality, '$.blur') IS NULL, json_extract(quality, '$.blur'), name COLLATE NOCASE",
+    "compressed": "json_extract(quality, '$.jpeg') IS NULL, json_extract(quality, '$.jpeg'), name COLLATE NOCASE",
+    "flat": "json_extract(quality, '$.entropy') IS NULL, json_extract(quality, '$.entropy'), name COLLATE NOCASE",
+}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS images (
+    path TEXT PRIMARY KEY,
+    folder TEXT NOT NULL,
+    name TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime REAL NOT NULL,
+    width INTEGER,
+    height INTEGER,
+    format TEXT,
+    content_hash TEXT,
+    caption TEXT NOT NULL DEFAULT '',
+    caption_mtime REAL,
+    tags TEXT NOT NULL DEFAULT '[]',
+    focus TEXT,
+    quality TEXT,
+    pixel_stats TEXT
+);
+CREATE INDEX IF NOT EXISTS images_folder ON images(folder);
+"""
+_MIGRATIONS = {
+    # Dimensions are stored upright (EXIF orientation applied): force a header re-read
+    2: "UPDATE images SET mtime = -1",
+    3: "ALTER TABLE images ADD COLUMN focus TEXT",
+    4: "ALTER TABLE images ADD COLUMN quality TEXT",
+    5: "ALTER TABLE images ADD COLUMN pixel_stats TEXT",
+    # Headers over Pillow's decompression bomb cap used to be stored unsized: read them again
+    6: "UPDATE images SET mtime = -1 WHERE width IS NULL",
+}
+_COLUMNS = "name, size, mtime, width, height, format, content_hash, caption, caption_mtime, tags, focus, quality, pixel_stats"
+
+# Threads open their first connection concurrently; only one of them migrates
+_migration_lock = threading.Lock()
+
+def _key(path):
+    return os.path.normcase(os.path.normpath(os.path.abspath(path)))
+
+def _caption_name(name):
+    dot = name.rfind('.')
+    return (name[:dot] if dot > 0 else name) + ".txt"
+
+class CatalogEntry:
+    __slots__ = ("path", "name", "size", "mtime", "width", "height", "format", "content_hash",
+                 "caption", "caption_mtime", "_tags", "_focus", "_quality", "_pixel_stats")
+
+    def __init__(self, path, name, size, mtime, width, height, format, content_hash, caption, caption_mtime, tags, focus=None, quality=None, pixel_stats=None):
+        self.path = path
+        self.name = name
+        self.size = size
+        self.mtime = mtime
+        self.width = width
+        self.height = height
+        self.format = format
+        self.content_hash = content_hash
+        self.caption = caption
+        self.caption_mtime = caption_mtime
+        self._tags = tags
+        self._focus = focus
+        self._quality = quality
+        self._pixel_stats = pixel_stats
+
+    @property
+    def tags(self):
+        if isinstance(self._tags, str):
+            self._tags = json.loads(self._tags)
+        return self._tags
+
+    @property
+    def focus(self):
+        """Smart-crop focus [fx, fy, head box or None, source], None until detected."""
+        if isinstance(self._focus, str):
+            self._focus = json.loads(self._focus)
+        return self._focus
+
+    @property
+    def quality(self):
+        """core.quality metrics dict, None until analyzed."""
+        if isinstance(self._quality, str):
+            self._quality = json.loads(self._quality)
+        return self._quality
+
+    @property
+    def pixel_stats(self):
+        """core.dataset_stats per-file accumulator, None until measured."""
+        if isinstance(self._pixel_stats, str):
+            self._pixel_stats = json.loads(self._pixel_stats)
+        return self._pixel_stats
+
+    @property
+    def dimensions(self):
+        return f"{self.width} x {self.height}" if self.width else "?"
+
+# --- PROCESS POOL SIDE ---
+def read_header(path):
+    """-> (width, height, format) from the file header, no pixel decode. Sizes are as displayed (EXIF orientation applied)."""
+    with open_header(path) as img:
+        width, height = oriented_size(img.width, img.height, orientation_of(img))
+        return width, height, img.format
+
+def read_chunk(items):
+    """[(path, header wanted)] -> [(path, width, height, format, caption)]; header fields are None when skipped or unreadable."""
+    rows = []
+    for path, want_header in items:
+        w = h = fmt = None
+        if want_header:
+            try:
+                w, h, fmt = read_header(path)
+            except Exception as e:
+                print(f"Catalog: cannot read header of {path}: {e}")
+        rows.append((path, w, h, fmt, read_caption(path)))
+    return rows
+
+def file_hash(path):
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def hash_chunk(paths):
+    """-> ([(path, digest)], [(path, error)])"""
+    ok, errors = [], []
+    for path in paths:
+        try:
+            ok.append((path, file_hash(path)))
+        except Exception as e:
+            errors.append((path, str(e)))
+    return ok, errors
+
+# --- CATALOG ---
+class Catalog:
+    """
+    One SQLite row per image: stat, header facts, caption text and parsed tags.
+    Folders are re-synced by comparing scandir stats against the stored rows, so a
+    known folder opens without decoding images or reading caption files.
+    Connections are per thread; WAL lets workers read while the UI thread writes.
+    """
+    def __init__(self, path=CATALOG_FILE):
+        self.path = path
+        self.local = threading.local()
+
+    def connection(self):
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            if os.path.dirname(self.path):
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            if conn.execute("PRAGMA user_version").fetchone()[0] < SCHEMA_VERSION:
+                with _migration_lock:
+                    self._migrate(conn)
+            self.local.conn = conn
+        return conn
+
+    def _migrate(self, conn):
+        """
+        The version is re-read under the write lock (BEGIN IMMEDIATE), so a thread or
+        another instance that got there first is not migrated over again.
+        """
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+            if version < SCHEMA_VERSION:
+                # Not executescript(), it would commit the open transaction
+                for statement in _SCHEMA.split(";"):
+                    if statement.strip():
+                        conn.execute(statement)
+                for step in range(version + 1, SCHEMA_VERSION + 1):
+                    if version and step in _MIGRATIONS:
+                        conn.execute(_MIGRATIONS[step])
+                conn.execute(f"PRAGMA user_version={SCHEMA_VERSION}")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+    def close(self):
+        conn = getattr(self.local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self.local.conn = None
+
+    # --- SYNC ---
+    def _read(self, items, progress=None):
+        if len(items) >= POOL_MIN_FILES:
+            rows = []
+            for chunk in run_chunked(read_chunk, items, chunk_size=CHUNK_FILES, progress=progress):
+                rows.extend(chunk)
+            return rows
+        return read_chunk(items)
+
+    def refresh(self, folder, exts=IMAGE_EXTS, order="name", progress=None):
+        """
+        Syncs `folder` with disk and returns its entries (filtered by `exts`, sorted by `order`).
+        Only new or changed images get a header read; only changed .txt files are re-read.
+        Entry paths are joined onto `folder` exactly as given, so they match the caller's paths.
+        """
+        conn = self.connection()
+        folder_key = _key(folder)
+
+        images, captions = {}, {}
+        with os.scandir(folder) as it:
+            for entry in it:
+                lower = entry.name.lower()
+                try:
+                    if lower.endswith(IMAGE_EXTS) and entry.is_file():
+                        st = entry.stat()
+                        images[entry.name] = (st.st_size, st.st_mtime)
+                    elif lower.endswith(".txt") and entry.is_file():
+                        captions[entry.name] = entry.stat().st_mtime
+                except OSError as e:
+                    print(f"Catalog: cannot stat {entry.path}: {e}")
+
+        known = {name: (size, mtime, caption_mtime) for name, size, mtime, caption_mtime in conn.execute(
+            "SELECT name, size, mtime, caption_mtime FROM images WHERE folder = ?", (folder_key,))}
+
+        prefix = os.path.join(folder, "")
+        key_prefix = os.path.join(folder_key, "")
+        todo, stats = [], {}
+        for name, (size, mtime) in images.items():
+            caption_mtime = captions.get(_caption_name(name))
+            row = known.get(name)
+            if row is None or row[0] != size or row[1] != mtime:
+                todo.append((prefix + name, True))
+            elif row[2] != caption_mtime:
+                todo.append((prefix + name, False))
+            else:
+                continue
+            stats[name] = (size, mtime, caption_mtime)
+        gone = [(key_prefix + name,) for name in known.keys() - images.keys()]
+
+        if todo or gone:
+            rows = self._read(todo, progress)
+            with conn:
+                conn.executemany("DELETE FROM images WHERE path = ?", gone)
+                full, captions_only = [], []
+                for (path, want_header), (_, w, h, fmt, caption) in zip(todo, rows):
+                    name = os.path.basename(path)
+                    size, mtime, caption_mtime = stats[name]
+                    tags = json.dumps(parse_tags(caption))
+                    if want_header:
+                        full.append((key_prefix + name, folder_key, name, size, mtime, w, h, fmt,
+                                     caption, caption_mtime, tags))
+                    else:
+                        captions_only.append((caption, caption_mtime, tags, key_prefix + name))
+                conn.executemany(
+                    "INSERT OR REPLACE INTO images (path, folder, name, size, mtime, width, height, format, "
+                    "caption, caption_mtime, tags) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", full)
+                conn.executemany("UPDATE images SET caption = ?, caption_mtime = ?, tags = ? WHERE path = ?", captions_only)
+
+        return self.entries(folder, exts, order)
+
+    def entries(self, folder, exts=IMAGE_EXTS, order="name"):
+        """Stored entries of `folder` without touching the disk."""
+        exts = tuple(e.lower() for e in exts)
+        cursor = self.connection().execute(
+            f"SELECT {_COLUMNS} FROM images WHERE folder = ? ORDER BY {_ORDER_BY.get(order, _ORDER_BY['name'])}",
+            (_key(folder),))
+        prefix = os.path.join(folder, "")
+        return [CatalogEntry(prefix + row[0], *row) for row in cursor if row[0].lower().endswith(exts)]
+
+    def entry(self, path):
+        """Synced entry of a single image (e.g. after an edit), or None if it is gone."""
+        conn = self.connection()
+        key = _key(path)
+        name = os.path.basename(path)
+        try:
+            st = os.stat(path)
+        except OSError:
+            with conn:
+                conn.execute("DELETE FROM images WHERE path = ?", (key,))
+            return None
+        try:
+            caption_mtime = os.stat(os.path.splitext(path)[0] + ".txt").st_mtime
+        except OSError:
+            caption_mtime = None
+
+        row = conn.execute("SELECT size, mtime, caption_mtime FROM images WHERE path = ?", (key,)).fetchone()
+        if row is None or row[0] != st.st_size or row[1] != st.st_mtime or row[2] != caption_mtime:
+            want_header = row is None or row[0] != st.st_size or row[1] != st.st_mtime
+            _, w, h, fmt, caption = read_chunk([(path, want_header)])[0]
+            tags = json.dumps(parse_tags(caption))
+            with conn:
+                if want_header:
+                    conn.execute(
+                        "INSERT OR REPLACE INTO images (path, folder, name, size, mtime, width, height, format, "
+                        "caption, caption_mtime, tags) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                        (key, os.path.dirname(key), name, st.st_size, st.st_mtime, w, h, fmt, caption, caption_mtime, tags))
+                else:
+                    conn.execute("UPDATE images SET caption = ?, caption_mtime = ?, tags = ? WHERE path = ?",
+                                 (caption, caption_mtime, tags, key))
+        row = conn.execute(f"SELECT {_COLUMNS} FROM images WHERE path = ?", (key,)).fetchone()
+        return CatalogEntry(path, *row)
+
+    def content_hash(self, path):
+        """Hash of the file bytes, computed on first request and kept until the file changes."""
+        entry = self.entry(path)
+        if entry is None:
+            raise FileNotFoundError(path)
+        if entry.content_hash:
+            return entry.content_hash
+        digest = file_hash(path)
+        with self.connection() as conn:
+            conn.execute("UPDATE images SET content_hash = ? WHERE path = ? AND size = ? AND mtime = ?",
+                         (digest, _key(path), entry.size, entry.mtime))
+        return digest
+
+    def content_hashes(self, paths, progress=None, cancelled=None):
+        """
+        {path: hash} for many files. Stored hashes are reused; the rest are hashed in chunks on
+        the shared pool and stored. Missing or unreadable files (and, if cancelled, the ones not
+        reached) are left out.
+        """
+        hashes, todo, stats = {}, [], {}
+        for path in paths:
+            entry = self.entry(path)
+            if entry is None:
+                continue
+            if entry.content_hash:
+                hashes[path] = entry.content_hash
+            else:
+                todo.append(path)
+                stats[path] = (entry.size, entry.mtime)
+        known = len(hashes)
+        total = known + len(todo)
+        if progress: progress(known, total)
+        if todo:
+            report = (lambda done, _: progress(known + done, total)) if progress else None
+            for digests, errors in run_chunked(hash_chunk, todo, chunk_size=HASH_CHUNK_FILES,
+                                               progress=report, cancelled=cancelled):
+                for path, error in errors:
+                    print(f"Catalog: cannot hash {path}: {error}")
+                # Only rows still describing the file that was hashed take the digest
+                with self.connection() as conn:
+                    conn.executemany("UPDATE images SET content_hash = ? WHERE path = ? AND size = ? AND mtime = ?",
+                                     [(digest, _key(path), *stats[path]) for path, digest in digests])
+                hashes.update(digests)
+        return hashes
+
+    def set_focus(self, path, focus):
+        """Caches a detected crop focus; it is dropped with the row's header when the file changes."""
+        st = os.stat(path)
+        with self.connection() as conn:
+            conn.execute("UPDATE images SET focus = ? WHERE path = ? AND size = ? AND mtime = ?",
+                         (json.dumps(focus), _key(path), st.st_size, st.st_mtime))
+
+    def _store_json(self, column, items):
+        """Caches [(path, value)] in a per-file JSON column, only for rows still matching the file on disk."""
+        rows = []
+        for path, value in items:
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            rows.append((json.dumps(value), _key(path), st.st_size, st.st_mtime))
+        with self.connection() as conn:
+            conn.executemany(f"UPDATE images SET {column} = ? WHERE path = ? AND size = ? AND mtime = ?", rows)
+
+    def set_quality(self, items):
+        """Caches [(path, metrics)]; like focus, they are dropped when the file changes."""
+        self._store_json("quality", items)
+
+    def set_pixel_stats(self, items):
+        """Caches [(path, accumulator)] from core.dataset_stats, dropped when the file changes."""
+        self._store_json("pixel_stats", items)
+
+    def forget(self, paths):
+        """Drops rows for files removed by the app, without waiting for the next refresh."""
+        with self.connection() as conn:
+            conn.executemany("DELETE FROM images WHERE path = ?", [(_key(p),) for p in paths])
+
+CATALOG = Catalog()
@@ -0,0 +1,126 @@
+import os
+import json
+import numpy as np
+from PIL import Image
+from core.process_pool import run_chunked
+from core.orientation import open_header
+
+# No Qt imports: stats_chunk runs inside the process pool.
+
+ANALYSIS_SIZE = 512   # Longest side of the decode the pixel statistics are taken from
+CHUNK_FILES = 32
+REPORT_FILE = "dataset_stats.json"
+# Shorter side, lower bounds
+RESOLUTION_BINS = [(0, "< 512"), (512, "512 – 767"), (768, "768 – 1023"), (1024, "1024 – 1535"),
+                   (1536, "1536 – 2047"), (2048, "2048 +")]
+# Width / height, lower bounds
+ASPECT_BINS = [(0.0, "Tall (< 1:2)"), (0.5, "Portrait (1:2 – 4:5)"), (0.8, "Square (4:5 – 5:4)"),
+               (1.25, "Landscape (5:4 – 16:9)"), (1.8, "Wide (16:9 – 2:1)"), (2.0, "Panorama (2:1 +)")]
+
+# --- PROCESS POOL SIDE ---
+def pixel_partial(path):
+    """
+    Per-file accumulator {"mode", "n", "mean": [r, g, b], "m2": [r, g, b]} on a 0..1 scale from a
+    reduced decode, so every image weighs about the same whatever its resolution. m2 is the sum of
+    squared deviations, which merges exactly across files (Chan et al.).
+    """
+    with open_header(path) as img:
+        mode = img.mode
+        # JPEG only: libjpeg decodes at 1/2..1/8 scale
+        img.draft("RGB", (ANALYSIS_SIZE, ANALYSIS_SIZE))
+        rgb = img.convert("RGB")
+        rgb.thumbnail((ANALYSIS_SIZE, ANALYSIS_SIZE), Image.Resampling.BILINEAR)
+        pixels = np.asarray(rgb, dtype=np.float64).reshape(-1, 3) / 255.0
+    mean = pixels.mean(axis=0)
+    m2 = ((pixels - mean) ** 2).sum(axis=0)
+    return {"mode": mode, "n": len(pixels), "mean": mean.round(8).tolist(), "m2": m2.round(6).tolist()}
+
+def stats_chunk(paths):
+    """-> ([(path, partial)], [(path, error)])"""
+    ok, errors = [], []
+    for path in paths:
+        try:
+            ok.append((path, pixel_partial(path)))
+        except Exception as e:
+            errors.append((path, str(e)))
+    return ok, errors
+
+# --- AGGREGATION ---
+def merge(partials):
+    """Combines per-file accumulators -> (mean [r, g, b], std [r, g, b]), population std."""
+    if not partials:
+        return [0.0] * 3, [0.0] * 3
+    n = np.array([p["n"] for p in partials], dtype=np.float64)
+    means = np.array([p["mean"] for p in partials], dtype=np.float64)
+    m2 = np.array([p["m2"] for p in partials], dtype=np.float64)
+    total = n.sum()
+    mean = (n[:, None] * means).sum(axis=0) / total
+    m2_total = m2.sum(axis=0) + (n[:, None] * (means - mean) ** 2).sum(axis=0)
+    return mean.tolist(), np.sqrt(m2_total / total).tolist()
+
+def _bin(value, bins):
+    label = bins[0][1]
+    for bound, name in bins:
+        if value >= bound:
+            label = name
+    return label
+
+def _count(values, bins=None):
+    counts = {name: 0 for _, name in bins} if bins else {}
+    for value in values:
+        key = _bin(value, bins) if bins else value
+        counts[key] = counts.get(key, 0) + 1
+    if bins:
+        return counts
+    return dict(sorted(counts.items(), key=lambda item: -item[1]))
+
+def build_report(folder, entries, partials):
+    """entries: catalog entries with header sizes; partials: {path: accumulator} for the analyzed ones."""
+    sized = [e for e in entries if e.width and e.height]
+    analyzed = [partials[e.path] for e in entries if e.path in partials]
+    mean, std = merge(analyzed)
+    pixels = sum(e.width * e.height for e in sized)
+    return {
+        "folder": folder,
+        "images": len(entries),
+        "analyzed": len(analyzed),
+        "analysis_size": ANALYSIS_SIZE,
+        "total_pixels": pixels,
+        "megapixels_mean": round(pixels / len(sized) / 1e6, 3) if sized else 0,
+        "mean": [round(v, 5) for v in mean],
+        "std": [round(v, 5) for v in std],
+        "min_size": list(min(((e.width, e.height) for e in sized), key=lambda s: s[0] * s[1], default=(0, 0))),
+        "max_size": list(max(((e.width, e.height) for e in sized), key=lambda s: s[0] * s[1], default=(0, 0))),
+        "resolution": _count((min(e.width, e.height) for e in sized), RESOLUTION_BINS),
+        "aspect": _count((e.width / e.height for e in sized), ASPECT_BINS),
+        "formats": _count(e.format or "?" for e in entries),
+        "modes": _count(partials[e.path]["mode"] for e in entries if e.path in partials),
+    }
+
+def collection_stats(folder, catalog, exts, progress=None, cancelled=None):
+    """
+    -> (report, errors). One streaming pass: only files without a stored accumulator are
+    decoded (in chunks on the shared pool), so a collection that grew re-reads just the new
+    files. Accumulators live in the catalog and are dropped when a file changes.
+    """
+    entries = catalog.refresh(folder, exts)
+    partials = {e.path: e.pixel_stats for e in entries if e.pixel_stats}
+    todo = [e.path for e in entries if e.path not in partials]
+    errors = []
+    cached = len(partials)
+    total = cached + len(todo)
+    if progress: progress(cached, total)
+    if todo:
+        report = (lambda done, _: progress(cached + done, total)) if progress else None
+        for measured, chunk_errors in run_chunked(stats_chunk, todo, chunk_size=CHUNK_FILES,
+                                                  progress=report, cancelled=cancelled):
+            catalog.set_pixel_stats(measured)
+            partials.update(measured)
+            errors.extend(chunk_errors)
+    return build_report(folder, entries, partials), errors
+
+def write_report(path, report):
+    tmp = path + ".tmp"
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=4)
+    os.replace(tmp, path)
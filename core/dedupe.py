@@ -0,0 +1,287 @@
+import os
+import json
+import numpy as np
+from PIL import Image
+from core.process_pool import run_chunked
+from core.orientation import orientation_of, oriented_size, upright_pil, open_header
+
+# No Qt imports: hash_chunk runs inside the process pool.
+
+IMAGE_EXTS = ('.jpg', '.jpeg', '.png', '.webp', '.bmp', '.tiff')
+HASH_CACHE_FILE = os.path.join("cache", "image_hashes.json")
+METHODS = {
+    "phash": "pHash (DCT, robust to re-encoding)",
+    "dhash": "dHash (gradient, fastest)",
+}
+DEFAULT_THRESHOLD = 8   # Max differing bits out of 64
+CHUNK_FILES = 64
+PHASH_SIZE = 32
+
+def _dct_matrix(n):
+    k = np.arange(n)[:, None]
+    x = np.arange(n)[None, :]
+    m = np.sqrt(2.0 / n) * np.cos(np.pi * (2 * x + 1) * k / (2 * n))
+    m[0] /= np.sqrt(2.0)
+    return m.astype(np.float32)
+
+_DCT = _dct_matrix(PHASH_SIZE)
+_BITS = (1 << np.arange(63, -1, -1, dtype=np.uint64)).astype(np.uint64)
+
+def _pack(bits):
+    """(n, 64) bool -> list of python ints."""
+    return [int(v) for v in (bits.astype(np.uint64) * _BITS).sum(axis=1, dtype=np.uint64)]
+
+def hamming(a, b):
+    return (a ^ b).bit_count()
+
+# --- PROCESS POOL SIDE ---
+def _decode_small(path):
+    """Grey 32x32 for pHash and 9x8 for dHash from one reduced decode. -> (w, h, grey32, grey9x8)"""
+    with open_header(path) as img:
+        turn = orientation_of(img)
+        size = oriented_size(img.width, img.height, turn)
+        # JPEG only: libjpeg decodes at 1/2..1/8 scale, far cheaper than a full decode
+        img.draft("L", (PHASH_SIZE * 2, PHASH_SIZE * 2))
+        grey = upright_pil(img.convert("L"), turn)
+        small = np.asarray(grey.resize((PHASH_SIZE, PHASH_SIZE), Image.Resampling.BILINEAR), dtype=np.float32)
+        tiny = np.asarray(grey.resize((9, 8), Image.Resampling.BILINEAR), dtype=np.int16)
+    return size[0], size[1], small, tiny
+
+def hash_chunk(paths):
+    """-> ([(path, width, height, dhash, phash)], [(path, error)]). The DCT runs once per chunk."""
+    ok, errors, smalls, tinies = [], [], [], []
+    for path in paths:
+        try:
+            w, h, small, tiny = _decode_small(path)
+            ok.append((path, w, h))
+            smalls.append(small)
+            tinies.append(tiny)
+        except Exception as e:
+            errors.append((path, str(e)))
+    if not ok:
+        return [], errors
+
+    tinies = np.stack(tinies)
+    dhashes = _pack((tinies[:, :, 1:] > tinies[:, :, :-1]).reshape(len(ok), 64))
+
+    # Batched 2D DCT: D @ X @ D.T for every image at once, keep the low 8x8 frequencies
+    freq = np.einsum('ij,njk,lk->nil', _DCT, np.stack(smalls), _DCT)[:, :8, :8].reshape(len(ok), 64)
+    # Median over the AC terms, the DC term would dominate
+    medians = np.median(freq[:, 1:], axis=1, keepdims=True)
+    phashes = _pack(freq > medians)
+
+    return [(p, w, h, d, ph) for (p, w, h), d, ph in zip(ok, dhashes, phashes)], errors
+
+# --- HASH CACHE ---
+class HashCache:
+    """path -> (mtime, file size, width, height, dhash, phash), kept as JSON between sessions."""
+    def __init__(self, path=HASH_CACHE_FILE):
+        self.path = path
+        self.entries = {}
+        self.dirty = False
+        if os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    self.entries = {k: tuple(v) for k, v in json.load(f).items()}
+            except Exception as e:
+                print(f"Dedupe: ignoring unreadable hash cache: {e}")
+
+    def get(self, path, stat):
+        entry = self.entries.get(path)
+        if entry and entry[0] == stat.st_mtime and entry[1] == stat.st_size:
+            return entry
+        return None
+
+    def put(self, path, stat, width, height, dhash, phash):
+        self.entries[path] = (stat.st_mtime, stat.st_size, width, height, dhash, phash)
+        self.dirty = True
+
+    def save(self):
+        if not self.dirty: return
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp = self.path + ".tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(self.entries, f)
+        os.replace(tmp, self.path)
+        self.dirty = False
+
+# --- SEARCH ---
+# Multi-index hashing: the 64 bits are split into m blocks. Two hashes within `threshold`
+# bits differ by at most threshold // m bits on at least one block (pigeonhole), so
+# candidates come from bucket lookups of nearby block values instead of comparing every pair.
+MAX_THRESHOLD = 16  # Beyond this the probe count (and false matches) climb steeply
+
+if hasattr(np, "bitwise_count"):
+    _popcount = np.bitwise_count
+else:  # NumPy < 2.0
+    def _popcount(values):
+        return np.unpackbits(values.astype(np.uint64).view(np.uint8).reshape(-1, 8), axis=1).sum(axis=1)
+
+def _probe_masks(bits, radius):
+    """Every `bits`-wide mask with at most `radius` bits set."""
+    masks = np.arange(1 << bits, dtype=np.uint64)
+    return masks[_popcount(masks) <= radius].astype(np.int64)
+
+def _blocks(n, threshold):
+    """Block layout with the least estimated probe + verify work -> ([(shift, bits)], radius)."""
+    best = None
+    for m in range(4, 9):
+        widths = [64 // m + (1 if i < 64 % m else 0) for i in range(m)]
+        radius = threshold // m
+        # Every probe is a pass over the n keys plus ~n^2 / 2^(bits+1) candidate checks,
+        # which cost about the same per element
+        cost = sum(len(_probe_masks(w, radius)) * (n + n * n / (2 << w)) for w in widths)
+        if best is None or cost < best[0]:
+            best = (cost, widths, radius)
+    _, widths, radius = best
+    shifts = np.cumsum([0] + widths[:-1]).tolist()
+    return list(zip(shifts, widths)), radius
+
+def near_pairs(values, threshold):
+    """uint64 array -> (i, j) index arrays, i < j, for every pair within `threshold` bits."""
+    n = len(values)
+    position = np.arange(n, dtype=np.int32)
+    found_i, found_j = [], []
+    blocks, radius = _blocks(n, threshold)
+    for shift, bits in blocks:
+        keys = ((values >> np.uint64(shift)) & np.uint64((1 << bits) - 1)).astype(np.int32)
+        order = np.argsort(keys, kind="stable")
+        sorted_keys, sorted_values = keys[order], values[order]
+        counts = np.bincount(keys, minlength=1 << bits).astype(np.int32)
+        ends = np.cumsum(counts, dtype=np.int32)
+        starts = ends - counts
+        for mask in _probe_masks(bits, radius):
+            if mask == 0:
+                # Own bucket: only the entries after this one
+                lo, hi = position + 1, ends[sorted_keys]
+            else:
+                # Neighbour bucket, visited once per bucket pair from the lower key
+                probe = sorted_keys ^ np.int32(mask)
+                lo, hi = starts[probe], np.where(probe > sorted_keys, ends[probe], starts[probe])
+            hits = hi - lo
+            rows = hits > 0
+            queries, lo, hits = position[rows], lo[rows], hits[rows]
+            if not len(hits):
+                continue
+            # Expand each query's candidate range into rows; query values repeat, candidates are contiguous
+            first = np.cumsum(hits, dtype=np.int64) - hits
+            c = np.arange(int(first[-1] + hits[-1]), dtype=np.int32) + np.repeat((lo - first).astype(np.int32), hits)
+            close = np.flatnonzero(_popcount(np.repeat(sorted_values[queries], hits) ^ sorted_values[c]) <= threshold)
+            if not len(close):
+                continue
+            q = queries[np.searchsorted(first, close, side="right") - 1]
+            c = c[close]
+            a, b = order[q], order[c]
+            found_i.append(np.minimum(a, b))
+            found_j.append(np.maximum(a, b))
+    if not found_i:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    pairs = np.unique(np.stack([np.concatenate(found_i), np.concatenate(found_j)], axis=1), axis=0)
+    return pairs[:, 0], pairs[:, 1]
+
+class _UnionFind:
+    def __init__(self, n):
+        self.parent = list(range(n))
+
+    def find(self, i):
+        parent = self.parent
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    def union(self, a, b):
+        ra, rb = self.find(a), self.find(b)
+        if ra != rb:
+            self.parent[rb] = ra
+
+def find_images(folders, recursive=False):
+    found = []
+    for folder in folders:
+        stack = [folder]
+        while stack:
+            current = stack.pop()
+            try:
+                with os.scandir(current) as it:
+                    for entry in it:
+                        if entry.is_file() and entry.name.lower().endswith(IMAGE_EXTS):
+                            found.append(entry.path)
+                        elif recursive and entry.is_dir(follow_symlinks=False):
+                            stack.append(entry.path)
+            except OSError as e:
+                print(f"Dedupe: cannot read {current}: {e}")
+    return sorted(set(os.path.normpath(p) for p in found))
+
+def compute_hashes(paths, progress=None, cancelled=None, cache=None):
+    """
+    -> ({path: (file size, width, height, dhash, phash)}, errors). Cached entries are
+    reused when mtime and size match; the rest are hashed in chunks on the shared pool.
+    """
+    cache = cache or HashCache()
+    results, todo, stats, errors = {}, [], {}, []
+    for path in paths:
+        try:
+            st = os.stat(path)
+        except OSError as e:
+            errors.append((path, str(e)))
+            continue
+        entry = cache.get(path, st)
+        if entry:
+            results[path] = entry[1:]
+        else:
+            stats[path] = st
+            todo.append(path)
+
+    cached = len(results)
+    total = cached + len(todo)
+    if progress: progress(cached, total)
+    if todo:
+        report = (lambda done, _: progress(cached + done, total)) if progress else None
+        for hashed, chunk_errors in run_chunked(hash_chunk, todo, chunk_size=CHUNK_FILES, progress=report, cancelled=cancelled):
+            for path, w, h, dhash, phash in hashed:
+                st = stats[path]
+                cache.put(path, st, w, h, dhash, phash)
+                results[path] = (st.st_size, w, h, dhash, phash)
+            errors.extend(chunk_errors)
+        cache.save()
+    return results, errors
+
+def group_duplicates(hashes, method="phash", threshold=DEFAULT_THRESHOLD):
+    """
+    {path: (file size, w, h, dhash, phash)} -> groups of near-identical paths, largest groups first.
+    Each group is ordered best copy first (most pixels, then largest file).
+    """
+    paths = list(hashes)
+    column = 4 if method == "phash" else 3
+    values = np.fromiter((hashes[p][column] for p in paths), dtype=np.uint64, count=len(paths))
+    # Exact copies share a hash: search the distinct hashes only, then fold the copies back in
+    unique, inverse = np.unique(values, return_inverse=True)
+
+    uf = _UnionFind(len(paths))
+    first = {}
+    for i, u in enumerate(inverse.tolist()):
+        if u in first:
+            uf.union(first[u], i)
+        else:
+            first[u] = i
+    for a, b in zip(*near_pairs(unique, threshold)):
+        uf.union(first[int(a)], first[int(b)])
+
+    groups = {}
+    for i, path in enumerate(paths):
+        groups.setdefault(uf.find(i), []).append(path)
+
+    def quality(path):
+        size, w, h = hashes[path][:3]
+        return (w * h, size)
+
+    result = [sorted(g, key=quality, reverse=True) for g in groups.values() if len(g) > 1]
+    result.sort(key=lambda g: (-len(g), g[0]))
+    return result
+
+def find_duplicates(paths, method="phash", threshold=DEFAULT_THRESHOLD, progress=None, cancelled=None):
+    """-> (groups, errors). Groups are lists of paths, the first is the suggested keeper."""
+    hashes, errors = compute_hashes(paths, progress, cancelled)
+    if cancelled and cancelled():
+        return [], errors
+    return group_duplicates(hashes, method, threshold), errors
@@ -0,0 +1,167 @@
+import os
+import json
+import time
+import shutil
+import hashlib
+import cv2
+from core import edit_ops
+
+# No Qt imports: lookups and exports run on the batch worker thread, edits in the process pool.
+
+CACHE_DIR = os.path.join("cache", "derived")
+INDEX_FILE = "index.json"
+DEFAULT_BUDGET_MB = 4096
+# Bump when an edit op changes its output for the same parameters, so old results stop matching
+CACHE_VERSION = 1
+
+def normalize_step(step):
+    """Only the parameters that change the output pixels or bytes, in one canonical form."""
+    op = step["op"]
+    if op == 'rotate':
+        # 'lossless' only applies to rotation-only jobs, which are never cached
+        return {"op": op, "direction": step.get('direction', 'cw')}
+    if op == 'resize':
+        if step.get('mode', 'longest') == 'longest':
+            return {"op": op, "mode": 'longest', "size": int(step['size'])}
+        return {"op": op, "mode": 'force', "w": int(step['w']), "h": int(step['h'])}
+    if op == 'crop':
+        norm = {"op": op, "w": int(step['w']), "h": int(step['h'])}
+        if step.get('point'):
+            norm["point"] = step['point']   # A resolved smart focus decides the window on its own
+        else:
+            norm["focus"] = step.get('focus', 'Center')
+        return norm
+    if op == 'convert':
+        fmt = step['format'].lower()
+        norm = {"op": op, "format": 'jpg' if fmt == 'jpeg' else fmt}
+        if norm["format"] in ('jpg', 'webp'):
+            norm["quality"] = int(step['quality'])
+        return norm
+    return dict(step)
+
+def new_ext(steps):
+    """Extension the last convert step gives the output, None to keep the source's."""
+    converts = [s for s in steps if s["op"] == 'convert']
+    return f".{converts[-1]['format'].lower()}" if converts else None
+
+def recipe_key(content_hash, steps, ext):
+    """Source bytes + normalized steps + output encoder (extension and OpenCV version)."""
+    ext = ext.lower().replace('.jpeg', '.jpg')
+    recipe = json.dumps([normalize_step(s) for s in steps], sort_keys=True, separators=(",", ":"))
+    text = f"{CACHE_VERSION}|{cv2.__version__}|{content_hash}|{ext}|{recipe}"
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest()
+
+def _place(src, dst):
+    """dst becomes a hardlink to src (a copy across filesystems), replaced atomically."""
+    if os.path.exists(dst) and os.path.samefile(src, dst):
+        return   # Already the same file; renaming a link over itself would leave the temp behind
+    tmp = f"{dst}.{os.getpid()}.tmp"
+    try:
+        try:
+            os.link(src, tmp)
+        except OSError:
+            shutil.copyfile(src, tmp)
+        os.replace(tmp, dst)
+    except Exception:
+        if os.path.exists(tmp): os.remove(tmp)
+        raise
+
+class DerivedCache:
+    """
+    key -> [file, size, mtime, last used] for edit outputs, keyed by recipe_key. Results are
+    hardlinked in and out, so a reused output costs a directory entry instead of a decode.
+    A cached file whose size or mtime changed (e.g. an output edited in place through its
+    link) no longer matches and is dropped. Least recently used files go past the budget.
+    """
+    def __init__(self, folder=CACHE_DIR, budget_mb=DEFAULT_BUDGET_MB):
+        self.folder = folder
+        self.budget = budget_mb * 2**20
+        self.index_path = os.path.join(folder, INDEX_FILE)
+        self.entries = {}
+        self.dirty = False
+        if os.path.exists(self.index_path):
+            try:
+                with open(self.index_path, 'r', encoding='utf-8') as f:
+                    self.entries = json.load(f)
+            except Exception as e:
+                print(f"Derived cache: ignoring unreadable index: {e}")
+
+    def file_path(self, key, ext):
+        return os.path.join(self.folder, key[:2], key + ext.lower())
+
+    def get(self, key):
+        """Path of a valid cached result, or None."""
+        entry = self.entries.get(key)
+        if not entry:
+            return None
+        path = os.path.join(self.folder, entry[0])
+        try:
+            st = os.stat(path)
+        except OSError:
+            st = None
+        if st is None or st.st_size != entry[1] or st.st_mtime != entry[2]:
+            del self.entries[key]
+            self.dirty = True
+            return None
+        entry[3] = time.time()
+        self.dirty = True
+        return path
+
+    def put(self, key, save_path):
+        """Links a fresh output into the cache."""
+        path = self.file_path(key, os.path.splitext(save_path)[1])
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        _place(save_path, path)
+        st = os.stat(path)
+        self.entries[key] = [os.path.relpath(path, self.folder), st.st_size, st.st_mtime, time.time()]
+        self.dirty = True
+
+    def split(self, jobs, output_folder, catalog, progress=None, cancelled=None):
+        """
+        [(path, steps)] -> (hits [(path, steps, save_path, cached file)], misses [(path, steps)], {path: key}).
+        Hashes come from the catalog (kept until the source changes); new ones are computed in the
+        process pool. Rotation-only lossless jobs never decode anyway and are passed through
+        uncached, as are unreadable sources and, if cancelled, sources not hashed yet.
+        """
+        hits, misses, keys = [], [], {}
+        cacheable = [path for path, steps in jobs if steps and not edit_ops.is_lossless_rotation(path, steps)]
+        hashes = catalog.content_hashes(cacheable, progress, cancelled) if cacheable else {}
+        for path, steps in jobs:
+            key = None
+            if path in hashes:
+                key = recipe_key(hashes[path], steps, new_ext(steps) or os.path.splitext(path)[1])
+            cached = self.get(key) if key else None
+            if cached:
+                hits.append((path, steps, edit_ops.output_path(path, new_ext(steps), output_folder), cached))
+            else:
+                misses.append((path, steps))
+                if key: keys[path] = key
+        return hits, misses, keys
+
+    def prune(self):
+        """Drops least recently used results until the cache fits its budget."""
+        total = sum(entry[1] for entry in self.entries.values())
+        for key, entry in sorted(self.entries.items(), key=lambda item: item[1][3]):
+            if total <= self.budget:
+                break
+            try:
+                os.remove(os.path.join(self.folder, entry[0]))
+            except OSError:
+                pass
+            total -= entry[1]
+            del self.entries[key]
+            self.dirty = True
+
+    def save(self):
+        self.prune()
+        if not self.dirty: return
+        os.makedirs(self.folder, exist_ok=True)
+        tmp = self.index_path + ".tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(self.entries, f)
+        os.replace(tmp, self.index_path)
+        self.dirty = False
+
+def export(cached, save_path):
+    """Hardlinks a cached result to where the edit would have written it."""
+    _place(cached, save_path)
@@ -0,0 +1,407 @@
+import os
+import json
+import time
+import tracemalloc
+import cv2
+import numpy as np
+from core.process_pool import run_chunked, default_workers, memory_usage
+from core import orientation
+
+# No Qt imports: edit_chunk runs inside the process pool.
+
+CHUNK_FILES = 4   # Images are heavy; small chunks keep progress and cancel responsive
+RECIPE_FILE = "edit_recipes.json"
+MEMORY_BUDGET_MB = 4096   # Whole batch; every pool worker holds one image at a time, so each gets a share
+
+class SkipImage(Exception):
+    """Image left untouched on purpose (e.g. smaller than the crop)."""
+
+def _imread(path, flags):
+    img = cv2.imread(path, flags)
+    if img is None:
+        # Unicode fallback
+        stream = np.fromfile(path, dtype=np.uint8)
+        img = cv2.imdecode(stream, flags)
+    return img
+
+# --- MEMORY-BOUNDED DECODE ---
+# Bytes per pixel of the cv2 IMREAD_UNCHANGED result, by Pillow mode (palette images may expand to BGRA)
+_MODE_BYTES = {"1": 1, "L": 1, "P": 4, "LA": 4, "RGB": 3, "YCbCr": 3, "RGBA": 4, "CMYK": 4, "I;16": 2, "I": 4, "F": 4}
+# libjpeg decodes straight to 1/2, 1/4 or 1/8 scale: factor -> (colour flag, greyscale flag)
+_REDUCED = {
+    2: (cv2.IMREAD_REDUCED_COLOR_2, cv2.IMREAD_REDUCED_GRAYSCALE_2),
+    4: (cv2.IMREAD_REDUCED_COLOR_4, cv2.IMREAD_REDUCED_GRAYSCALE_4),
+    8: (cv2.IMREAD_REDUCED_COLOR_8, cv2.IMREAD_REDUCED_GRAYSCALE_8),
+}
+# Uncompressed layouts that can be read row by row: rawmode -> (bytes per pixel, channels kept, cv2 conversion)
+_RAW_LAYOUTS = {
+    "RGB": (3, 3, cv2.COLOR_RGB2BGR),
+    "RGBA": (4, 4, cv2.COLOR_RGBA2BGRA),
+    "BGR": (3, 3, None),
+    "BGRX": (4, 3, None),
+    "L": (1, 1, None),
+}
+
+def probe_image(path):
+    """
+    Header facts for planning the decode -> dict(width, height, orientation, format, bpp, raw).
+    Pillow's decompression bomb cap is lifted for this read only; the memory limit is the guard here.
+    """
+    with orientation.open_header(path) as img:
+        rawmode, tiles = "", []
+        for codec, extents, offset, args in img.tile:
+            args = (args,) if isinstance(args, str) else tuple(args or ())
+            rawmode = str(args[0]) if args else ""
+            if codec != "raw" or rawmode not in _RAW_LAYOUTS:
+                tiles = None
+                break
+            x0, y0, x1, y1 = extents
+            stride = (args[1] if len(args) > 1 else 0) or (x1 - x0) * _RAW_LAYOUTS[rawmode][0]
+            direction = args[2] if len(args) > 2 else 1
+            tiles.append((x0, y0, x1, y1, offset, stride, direction, rawmode))
+        # Uncompressed strips or tiles in one pixel layout can be read in place
+        raw = (rawmode, [t[:7] for t in tiles]) if tiles and len({t[7] for t in tiles}) == 1 else None
+        bpp = _MODE_BYTES.get(img.mode, 4)
+        if ";16" in rawmode and not img.mode.startswith("I;16"):
+            bpp *= 2   # 16-bit PNG/TIFF: Pillow reports 8-bit modes, cv2 keeps 16 bits
+        return {"width": img.width, "height": img.height, "orientation": orientation.orientation_of(img),
+                "format": img.format, "bpp": bpp, "raw": raw}
+
+def plan_decode(info, steps):
+    """
+    -> (mode, arg, skip). 'reduced': arg is the libjpeg scale factor, for a JPEG whose first size
+    change is a downscale of 2x or more. 'region': arg is the (x, y, w, h) crop box, for an
+    uncompressed file whose first geometry step is a crop; `skip` is that crop step's index.
+    Otherwise 'full'.
+    """
+    w, h = orientation.oriented_size(info["width"], info["height"], info["orientation"])
+    turned = info["orientation"] != 1
+    for i, step in enumerate(steps):
+        op = step["op"]
+        if op == 'convert':
+            continue
+        if op == 'rotate':
+            w, h, turned = h, w, True
+            continue
+        if op == 'resize' and info["format"] == "JPEG":
+            t_w, t_h = resize_size(w, h, step)
+            scale = min(w / t_w, h / t_h)
+            factor = next((f for f in (8, 4, 2) if f <= scale), 1)
+            if factor > 1:
+                return 'reduced', factor, None
+        if op == 'crop' and info["raw"] and not turned:
+            t_w, t_h = int(step['w']), int(step['h'])
+            if t_w <= w and t_h <= h:
+                x, y = crop_origin(w, h, t_w, t_h, step.get('focus', 'Center'), step.get('point'))
+                return 'region', (x, y, t_w, t_h), i
+        break
+    return 'full', None, None
+
+def estimate_peak(info, steps, plan):
+    """Bytes of pixel buffers alive at once, following the same shapes edit_file will produce."""
+    mode, arg, skip = plan
+    w, h, bpp = info["width"], info["height"], info["bpp"]
+    if mode == 'reduced':
+        w, h = -(-w // arg), -(-h // arg)
+    elif mode == 'region':
+        w, h = arg[2], arg[3]
+    size = w * h * bpp
+    # cv2's decoders hold a working buffer about as large as the image; orienting or the
+    # region's colour conversion copy it once, after that buffer is gone
+    peak = size * 2
+    w, h = orientation.oriented_size(w, h, info["orientation"])
+    for i, step in enumerate(steps):
+        op = step["op"]
+        if i == skip or op == 'convert':
+            continue
+        extra = 0
+        if op == 'rotate':
+            w, h = h, w
+        elif op == 'resize':
+            t_w, t_h = resize_size(w, h, step)
+            if t_w * 2 <= w and t_h * 2 <= h:
+                extra = size // 4   # The first half-size stage
+            w, h = t_w, t_h
+        elif op == 'crop':
+            w, h = min(w, int(step['w'])), min(h, int(step['h']))
+        new = w * h * bpp
+        peak = max(peak, size + new + extra)
+        size = new
+    # Encoding holds the image and its compressed copy, which is at most about the same size
+    return max(peak, size * 2)
+
+def read_region(path, raw, box):
+    """Copies only the pixels of `box` (x, y, w, h) out of an uncompressed file's strips or tiles, via mmap."""
+    rawmode, tiles = raw
+    size, channels, conversion = _RAW_LAYOUTS[rawmode]
+    x, y, w, h = box
+    region = np.empty((h, w * size), dtype=np.uint8)
+    data = np.memmap(path, dtype=np.uint8, mode='r')
+    for x0, y0, x1, y1, offset, stride, direction in tiles:
+        left, top, right, bottom = max(x, x0), max(y, y0), min(x + w, x1), min(y + h, y1)
+        if left >= right or top >= bottom:
+            continue
+        block = data[offset:offset + (y1 - y0) * stride].reshape(y1 - y0, stride)
+        if direction < 0:
+            block = block[::-1]   # Bottom-up BMP
+        region[top - y:bottom - y, (left - x) * size:(right - x) * size] = \
+            block[top - y0:bottom - y0, (left - x0) * size:(right - x0) * size]
+    del data
+    region = region.reshape(h, w, size)
+    if channels == 1:
+        return region[:, :, 0].copy()
+    region = np.ascontiguousarray(region[:, :, :channels])
+    return cv2.cvtColor(region, conversion) if conversion is not None else region
+
+def decode_planned(path, info, plan):
+    mode, arg, _ = plan
+    if mode == 'region':
+        img = read_region(path, info["raw"], arg)
+    elif mode == 'reduced':
+        colour, grey = _REDUCED[arg]
+        # Orientation is applied below, like the full decode (which never applies it)
+        img = _imread(path, (grey if info["bpp"] == 1 else colour) | cv2.IMREAD_IGNORE_ORIENTATION)
+    else:
+        img = _imread(path, cv2.IMREAD_UNCHANGED)
+    if img is not None:
+        img = orientation.upright_array(img, info["orientation"])
+    return img
+
+def smart_origin(w, h, t_w, t_h, point):
+    """Crop origin centred on a detected focus [fx, fy, head box or None] that keeps the box in view (its top, if it does not fit)."""
+    fx, fy, box = point[0], point[1], point[2]
+    x, y = round(fx * w - t_w / 2), round(fy * h - t_h / 2)
+    if box:
+        bx0, by0, bx1, by1 = box[0] * w, box[1] * h, box[2] * w, box[3] * h
+        if bx1 - bx0 <= t_w:
+            x = min(max(x, round(bx1) - t_w), round(bx0))
+        if by1 - by0 <= t_h:
+            y = min(max(y, round(by1) - t_h), round(by0))
+        else:
+            y = round(by0)
+    return max(0, min(x, w - t_w)), max(0, min(y, h - t_h))
+
+def crop_origin(w, h, t_w, t_h, focus, point=None):
+    if point:
+        return smart_origin(w, h, t_w, t_h, point)
+    x = (w - t_w) // 2
+    y = (h - t_h) // 2
+    if focus == 'Top-Left': x, y = 0, 0
+    elif focus == 'Top-Center': x, y = (w - t_w)//2, 0
+    elif focus == 'Top-Right': x, y = w - t_w, 0
+    elif focus == 'Center-Left': x, y = 0, (h - t_h)//2
+    elif focus == 'Center-Right': x, y = w - t_w, (h - t_h)//2
+    elif focus == 'Bottom-Left': x, y = 0, h - t_h
+    elif focus == 'Bottom-Center': x, y = (w - t_w)//2, h - t_h
+    elif focus == 'Bottom-Right': x, y = w - t_w, h - t_h
+    return max(0, min(x, w - t_w)), max(0, min(y, h - t_h))
+
+def resize_size(w, h, params):
+    if params.get('mode', 'longest') == 'longest':
+        scale = int(params['size']) / max(h, w)
+        new_w, new_h = int(w * scale), int(h * scale)
+    else:
+        new_w, new_h = int(params['w']), int(params['h'])
+    return max(1, new_w), max(1, new_h)
+
+def downscale(img, new_w, new_h):
+    """
+    Halves with INTER_AREA (an exact 2x2 box average) while still 2x over the target, then one
+    final area resize. Each stage reads a quarter of the previous one and frees it afterwards.
+    """
+    h, w = img.shape[:2]
+    while w >= new_w * 2 and h >= new_h * 2:
+        w, h = w // 2, h // 2
+        img = cv2.resize(img, (w, h), interpolation=cv2.INTER_AREA)
+    if (w, h) != (new_w, new_h):
+        img = cv2.resize(img, (new_w, new_h), interpolation=cv2.INTER_AREA)
+    return img
+
+def apply_operation(img, operation, params):
+    """-> (image, new extension or None, cv2 encode params)."""
+    h, w = img.shape[:2]
+    if operation == 'rotate':
+        code = cv2.ROTATE_90_CLOCKWISE if params.get('direction', 'cw') == 'cw' else cv2.ROTATE_90_COUNTERCLOCKWISE
+        return cv2.rotate(img, code), None, []
+
+    if operation == 'resize':
+        new_w, new_h = resize_size(w, h, params)
+        if new_w != w or new_h != h:
+            img = downscale(img, new_w, new_h)
+        return img, None, []
+
+    if operation == 'crop':
+        t_w, t_h = int(params['w']), int(params['h'])
+        if w < t_w or h < t_h:
+            raise SkipImage("Too small")
+        x, y = crop_origin(w, h, t_w, t_h, params.get('focus', 'Center'), params.get('point'))
+        # Copy, so the full-size source can be freed instead of living on behind a view
+        return img[y:y+t_h, x:x+t_w].copy(), None, []
+
+    if operation == 'convert':
+        fmt = params['format'].lower()
+        quality = params['quality']
+        save_params = []
+        if fmt in ['jpg', 'jpeg']:
+            save_params = [int(cv2.IMWRITE_JPEG_QUALITY), quality]
+            if len(img.shape) == 3 and img.shape[2] == 4:
+                img = cv2.cvtColor(img, cv2.COLOR_BGRA2BGR)
+        elif fmt == 'webp':
+            save_params = [int(cv2.IMWRITE_WEBP_QUALITY), quality]
+        return img, f".{fmt}", save_params
+
+    raise ValueError(f"Unknown operation: {operation}")
+
+def make_step(operation, params):
+    return {"op": operation, **params}
+
+def apply_step(img, step):
+    params = {k: v for k, v in step.items() if k != "op"}
+    return apply_operation(img, step["op"], params)
+
+def describe_step(step):
+    op = step["op"]
+    if op == 'rotate':
+        label = "Rotate " + ("⟳ right" if step.get('direction', 'cw') == 'cw' else "⟲ left")
+        return label + (" (lossless JPEG)" if step.get('lossless') else "")
+    if op == 'resize':
+        if step.get('mode', 'longest') == 'longest':
+            return f"Resize longest side to {step['size']} px"
+        return f"Resize to {step['w']} x {step['h']}"
+    if op == 'crop':
+        return f"Crop {step['w']} x {step['h']} ({step.get('focus', 'Center')})"
+    if op == 'convert':
+        return f"Convert to {step['format'].upper()} (q {step['quality']})"
+    return op
+
+def output_path(path, new_ext, output_folder):
+    filename = os.path.basename(path)
+    if new_ext:
+        filename = os.path.splitext(filename)[0] + new_ext
+    return os.path.join(output_folder or os.path.dirname(path), filename)
+
+def is_lossless_rotation(path, steps):
+    return (path.lower().endswith(orientation.JPEG_EXTS) and bool(steps)
+            and all(s["op"] == 'rotate' and s.get('lossless') for s in steps))
+
+def _traced_peak(base):
+    return max(0, tracemalloc.get_traced_memory()[1] - base) if tracemalloc.is_tracing() else 0
+
+def edit_file(path, steps, output_folder="", memory_limit_mb=MEMORY_BUDGET_MB, trace=False):
+    """
+    Decodes once, applies every step to the same buffer and encodes once.
+    -> (status, path, save_path, message, timings, peak, decode); status is 'ok', 'skipped' or 'error',
+    timings are seconds for [decode, *steps, encode], peak is the traced bytes of the decode, steps and
+    encode (0 unless `trace` or tracemalloc is already on) and decode is the plan mode ('full',
+    'reduced', 'region' or 'lossless'). Images whose estimated peak is over `memory_limit_mb` (this
+    image's share of the batch budget, see image_limit_mb) are skipped before decoding.
+    """
+    timings = []
+    base, started = 0, False
+    clock = time.perf_counter()
+    if is_lossless_rotation(path, steps):
+        save_path = output_path(path, None, output_folder)
+        try:
+            orientation.rotate_jpeg_lossless(path, [s.get('direction', 'cw') for s in steps], save_path)
+            # No decode or encode happened; the tag rewrite is the whole cost
+            spent = time.perf_counter() - clock
+            timings = [0.0] + [spent / len(steps)] * len(steps) + [0.0]
+            return 'ok', path, save_path, "", timings, 0, 'lossless'
+        except Exception as e:
+            print(f"Lossless rotate failed for {path}, rotating pixels instead: {e}")
+            clock = time.perf_counter()
+    decode = 'full'
+    try:
+        info = probe_image(path)
+        plan = plan_decode(info, steps)
+        decode = plan[0]
+        needed = estimate_peak(info, steps, plan) / 2**20
+        if needed > memory_limit_mb:
+            raise SkipImage(f"Needs ~{needed:.0f} MB, over the {memory_limit_mb} MB per-image share of the memory budget")
+        # Traced from here only: the header parse allocates many small objects and tracing slows it badly
+        if trace and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            started = True
+        if tracemalloc.is_tracing():
+            tracemalloc.reset_peak()
+            base = tracemalloc.get_traced_memory()[0]
+        img = decode_planned(path, info, plan)
+        if img is None:
+            return 'error', path, None, "Failed load", timings, _traced_peak(base), decode
+        timings.append(time.perf_counter() - clock)
+
+        new_ext, save_params = None, []
+        for i, step in enumerate(steps):
+            clock = time.perf_counter()
+            if i != plan[2]:   # A region decode already did this crop
+                img, ext, params = apply_step(img, step)
+                if ext:
+                    new_ext, save_params = ext, params
+            timings.append(time.perf_counter() - clock)
+
+        clock = time.perf_counter()
+        save_path = output_path(path, new_ext, output_folder)
+        ext = os.path.splitext(save_path)[1] or os.path.splitext(path)[1]
+        success, encoded = cv2.imencode(ext, img, save_params)
+        del img
+        if not success:
+            return 'error', path, None, "Save failed", timings, _traced_peak(base), decode
+        # Temp file + rename: a cancelled or crashed worker never leaves a half-written original
+        tmp = f"{save_path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp, "wb") as f:
+                encoded.tofile(f)
+            os.replace(tmp, save_path)
+        except Exception:
+            if os.path.exists(tmp): os.remove(tmp)
+            raise
+        timings.append(time.perf_counter() - clock)
+        return 'ok', path, save_path, "", timings, _traced_peak(base), decode
+    except SkipImage as e:
+        return 'skipped', path, None, str(e), timings, _traced_peak(base), decode
+    except Exception as e:
+        return 'error', path, None, str(e), timings, _traced_peak(base), decode
+    finally:
+        if started:
+            tracemalloc.stop()
+
+def image_limit_mb(budget_mb, jobs):
+    """Per-image share of the batch budget: as many images as workers busy at once (one chunk each)."""
+    concurrent = max(1, min(default_workers(), -(-jobs // CHUNK_FILES)))
+    return max(1, budget_mb // concurrent)
+
+def edit_chunk(jobs, output_folder, memory_limit_mb=MEMORY_BUDGET_MB):
+    """-> edit_file results, each with (worker pid, worker peak RSS bytes) appended."""
+    # One image per worker at a time; cv2's own threads would only oversubscribe the cores
+    cv2.setNumThreads(1)
+    # cv2 allocates its arrays through numpy, so tracemalloc sees every pixel buffer. Traced bytes
+    # are the pixels alone; the RSS high-water mark is what the worker really held
+    return [edit_file(p, steps, output_folder, memory_limit_mb, trace=True) + ((os.getpid(), memory_usage()[1]),)
+            for p, steps in jobs]
+
+def run_jobs(jobs, output_folder="", progress=None, cancelled=None, memory_budget_mb=MEMORY_BUDGET_MB):
+    """Runs [(path, steps)] across the process pool within `memory_budget_mb` overall. Yields edit_chunk results in order."""
+    jobs = list(jobs)
+    for results in run_chunked(edit_chunk, jobs, output_folder, image_limit_mb(memory_budget_mb, len(jobs)),
+                               chunk_size=CHUNK_FILES, progress=progress, cancelled=cancelled):
+        yield from results
+
+def run_batch(paths, steps, output_folder="", progress=None, cancelled=None, memory_budget_mb=MEMORY_BUDGET_MB):
+    """Runs the same step list over every path."""
+    return run_jobs([(p, steps) for p in paths], output_folder, progress, cancelled, memory_budget_mb)
+
+# --- RECIPES ---
+def load_recipes(path=RECIPE_FILE):
+    """-> {name: [step]}"""
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except Exception as e:
+        print(f"Error loading recipes: {e}")
+        return {}
+
+def save_recipes(recipes, path=RECIPE_FILE):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(recipes, f, indent=4)
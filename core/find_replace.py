@@ -0,0 +1,238 @@
+import os
+import re
+import json
+from core.caption_io import write_atomic, caption_path
+from core.catalog import IMAGE_EXTS
+from core.process_pool import run_chunked
+
+# No Qt imports: the scan/stage functions run inside the process pool.
+
+MODES = {
+    "literal": "Literal text",
+    "regex": "Regular expression",
+    "tag": "Whole tag",
+    "tag_regex": "Whole tag (regex)",
+}
+CHUNK_FILES = 512
+PREVIEW_SAMPLES = 20
+STAGE_SUFFIX = ".fr.tmp"
+JOURNAL_FILE = os.path.join("cache", "find_replace.journal")
+
+def make_rule(find, replace, mode="literal", case_sensitive=False):
+    """Picklable rule description; raises re.error for a bad pattern or replacement so the dialog can report it."""
+    rule = {"find": find, "replace": replace, "mode": mode, "case": case_sensitive}
+    pattern = _compile(rule)
+    if mode in ("regex", "tag_regex"):
+        # Group references (\2, \g<name>) are checked when the template is parsed; do it
+        # here instead of in every pool worker
+        try:
+            pattern.sub(replace.strip() if mode == "tag_regex" else replace, "")
+        except IndexError as e:   # Unknown group name; re.error on newer Pythons
+            raise re.error(str(e)) from None
+    return rule
+
+_compiled = {}
+
+def _compile(rule):
+    key = (rule["find"], rule["mode"], rule["case"])
+    pattern = _compiled.get(key)
+    if pattern is None:
+        flags = 0 if rule["case"] else re.IGNORECASE
+        if rule["mode"] in ("regex", "tag_regex"):
+            pattern = re.compile(rule["find"], flags)
+        else:
+            pattern = re.compile(re.escape(rule["find"].strip() if rule["mode"] == "tag" else rule["find"]), flags)
+        _compiled[key] = pattern
+    return pattern
+
+def rewrite(text, rule):
+    """text -> (new_text, matches). Tag modes work on whole comma-separated tags."""
+    pattern = _compile(rule)
+    mode = rule["mode"]
+    if mode in ("literal", "regex"):
+        if mode == "literal":
+            return pattern.subn(lambda m: rule["replace"], text)
+        return pattern.subn(rule["replace"], text)
+
+    replacement = rule["replace"].strip()
+    tags = [t.strip() for t in text.split(',') if t.strip()]
+    out, seen, matches = [], set(), 0
+    for tag in tags:
+        if pattern.fullmatch(tag):
+            matches += 1
+            tag = pattern.sub(replacement, tag) if mode == "tag_regex" else replacement
+            tag = tag.strip()
+            if not tag:
+                continue  # Empty replacement removes the tag
+        # Replacing can create a tag that is already present
+        if tag in seen:
+            continue
+        seen.add(tag)
+        out.append(tag)
+    if not matches:
+        return text, 0
+    return ", ".join(out), matches
+
+def find_caption_files(folders, recursive=False):
+    """Caption sidecars only: .txt files next to an image with the same stem (notes, logs and
+    licence files are left alone)."""
+    found = []
+    for folder in folders:
+        stack = [folder]
+        while stack:
+            current = stack.pop()
+            texts, captioned = set(), set()
+            try:
+                with os.scandir(current) as it:
+                    for entry in it:
+                        lower = entry.name.lower()
+                        if lower.endswith(".txt") and entry.is_file():
+                            texts.add(entry.path)
+                        elif lower.endswith(IMAGE_EXTS) and entry.is_file():
+                            captioned.add(caption_path(entry.path))
+                        elif recursive and entry.is_dir(follow_symlinks=False):
+                            stack.append(entry.path)
+            except OSError as e:
+                print(f"Find/Replace: cannot read {current}: {e}")
+            found.extend(texts & captioned)
+    return sorted(set(found))
+
+def _read(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return f.read()
+
+# --- PROCESS POOL SIDE ---
+def scan_chunk(paths, rule, rewriter=rewrite):
+    """-> (matched [(path, count)], samples [(path, before, after)], errors [(path, msg)])"""
+    matched, samples, errors = [], [], []
+    for path in paths:
+        try:
+            text = _read(path)
+            new_text, count = rewriter(text, rule)
+            if count and new_text != text:
+                matched.append((path, count))
+                if len(samples) < 3:
+                    samples.append((path, text, new_text))
+        except Exception as e:
+            errors.append((path, str(e)))
+    return matched, samples, errors
+
+def stage_chunk(paths, rule, rewriter=rewrite):
+    """Writes each rewritten caption next to its target. -> ([(path, old, new)], errors)"""
+    staged, errors = [], []
+    for path in paths:
+        try:
+            text = _read(path)
+            new_text, count = rewriter(text, rule)
+            if count and new_text != text:
+                with open(path + STAGE_SUFFIX, 'w', encoding='utf-8') as f:
+                    f.write(new_text)
+                staged.append((path, text, new_text))
+        except Exception as e:
+            errors.append((path, str(e)))
+    return staged, errors
+
+def stage_texts_chunk(items):
+    """[(path, text)] -> errors; used to replay undo/redo."""
+    errors = []
+    for path, text in items:
+        try:
+            with open(path + STAGE_SUFFIX, 'w', encoding='utf-8') as f:
+                f.write(text)
+        except Exception as e:
+            errors.append((path, str(e)))
+    return errors
+
+# --- CALLER SIDE ---
+def scan(paths, rule, progress=None, cancelled=None, rewriter=rewrite):
+    """
+    -> dict(files, matched_files, matches, samples, errors, matched=[(path, count)]).
+    `rewriter(text, rule) -> (new_text, count)` must be a module-level function so it pickles.
+    """
+    matched, samples, errors = [], [], []
+    for chunk_matched, chunk_samples, chunk_errors in run_chunked(scan_chunk, paths, rule, rewriter, chunk_size=CHUNK_FILES, progress=progress, cancelled=cancelled):
+        matched.extend(chunk_matched)
+        errors.extend(chunk_errors)
+        if len(samples) < PREVIEW_SAMPLES:
+            samples.extend(chunk_samples[:PREVIEW_SAMPLES - len(samples)])
+    return {
+        "files": len(paths),
+        "matched_files": len(matched),
+        "matches": sum(c for _, c in matched),
+        "samples": samples,
+        "errors": errors,
+        "matched": matched,
+    }
+
+def discard_staged(paths):
+    for path in paths:
+        try: os.remove(path + STAGE_SUFFIX)
+        except OSError: pass
+
+def commit_staged(changes):
+    """
+    [(path, old, new)] with new text already staged -> renames them in. A journal of
+    the old texts is written first, so a crash mid-commit is rolled back on next start.
+    """
+    os.makedirs(os.path.dirname(JOURNAL_FILE), exist_ok=True)
+    with open(JOURNAL_FILE, 'w', encoding='utf-8') as f:
+        for path, old, _ in changes:
+            f.write(json.dumps([path, old]) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+    try:
+        for path, _, _ in changes:
+            os.replace(path + STAGE_SUFFIX, path)
+    except Exception:
+        recover_journal()
+        discard_staged(p for p, _, _ in changes)
+        raise
+    os.remove(JOURNAL_FILE)
+
+def recover_journal():
+    """Restores captions from an interrupted commit. Returns the number of files restored."""
+    if not os.path.exists(JOURNAL_FILE):
+        return 0
+    restored = 0
+    with open(JOURNAL_FILE, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                path, old = json.loads(line)
+                write_atomic(path, old)
+                restored += 1
+            except Exception as e:
+                print(f"Find/Replace: could not restore {line.strip()[:200]}: {e}")
+    os.remove(JOURNAL_FILE)
+    return restored
+
+def apply_rule(paths, rule, progress=None, cancelled=None, rewriter=rewrite):
+    """
+    Stages every rewrite, then commits all of them or none.
+    Returns (changes [(path, old, new)], errors); nothing is written if errors or cancelled.
+    """
+    changes, errors = [], []
+    for chunk_changes, chunk_errors in run_chunked(stage_chunk, paths, rule, rewriter, chunk_size=CHUNK_FILES, progress=progress, cancelled=cancelled):
+        changes.extend(chunk_changes)
+        errors.extend(chunk_errors)
+    if errors or (cancelled and cancelled()):
+        discard_staged(p for p, _, _ in changes)
+        return [], errors
+    commit_staged(changes)
+    return changes, []
+
+def write_texts(texts):
+    """{txt_path: text} written all-or-nothing, same staging as apply_rule."""
+    items = list(texts.items())
+    errors = []
+    for chunk_errors in run_chunked(stage_texts_chunk, items, chunk_size=CHUNK_FILES):
+        errors.extend(chunk_errors)
+    if errors:
+        discard_staged(texts)
+        raise OSError(f"{len(errors)} captions could not be written, first: {errors[0][0]}: {errors[0][1]}")
+    current = []
+    for path, text in items:
+        try:
+            current.append((path, _read(path), text))
+        except FileNotFoundError:
+            current.append((path, "", text))
+    commit_staged(current)
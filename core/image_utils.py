@@ -17,9 +17,9 @@ def cv2_to_qpixmap(cv_img):
     qimg = QImage(rgb_image.data, w, h, bytes_per_line, QImage.Format_RGB888).copy()
     return QPixmap.fromImage(qimg)
 
-def pil_to_qpixmap(pil_img):
-    """Convert PIL image to QPixmap safely."""
-    if pil_img is None: return QPixmap()
+def pil_to_qimage(pil_img):
+    """Convert PIL image to QImage; unlike QPixmap this is safe to build off the UI thread."""
+    if pil_img is None: return QImage()
     
     # Convert to RGBA (Handles transparency and 32-bit alignment better in Qt)
     if pil_img.mode != "RGBA":
@@ -32,7 +32,23 @@ def pil_to_qpixmap(pil_img):
     
     # .copy() is CRITICAL here. 
     # Without it, 'data' gets garbage collected, resulting in black/noise images.
-    return QPixmap.fromImage(qimg.copy())
+    return qimg.copy()
+
+def pil_to_qpixmap(pil_img):
+    """Convert PIL image to QPixmap safely."""
+    if pil_img is None: return QPixmap()
+    return QPixmap.fromImage(pil_to_qimage(pil_img))
+
+def load_thumbnail_image(path, size=(300, 300)):
+    """Thumbnail as a QImage, for worker threads."""
+    try:
+        with Image.open(path) as img:
+            img = ImageOps.exif_transpose(img) # Fix rotation
+            img.thumbnail(size, Image.Resampling.LANCZOS)
+            return pil_to_qimage(img)
+    except Exception as e:
+        print(f"Error loading thumbnail {path}: {e}")
+        return QImage()
 
 def load_thumbnail(path, size=(300, 300)):
     """Efficiently load a thumbnail."""
@@ -45,25 +61,40 @@ def load_thumbnail(path, size=(300, 300)):
         print(f"Error loading thumbnail {path}: {e}")
         return QPixmap()
 
+def open_image_rgb(image_path):
+    """Decodes an image once, upright and in RGB, for reuse by several models."""
+    with Image.open(image_path) as img:
+        # Fix rotation based on EXIF
+        img = ImageOps.exif_transpose(img)
+        # Convert to RGB to ensure compatibility
+        return img.convert("RGB")
+
+def pil_to_base64(img):
+    """Encodes an already decoded PIL image as base64 JPEG for API usage."""
+    try:
+        if img.mode not in ('RGB', 'L'):
+            img = img.convert('RGB')
+
+        # Resize if too massive (optional, but good for APIs)
+        # Most VLMs choke on > 4096px
+        if max(img.size) > 4096:
+            img = img.copy()
+            img.thumbnail((4096, 4096))
+
+        buff = BytesIO()
+        img.save(buff, format="JPEG", quality=90)
+        return base64.b64encode(buff.getvalue()).decode('utf-8')
+    except Exception as e:
+        print(f"Base64 Conversion Error: {e}")
+        return None
+
 def image_to_base64(image_path):
     """Converts an image file to a base64 string for API usage."""
     try:
         with Image.open(image_path) as img:
             # Fix rotation based on EXIF
             img = ImageOps.exif_transpose(img)
-            
-            # Convert to RGB to ensure compatibility
-            if img.mode not in ('RGB', 'L'):
-                img = img.convert('RGB')
-            
-            # Resize if too massive (optional, but good for APIs)
-            # Most VLMs choke on > 4096px
-            if max(img.size) > 4096:
-                img.thumbnail((4096, 4096))
-
-            buff = BytesIO()
-            img.save(buff, format="JPEG", quality=90)
-            return base64.b64encode(buff.getvalue()).decode('utf-8')
+            return pil_to_base64(img)
     except Exception as e:
         print(f"Base64 Conversion Error: {e}")
-        return None
\ No newline at end of file
+        return None
@@ -0,0 +1,121 @@
+import time
+import threading
+from contextlib import contextmanager
+from PySide6.QtCore import QObject, Signal, QTimer
+
+DEFAULT_IDLE_MINUTES = {"qwen": 15, "wd14": 10}
+CHECK_INTERVAL_MS = 15000
+
+class ManagedModel:
+    def __init__(self, key, label, unload, memory):
+        self.key = key
+        self.label = label
+        self.unload = unload      # frees the model, must be safe to call when not loaded
+        self.memory = memory      # -> resident bytes, 0 when not loaded
+        self.idle_timeout = 0     # seconds, 0 = never unload
+        self.last_used = time.monotonic()
+        self.users = 0
+        self.unloading = False
+
+class ModelManager(QObject):
+    """
+    Tracks heavy models (Qwen, WD14 sessions) and unloads them in the
+    background once they sit idle longer than their timeout. Owners reload
+    lazily on next use, so callers only need to touch() or hold in_use().
+    """
+    status_changed = Signal()
+
+    def __init__(self):
+        super().__init__()
+        self.models = {}
+        self.lock = threading.Lock()
+        self.pending_timeouts = {}
+        self.timer = None
+
+    def register(self, key, label, unload, memory):
+        with self.lock:
+            model = ManagedModel(key, label, unload, memory)
+            minutes = self.pending_timeouts.get(key, DEFAULT_IDLE_MINUTES.get(key, 0))
+            model.idle_timeout = int(minutes * 60)
+            self.models[key] = model
+
+    def set_idle_minutes(self, key, minutes):
+        with self.lock:
+            self.pending_timeouts[key] = minutes
+            if key in self.models:
+                self.models[key].idle_timeout = int(minutes * 60)
+
+    def touch(self, key):
+        model = self.models.get(key)
+        if model:
+            model.last_used = time.monotonic()
+
+    @contextmanager
+    def in_use(self, key):
+        """Blocks idle unloading for the duration of a job."""
+        model = self.models.get(key)
+        if model:
+            with self.lock:
+                model.users += 1
+        try:
+            yield
+        finally:
+            if model:
+                with self.lock:
+                    model.users -= 1
+                    model.last_used = time.monotonic()
+
+    # --- BACKGROUND UNLOAD ---
+    def start(self, interval_ms=CHECK_INTERVAL_MS):
+        """Starts the idle check. Call from the UI thread once the app exists."""
+        if self.timer is None:
+            self.timer = QTimer(self)
+            self.timer.timeout.connect(self.check_idle)
+        self.timer.start(interval_ms)
+
+    def check_idle(self):
+        now = time.monotonic()
+        for model in list(self.models.values()):
+            if model.idle_timeout <= 0 or model.users or model.unloading:
+                continue
+            if now - model.last_used < model.idle_timeout:
+                continue
+            if model.memory() <= 0:
+                continue
+            self.unload_async(model.key)
+
+    def unload_async(self, key):
+        model = self.models.get(key)
+        if not model or model.unloading:
+            return
+        model.unloading = True
+        # Dropping GBs of tensors can stall for a while, keep it off the UI thread
+        threading.Thread(target=self._unload, args=(model,), daemon=True).start()
+
+    def _unload(self, model):
+        try:
+            # Held across the unload: a job entering in_use() waits for it and reloads,
+            # instead of having the model freed underneath it
+            with self.lock:
+                if model.users == 0:
+                    model.unload()
+                    print(f"Model manager: unloaded idle {model.label}")
+        except Exception as e:
+            print(f"Model manager: failed to unload {model.label}: {e}")
+        finally:
+            model.unloading = False
+            self.status_changed.emit()
+
+    def snapshot(self):
+        """[(key, label, resident_bytes, idle_seconds, idle_timeout, in_use)] for the UI."""
+        now = time.monotonic()
+        rows = []
+        for model in list(self.models.values()):
+            try:
+                resident = model.memory()
+            except Exception:
+                resident = 0
+            rows.append((model.key, model.label, resident, now - model.last_used, model.idle_timeout, model.users > 0))
+        return rows
+
+MODEL_MANAGER = ModelManager()
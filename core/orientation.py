@@ -0,0 +1,111 @@
+import os
+import io
+import numpy as np
+import piexif
+from PIL import Image
+
+# No Qt imports: used by pool-side decoders and edits.
+
+ORIENTATION_TAG = piexif.ImageIFD.Orientation
+JPEG_EXTS = ('.jpg', '.jpeg')
+# Pillow rejects headers above ~179 MP as decompression bombs, which panoramas and scans exceed.
+# A header read costs the same at any size, so open_header lifts the cap (to OpenCV's) for that open only.
+# Analysis decodes open through it too: they shrink the image right away, with draft() where the format allows.
+HEADER_MAX_PIXELS = 1 << 30
+
+# EXIF orientation -> ops that turn the stored pixels upright (as ImageOps.exif_transpose does)
+_PIL_OPS = {
+    2: Image.Transpose.FLIP_LEFT_RIGHT,
+    3: Image.Transpose.ROTATE_180,
+    4: Image.Transpose.FLIP_TOP_BOTTOM,
+    5: Image.Transpose.TRANSPOSE,
+    6: Image.Transpose.ROTATE_270,
+    7: Image.Transpose.TRANSVERSE,
+    8: Image.Transpose.ROTATE_90,
+}
+_ARRAY_OPS = {
+    2: lambda a: a[:, ::-1],
+    3: lambda a: a[::-1, ::-1],
+    4: lambda a: a[::-1],
+    5: lambda a: a.swapaxes(0, 1),
+    6: lambda a: np.rot90(a, -1),
+    7: lambda a: a[::-1, ::-1].swapaxes(0, 1),
+    8: lambda a: np.rot90(a, 1),
+}
+
+def upright_array(arr, orientation):
+    """Stored pixels (H, W[, C]) -> upright pixels for the given EXIF orientation."""
+    op = _ARRAY_OPS.get(orientation)
+    return np.ascontiguousarray(op(arr)) if op else arr
+
+def upright_pil(img, orientation):
+    op = _PIL_OPS.get(orientation)
+    return img.transpose(op) if op else img
+
+def oriented_size(width, height, orientation):
+    return (height, width) if orientation in (5, 6, 7, 8) else (width, height)
+
+def _rotation_table():
+    """(orientation, direction) -> orientation that shows the picture turned one more quarter."""
+    probe = np.arange(6).reshape(2, 3)
+    upright = {o: upright_array(probe, o) for o in range(1, 9)}
+    table = {}
+    for o in range(1, 9):
+        for direction, k in (('cw', -1), ('ccw', 1)):
+            target = np.rot90(upright[o], k)
+            table[o, direction] = next(n for n in range(1, 9) if np.array_equal(upright[n], target))
+    return table
+
+_ROTATE = _rotation_table()
+
+def orientation_of(img):
+    """EXIF orientation of an open PIL image (1 if missing or invalid)."""
+    try:
+        value = img.getexif().get(ORIENTATION_TAG, 1)
+    except Exception:
+        return 1
+    return value if value in range(1, 9) else 1
+
+def open_header(path):
+    """Image.open for images of any size: header facts (size, mode, tiles, EXIF) or a decode that is reduced at once."""
+    limit = Image.MAX_IMAGE_PIXELS
+    Image.MAX_IMAGE_PIXELS = HEADER_MAX_PIXELS
+    try:
+        return Image.open(path)
+    finally:
+        Image.MAX_IMAGE_PIXELS = limit
+
+def rotated_orientation(orientation, directions):
+    for direction in directions:
+        orientation = _ROTATE[orientation, direction]
+    return orientation
+
+# --- LOSSLESS ROTATION ---
+def rotate_jpeg_lossless(path, directions, save_path):
+    """
+    Rotates a JPEG by rewriting its EXIF Orientation tag; the compressed image data is copied
+    byte for byte, so there is no decode and no generation loss. Raises if the file's EXIF
+    cannot be rewritten, callers fall back to a pixel rotation.
+    """
+    with open(path, 'rb') as f:
+        data = f.read()
+    if data[:2] != b"\xff\xd8":
+        raise ValueError("Not a JPEG")
+    # A file without EXIF loads as empty tables; unreadable EXIF raises rather than being
+    # replaced by an empty block, which would drop the camera data, GPS and thumbnail
+    exif = piexif.load(data)
+    current = exif["0th"].get(ORIENTATION_TAG, 1)
+    if current not in range(1, 9):
+        current = 1
+    exif["0th"][ORIENTATION_TAG] = rotated_orientation(current, directions)
+
+    out = io.BytesIO()
+    piexif.insert(piexif.dump(exif), data, out)
+    tmp = f"{save_path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp, 'wb') as f:
+            f.write(out.getvalue())
+        os.replace(tmp, save_path)
+    except Exception:
+        if os.path.exists(tmp): os.remove(tmp)
+        raise
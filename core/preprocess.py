@@ -0,0 +1,121 @@
+import numpy as np
+from collections import deque
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import shared_memory
+from PIL import Image
+from core.process_pool import get_process_pool, reset_process_pool
+from core.orientation import orientation_of, upright_pil
+
+# Keeps this module free of Qt/torch imports: it runs inside the process pool.
+
+def prepare_image(img, size, resize="squash"):
+    """PIL image -> (size, size, 3) uint8 BGR array, as the WD14 models expect."""
+    img = img.convert("RGB")
+    if resize == "pad":
+        # Letterbox onto a white square so the aspect ratio is kept
+        side = max(img.size)
+        canvas = Image.new("RGB", (side, side), (255, 255, 255))
+        canvas.paste(img, ((side - img.width) // 2, (side - img.height) // 2))
+        img = canvas
+    # Resize to expected dim (squash is standard for WD14)
+    img = img.resize((size, size), Image.Resampling.BICUBIC)
+    # Flip RGB to BGR
+    return np.asarray(img)[:, :, ::-1]
+
+def decode_for_tagger(path, size, resize="squash"):
+    with Image.open(path) as img:
+        # JPEG only: let libjpeg decode at 1/2, 1/4 or 1/8 scale (never below the target size)
+        img.draft("RGB", (size, size))
+        return prepare_image(upright_pil(img, orientation_of(img)), size, resize)
+
+# --- PROCESS POOL SIDE ---
+_attached = {}
+
+def _attach(name):
+    shm = _attached.get(name)
+    if shm is None:
+        # A new ring means the previous one is gone, release its mapping
+        for old in _attached.values():
+            old.close()
+        _attached.clear()
+        try:
+            shm = shared_memory.SharedMemory(name=name, track=False)
+        except TypeError:  # Python < 3.13
+            shm = shared_memory.SharedMemory(name=name)
+        _attached[name] = shm
+    return shm
+
+def _fill_slot(shm_name, slot, shape, path, size, resize):
+    """Decode one image straight into its slot of the shared ring. Returns an error string or None."""
+    try:
+        shm = _attach(shm_name)
+        nbytes = int(np.prod(shape)) * 4
+        out = np.ndarray(shape, dtype=np.float32, buffer=shm.buf, offset=slot * nbytes)
+        out[0] = decode_for_tagger(path, size, resize)
+        return None
+    except Exception as e:
+        return str(e)
+
+# --- CALLER SIDE ---
+class PreprocessRing:
+    """
+    Decodes images in the shared process pool and hands back ready-to-run
+    (1, size, size, 3) float32 tensors that live in shared memory, so only
+    the file path and a slot number cross the process boundary.
+    """
+    def __init__(self, size, resize="squash", slots=8):
+        self.size = size
+        self.resize = resize
+        self.shape = (1, size, size, 3)
+        self.slot_bytes = int(np.prod(self.shape)) * 4
+        self.slots = slots
+        self.shm = shared_memory.SharedMemory(create=True, size=self.slot_bytes * slots)
+
+    def view(self, slot):
+        return np.ndarray(self.shape, dtype=np.float32, buffer=self.shm.buf, offset=slot * self.slot_bytes)
+
+    def run(self, paths):
+        """
+        Yields (path, tensor, error) in input order. A tensor is only valid until
+        the next item is requested; its slot is then handed to the next decode.
+        """
+        pool = get_process_pool()
+        queue = deque(paths)
+        pending = deque()
+        free = list(range(self.slots))
+
+        def submit():
+            while free and queue:
+                slot = free.pop()
+                path = queue.popleft()
+                fut = pool.submit(_fill_slot, self.shm.name, slot, self.shape, path, self.size, self.resize)
+                pending.append((path, slot, fut))
+
+        try:
+            submit()
+            while pending:
+                path, slot, fut = pending.popleft()
+                try:
+                    error = fut.result()
+                except BrokenProcessPool:
+                    reset_process_pool()
+                    raise
+                if error:
+                    yield path, None, error
+                else:
+                    yield path, self.view(slot), None
+                free.append(slot)
+                submit()
+        finally:
+            for _, _, fut in pending:
+                fut.cancel()
+
+    def close(self):
+        try:
+            self.shm.close()
+        except BufferError:
+            pass  # A caller still holds the last tensor, the mapping goes with it
+        try:
+            self.shm.unlink()
+        except FileNotFoundError:
+            pass
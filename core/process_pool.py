@@ -0,0 +1,100 @@
+import os
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+# One shared pool for CPU heavy batch jobs (decoding, hashing, editing).
+# Workers are started lazily on first use and live until the app exits. They are spawned,
+# not forked, so each imports only the Qt-free module its job lives in (no torch, no Qt).
+_pool = None
+_lock = threading.Lock()
+
+def default_workers():
+    # Leave one core for the UI thread
+    return max(1, min(8, (os.cpu_count() or 2) - 1))
+
+def get_process_pool():
+    global _pool
+    with _lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=default_workers(),
+                                        mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+def reset_process_pool():
+    """Drop a broken pool (e.g. a worker crashed) so the next call starts a fresh one."""
+    global _pool
+    with _lock:
+        pool, _pool = _pool, None
+    if pool:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+def shutdown_process_pool():
+    global _pool
+    with _lock:
+        pool, _pool = _pool, None
+    if pool:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+def memory_usage():
+    """-> (rss, peak rss) in bytes of the calling process; 0 where the platform does not report it."""
+    try:
+        if os.name == 'nt':
+            import ctypes
+            from ctypes import wintypes
+
+            class Counters(ctypes.Structure):
+                _fields_ = [("cb", wintypes.DWORD), ("PageFaultCount", wintypes.DWORD)] + [
+                    (name, ctypes.c_size_t) for name in (
+                        "PeakWorkingSetSize", "WorkingSetSize", "QuotaPeakPagedPoolUsage", "QuotaPagedPoolUsage",
+                        "QuotaPeakNonPagedPoolUsage", "QuotaNonPagedPoolUsage", "PagefileUsage", "PeakPagefileUsage")]
+
+            counters = Counters()
+            counters.cb = ctypes.sizeof(counters)
+            process = ctypes.windll.kernel32.GetCurrentProcess
+            process.restype = wintypes.HANDLE
+            if ctypes.windll.psapi.GetProcessMemoryInfo(process(), ctypes.byref(counters), counters.cb):
+                return counters.WorkingSetSize, counters.PeakWorkingSetSize
+            return 0, 0
+        if os.path.exists("/proc/self/status"):
+            fields = {}
+            with open("/proc/self/status") as f:
+                for line in f:
+                    key, _, value = line.partition(":")
+                    if key in ("VmRSS", "VmHWM"):
+                        fields[key] = int(value.split()[0]) * 1024
+            return fields.get("VmRSS", 0), fields.get("VmHWM", 0)
+        import resource
+        return 0, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss   # Bytes on macOS
+    except Exception:
+        return 0, 0
+
+def run_chunked(fn, items, *args, chunk_size=256, progress=None, cancelled=None):
+    """
+    Maps fn(chunk, *args) over chunks of `items` in the shared pool, keeping a bounded
+    number in flight. Yields results in order. fn must be a module-level function.
+    """
+    pool = get_process_pool()
+    chunks = [items[i:i + chunk_size] for i in range(0, len(items), chunk_size)]
+    window = default_workers() * 2
+    pending = []
+    done = 0
+    next_chunk = 0
+    while next_chunk < len(chunks) or pending:
+        while next_chunk < len(chunks) and len(pending) < window:
+            pending.append((len(chunks[next_chunk]), pool.submit(fn, chunks[next_chunk], *args)))
+            next_chunk += 1
+        size, fut = pending.pop(0)
+        result = fut.result()
+        done += size
+        if progress:
+            progress(done, len(items))
+        yield result
+        if cancelled and cancelled():
+            for _, f in pending:
+                f.cancel()
+            # Drain what already started so callers can account for (or clean up) its work
+            for _, f in pending:
+                if not f.cancelled():
+                    yield f.result()
+            return
@@ -0,0 +1,142 @@
+import numpy as np
+import cv2
+from PIL import Image
+from core.process_pool import run_chunked
+from core.orientation import orientation_of, oriented_size, open_header
+
+# No Qt imports: quality_chunk runs inside the process pool.
+
+ANALYSIS_SIZE = 1024   # Longest side the metrics are measured at, so scores compare across resolutions
+CHUNK_FILES = 32
+BLUR_THRESHOLD = 100.0   # Laplacian variance at ANALYSIS_SIZE
+MIN_SIDE = 512
+MIN_JPEG_QUALITY = 70
+MIN_ENTROPY = 2.0   # Bits; a flat or near-blank image
+CLIP_LOW, CLIP_HIGH = 4, 251
+CLIP_FRACTION = 0.25
+DARK_MEAN, BRIGHT_MEAN = 40, 215
+
+ISSUES = {
+    "blurry": "Blurry",
+    "small": "Low resolution",
+    "compressed": "Heavy JPEG compression",
+    "blank": "Nearly blank",
+    "dark": "Under-exposed",
+    "bright": "Over-exposed",
+}
+FILTERS = {"": "All images", "issues": "⚠ Any quality issue", **ISSUES, "clean": "✓ No quality issues"}
+
+# IJG (libjpeg) luminance table at quality 50; encoders scale it linearly with quality
+_STD_LUMA = np.array([
+    16, 11, 10, 16, 24, 40, 51, 61, 12, 12, 14, 19, 26, 58, 60, 55,
+    14, 13, 16, 24, 40, 57, 69, 56, 14, 17, 22, 29, 51, 87, 80, 62,
+    18, 22, 37, 56, 68, 109, 103, 77, 24, 35, 55, 64, 81, 104, 113, 92,
+    49, 64, 78, 87, 103, 121, 120, 101, 72, 92, 95, 98, 112, 100, 103, 99])
+
+def jpeg_quality(tables):
+    """Estimates the IJG quality setting from the luminance quantization table (order independent)."""
+    luma = tables.get(0) if tables else None
+    if not luma:
+        return None
+    scale = 100.0 * sum(luma) / _STD_LUMA.sum()
+    quality = (200 - scale) / 2 if scale <= 100 else 5000 / scale
+    return int(round(min(100.0, max(1.0, quality))))
+
+# --- PROCESS POOL SIDE ---
+def _analysis_image(path):
+    """-> (width, height, jpeg quality or None, grey array). Orientation is left alone, no metric depends on it."""
+    with open_header(path) as img:
+        width, height = oriented_size(img.width, img.height, orientation_of(img))
+        quality = jpeg_quality(getattr(img, "quantization", None)) if img.format == "JPEG" else None
+        # JPEG only: libjpeg decodes at 1/2..1/8 scale
+        img.draft("L", (ANALYSIS_SIZE, ANALYSIS_SIZE))
+        grey = img.convert("L")
+        grey.thumbnail((ANALYSIS_SIZE, ANALYSIS_SIZE), Image.Resampling.BILINEAR)
+        return width, height, quality, np.asarray(grey)
+
+def quality_chunk(paths):
+    """-> ([(path, metrics)], [(path, error)]). Histogram statistics are computed for the whole chunk at once."""
+    ok, errors, greys = [], [], []
+    for path in paths:
+        try:
+            w, h, jpeg, grey = _analysis_image(path)
+            blur = float(cv2.Laplacian(grey, cv2.CV_32F).var())
+            ok.append((path, {"width": w, "height": h, "blur": round(blur, 1), "jpeg": jpeg}))
+            greys.append(grey)
+        except Exception as e:
+            errors.append((path, str(e)))
+    if not ok:
+        return [], errors
+
+    hist = np.stack([np.bincount(g.ravel(), minlength=256) for g in greys]).astype(np.float64)
+    p = hist / hist.sum(axis=1, keepdims=True)
+    entropy = -(p * np.log2(np.where(p > 0, p, 1))).sum(axis=1)
+    mean = p @ np.arange(256)
+    dark = p[:, :CLIP_LOW + 1].sum(axis=1)
+    bright = p[:, CLIP_HIGH:].sum(axis=1)
+    for i, (_, metrics) in enumerate(ok):
+        metrics.update(entropy=round(float(entropy[i]), 3), mean=round(float(mean[i]), 1),
+                       dark=round(float(dark[i]), 4), bright=round(float(bright[i]), 4))
+    return ok, errors
+
+# --- SCORING ---
+def issues(metrics):
+    """Keys of ISSUES that apply to an analyzed image."""
+    found = []
+    if metrics["blur"] < BLUR_THRESHOLD: found.append("blurry")
+    if min(metrics["width"], metrics["height"]) < MIN_SIDE: found.append("small")
+    if metrics["jpeg"] is not None and metrics["jpeg"] < MIN_JPEG_QUALITY: found.append("compressed")
+    if metrics["entropy"] < MIN_ENTROPY: found.append("blank")
+    if metrics["dark"] > CLIP_FRACTION or metrics["mean"] < DARK_MEAN: found.append("dark")
+    if metrics["bright"] > CLIP_FRACTION or metrics["mean"] > BRIGHT_MEAN: found.append("bright")
+    return found
+
+def matches(metrics, mode):
+    """Quality filter test; images not analyzed yet only pass 'All images'."""
+    if not mode:
+        return True
+    if metrics is None:
+        return False
+    found = issues(metrics)
+    if mode == "issues": return bool(found)
+    if mode == "clean": return not found
+    return mode in found
+
+def describe(metrics):
+    """Tooltip text."""
+    lines = [
+        f"{metrics['width']} x {metrics['height']} · Sharpness {metrics['blur']:.0f}"
+        + (f" · JPEG q≈{metrics['jpeg']}" if metrics['jpeg'] is not None else ""),
+        f"Entropy {metrics['entropy']:.1f} bits · Mean {metrics['mean']:.0f} · "
+        f"Clipped {metrics['dark'] * 100:.0f}% dark / {metrics['bright'] * 100:.0f}% bright",
+    ]
+    found = issues(metrics)
+    if found:
+        lines.append("⚠ " + ", ".join(ISSUES[k] for k in found))
+    return "\n".join(lines)
+
+def compute_quality(paths, catalog, progress=None, cancelled=None):
+    """
+    -> ({path: metrics}, errors). Metrics are cached in the catalog per file (a changed size
+    or mtime drops them); the rest are measured in chunks on the shared pool.
+    """
+    results, todo, errors = {}, [], []
+    for path in paths:
+        entry = catalog.entry(path)
+        if entry is None:
+            errors.append((path, "Missing"))
+        elif entry.quality:
+            results[path] = entry.quality
+        else:
+            todo.append(path)
+    cached = len(results)
+    total = cached + len(todo)
+    if progress: progress(cached, total)
+    if todo:
+        report = (lambda done, _: progress(cached + done, total)) if progress else None
+        for measured, chunk_errors in run_chunked(quality_chunk, todo, chunk_size=CHUNK_FILES,
+                                                  progress=report, cancelled=cancelled):
+            catalog.set_quality(measured)
+            results.update(measured)
+            errors.extend(chunk_errors)
+    return results, errors
@@ -0,0 +1,128 @@
+from PySide6.QtCore import Qt, QObject, Signal, QRectF
+from PySide6.QtGui import QPainter, QPen, QColor
+
+class SelectionModel(QObject):
+    """
+    Selected subset of a grid's items, kept apart from the card widgets.
+    Every operation updates the set in one pass and emits `changed` once with
+    what flipped, so views restyle only those cards and refresh side panels once.
+    """
+    changed = Signal(object, object)  # added paths, removed paths
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.order = []        # keys in grid order, for shift-click ranges
+        self.position = {}
+        self.selected = set()
+        self.anchor = None     # last plainly clicked key
+        self.current = None    # most recently selected key
+
+    def __len__(self):
+        return len(self.selected)
+
+    def __contains__(self, key):
+        return key in self.selected
+
+    def set_items(self, keys):
+        """New grid contents; the selection starts empty without emitting (the cards are new too)."""
+        self.order = list(keys)
+        self.position = {key: i for i, key in enumerate(self.order)}
+        self.selected = set()
+        self.anchor = self.current = None
+
+    def reorder(self, keys):
+        """Same items in a new grid order (re-sorted view); the selection is kept."""
+        self.order = list(keys)
+        self.position = {key: i for i, key in enumerate(self.order)}
+
+    def _replace(self, new_selected, current=None):
+        added = new_selected - self.selected
+        removed = self.selected - new_selected
+        if not added and not removed:
+            return
+        self.selected = new_selected
+        if current in new_selected:
+            self.current = current
+        elif added:
+            self.current = max(added, key=lambda k: self.position.get(k, -1)) if len(added) > 1 else next(iter(added))
+        elif self.current in removed:
+            self.current = None
+        self.changed.emit(added, removed)
+
+    # --- SINGLE ITEMS ---
+    def toggle(self, key):
+        self.anchor = key
+        if key in self.selected:
+            self._replace(self.selected - {key})
+        else:
+            self._replace(self.selected | {key}, key)
+
+    def select_range(self, key, visible=None):
+        """Adds every key from the anchor to `key` in grid order, skipping ones `visible` rejects."""
+        if self.anchor not in self.position or key not in self.position:
+            self.toggle(key)
+            return
+        start, end = sorted((self.position[self.anchor], self.position[key]))
+        keys = self.order[start:end + 1]
+        if visible is not None:
+            keys = [k for k in keys if k == key or visible(k)]
+        self._replace(self.selected | set(keys), key)
+
+    # --- BULK ---
+    def select(self, keys):
+        self._replace(self.selected | set(keys))
+
+    def deselect(self, keys):
+        self._replace(self.selected - set(keys))
+
+    def select_only(self, keys):
+        """Select-by-query: the selection becomes exactly `keys`."""
+        self._replace(set(keys) & self.position.keys())
+
+    def toggle_all(self, keys=None):
+        """Select All button: selects `keys` (default everything), or clears them if all already are."""
+        keys = set(self.order if keys is None else keys)
+        if keys and keys <= self.selected:
+            self._replace(self.selected - keys)
+        else:
+            self._replace(self.selected | keys)
+
+    def invert(self, keys=None):
+        keys = set(self.order if keys is None else keys)
+        self._replace((self.selected - keys) | (keys - self.selected))
+
+    def clear(self):
+        self._replace(set())
+
+    def remove_items(self, keys):
+        """Items deleted from the grid."""
+        keys = set(keys)
+        self.order = [k for k in self.order if k not in keys]
+        self.position = {key: i for i, key in enumerate(self.order)}
+        if self.anchor in keys:
+            self.anchor = None
+        self._replace(self.selected - keys)
+
+def restyle_cards(container, cards, added, removed):
+    """Flips the cards' selected look with one repaint of the grid."""
+    container.setUpdatesEnabled(False)
+    for path in removed:
+        card = cards.get(path)
+        if card: card.set_selected(False)
+    for path in added:
+        card = cards.get(path)
+        if card: card.set_selected(True)
+    container.setUpdatesEnabled(True)
+
+def paint_selection_border(widget, color, radius=8, width=2):
+    """
+    Draws the selected outline on top of the card's base stylesheet. Flipping a
+    card is then just update(), instead of a per-card setStyleSheet/re-polish.
+    """
+    painter = QPainter(widget)
+    painter.setRenderHint(QPainter.Antialiasing)
+    painter.setPen(QPen(QColor(color), width))
+    painter.setBrush(Qt.NoBrush)
+    inset = width / 2
+    painter.drawRoundedRect(QRectF(widget.rect()).adjusted(inset, inset, -inset, -inset), radius, radius)
+    painter.end()
@@ -0,0 +1,222 @@
+import os
+import cv2
+import numpy as np
+from PIL import Image
+from core.process_pool import run_chunked
+from core.orientation import orientation_of, upright_pil, open_header
+from core import edit_ops
+
+# No Qt imports: detect_chunk runs inside the process pool.
+
+SMART_FOCUS = "Smart (faces, saliency)"
+ANALYSIS_SIZE = 512   # Longest side of the copy the detectors see
+CHUNK_FILES = 16
+# Shipped in cv2.data by the opencv-python 4.x wheels; OpenCV 5 moved CascadeClassifier to contrib
+CASCADES = ("haarcascade_frontalface_alt2.xml", "haarcascade_profileface.xml")
+# A face box covers brows to mouth: grow it to take in the hair and chin (fractions of the box)
+HEAD_MARGIN = {"left": 0.2, "top": 0.6, "right": 0.2, "bottom": 0.3}
+# Source of a focus found without a face detector; it is detected again once one is available
+SALIENCY_ONLY = "saliency (no face detector)"
+FACES_UNAVAILABLE = ("Face detection is unavailable in this OpenCV build (it needs opencv-python 4.x); "
+                     "smart crops centre on the most salient region only.")
+# Below this grey level range an image has no salient region to find
+FLAT_RANGE = 8
+
+_cascades = None
+
+def load_cascades():
+    """Per process. Empty when this OpenCV build has no cascade support, saliency is used alone then."""
+    global _cascades
+    if _cascades is None:
+        _cascades = []
+        folder = getattr(getattr(cv2, "data", None), "haarcascades", "")
+        if hasattr(cv2, "CascadeClassifier") and folder:
+            for name in CASCADES:
+                path = os.path.join(folder, name)
+                if os.path.exists(path):
+                    cascade = cv2.CascadeClassifier(path)
+                    if not cascade.empty():
+                        _cascades.append((name, cascade))
+    return _cascades
+
+def faces_available():
+    return bool(load_cascades())
+
+# --- PROCESS POOL SIDE ---
+def _analysis_image(path):
+    """Upright greyscale copy, longest side ANALYSIS_SIZE, from a reduced decode where the format allows."""
+    with open_header(path) as img:
+        turn = orientation_of(img)
+        img.draft("L", (ANALYSIS_SIZE, ANALYSIS_SIZE))
+        grey = upright_pil(img.convert("L"), turn)
+        grey.thumbnail((ANALYSIS_SIZE, ANALYSIS_SIZE), Image.Resampling.BILINEAR)
+        return np.asarray(grey)
+
+def detect_faces(grey):
+    """-> [(x, y, w, h)] in pixels of `grey`; profiles are searched both ways round, only if no frontal face is found."""
+    cascades = load_cascades()
+    if not cascades:
+        return []
+    equalized = cv2.equalizeHist(grey)
+    size = max(24, min(grey.shape) // 12)
+    options = {"scaleFactor": 1.15, "minNeighbors": 5, "minSize": (size, size)}
+    faces = []
+    for name, cascade in cascades:
+        if faces:
+            break   # Later cascades (profiles) only run when the earlier ones found nothing
+        faces.extend(tuple(int(v) for v in f) for f in cascade.detectMultiScale(equalized, **options))
+        if "profile" in name:
+            # The profile cascade only knows one side
+            width = grey.shape[1]
+            for x, y, w, h in cascade.detectMultiScale(equalized[:, ::-1].copy(), **options):
+                faces.append((int(width - x - w), int(y), int(w), int(h)))
+    return faces
+
+def spectral_residual(grey, size=64):
+    """Saliency map (Hou & Zhang 2007): what is left of the log spectrum after removing its smooth trend."""
+    small = cv2.resize(grey, (size, size), interpolation=cv2.INTER_AREA).astype(np.float32)
+    spectrum = np.fft.fft2(small)
+    amplitude = np.abs(spectrum)
+    # Relative floor: the zeros of a sparse image's spectrum would otherwise dominate the residual
+    log_amplitude = np.log(amplitude + amplitude.max() * 1e-3 + 1e-6).astype(np.float32)
+    residual = log_amplitude - cv2.blur(log_amplitude, (3, 3))
+    saliency = np.abs(np.fft.ifft2(np.exp(residual + 1j * np.angle(spectrum)))) ** 2
+    return cv2.GaussianBlur(saliency.astype(np.float32), (0, 0), 3)
+
+def saliency_point(grey):
+    """Centroid of the salient region (above 3x the mean, as in the paper), normalised 0..1; the centre for flat images."""
+    if int(grey.max()) - int(grey.min()) < FLAT_RANGE:
+        return 0.5, 0.5
+    saliency = spectral_residual(grey)
+    mask = saliency > saliency.mean() * 3
+    weights = np.where(mask, saliency, 0) if mask.any() else saliency
+    total = weights.sum()
+    if not total > 0:
+        return 0.5, 0.5
+    ys, xs = np.indices(weights.shape)
+    h, w = weights.shape
+    return float((weights * (xs + 0.5)).sum() / total / w), float((weights * (ys + 0.5)).sum() / total / h)
+
+def detect_focus(path):
+    """-> [fx, fy, box or None, source]: the point to centre crops on and, for faces, the head box to keep, normalised to the upright image."""
+    grey = _analysis_image(path)
+    h, w = grey.shape
+    faces = detect_faces(grey)
+    if faces:
+        x0 = min(x - fw * HEAD_MARGIN["left"] for x, y, fw, fh in faces)
+        y0 = min(y - fh * HEAD_MARGIN["top"] for x, y, fw, fh in faces)
+        x1 = max(x + fw * (1 + HEAD_MARGIN["right"]) for x, y, fw, fh in faces)
+        y1 = max(y + fh * (1 + HEAD_MARGIN["bottom"]) for x, y, fw, fh in faces)
+        box = [max(0.0, x0 / w), max(0.0, y0 / h), min(1.0, x1 / w), min(1.0, y1 / h)]
+        return [(box[0] + box[2]) / 2, (box[1] + box[3]) / 2, box, "faces"]
+    fx, fy = saliency_point(grey)
+    return [fx, fy, None, "saliency" if load_cascades() else SALIENCY_ONLY]
+
+def detect_chunk(paths):
+    """-> [(path, focus or None, error)]"""
+    cv2.setNumThreads(1)
+    results = []
+    for path in paths:
+        try:
+            results.append((path, detect_focus(path), ""))
+        except Exception as e:
+            results.append((path, None, str(e)))
+    return results
+
+# --- FOCUS INTO CROP STEPS ---
+def _through_step(point, step, w, h):
+    """Maps a normalised focus through one edit step -> (point, w, h)."""
+    fx, fy, box = point[0], point[1], point[2]
+    op = step["op"]
+    if op == 'rotate':
+        if step.get('direction', 'cw') == 'cw':
+            turn = lambda x, y: (1 - y, x)
+        else:
+            turn = lambda x, y: (y, 1 - x)
+        fx, fy = turn(fx, fy)
+        if box:
+            (ax, ay), (bx, by) = turn(box[0], box[1]), turn(box[2], box[3])
+            box = [min(ax, bx), min(ay, by), max(ax, bx), max(ay, by)]
+        return [fx, fy, box] + point[3:], h, w
+    if op == 'resize':
+        return point, *edit_ops.resize_size(w, h, step)
+    if op == 'crop':
+        t_w, t_h = int(step['w']), int(step['h'])
+        if w < t_w or h < t_h:
+            return point, w, h
+        x, y = edit_ops.crop_origin(w, h, t_w, t_h, step.get('focus', 'Center'), step.get('point'))
+        shift = lambda vx, vy: (min(1.0, max(0.0, (vx * w - x) / t_w)), min(1.0, max(0.0, (vy * h - y) / t_h)))
+        fx, fy = shift(fx, fy)
+        if box:
+            box = [*shift(box[0], box[1]), *shift(box[2], box[3])]
+        return [fx, fy, box] + point[3:], t_w, t_h
+    return point, w, h
+
+def needs_focus(steps):
+    return any(s["op"] == 'crop' and s.get('focus') == SMART_FOCUS and 'point' not in s for s in steps)
+
+def place_focus(steps, focus, size):
+    """Gives every smart crop in `steps` the focus point as it lands after the steps before it."""
+    placed, point = [], focus
+    w, h = size
+    for step in steps:
+        if step["op"] == 'crop' and step.get('focus') == SMART_FOCUS:
+            step = dict(step, point=point[:3])
+        placed.append(step)
+        point, w, h = _through_step(point, step, w, h)
+    return placed
+
+def find_focus(paths, catalog, progress=None, cancelled=None):
+    """
+    -> ({path: (focus, (w, h))}, cached paths, errors). Focus points are cached in the catalog
+    per file (a changed size or mtime drops them); the rest are detected in chunks on the shared pool.
+    """
+    found, sizes, todo, errors = {}, {}, [], []
+    for path in paths:
+        entry = catalog.entry(path)
+        if entry is None or not entry.width:
+            errors.append((path, "Unreadable"))
+            continue
+        sizes[path] = (entry.width, entry.height)
+        if entry.focus and not (entry.focus[3] == SALIENCY_ONLY and faces_available()):
+            found[path] = (entry.focus, sizes[path])
+        else:
+            todo.append(path)
+    cached = set(found)
+    if todo:
+        total = len(cached) + len(todo)
+        report = (lambda done, _: progress(len(cached) + done, total)) if progress else None
+        for chunk in run_chunked(detect_chunk, todo, chunk_size=CHUNK_FILES, progress=report, cancelled=cancelled):
+            for path, focus, error in chunk:
+                if focus is None:
+                    errors.append((path, error))
+                    continue
+                catalog.set_focus(path, focus)
+                found[path] = (focus, sizes[path])
+    return found, cached, errors
+
+def resolve_focus(jobs, catalog, progress=None, cancelled=None):
+    """
+    [(path, steps)] -> (jobs, counts): smart crops get their focus point, images whose focus
+    could not be found fall back to a centred crop. counts: {'cached'|'faces'|'saliency'|'center': n}
+    """
+    paths = [path for path, steps in jobs if needs_focus(steps)]
+    if not paths:
+        return jobs, {}
+    found, cached, errors = find_focus(paths, catalog, progress, cancelled)
+    for path, error in errors:
+        print(f"Smart crop: no focus for {path}: {error}")
+    counts, resolved = {}, []
+    for path, steps in jobs:
+        if needs_focus(steps):
+            if path in found:
+                focus, size = found[path]
+                steps = place_focus(steps, focus, size)
+                kind = "cached" if path in cached else focus[3]
+            else:
+                steps = [dict(s, focus='Center') if s["op"] == 'crop' and s.get('focus') == SMART_FOCUS else s
+                         for s in steps]
+                kind = "center"
+            counts[kind] = counts.get(kind, 0) + 1
+        resolved.append((path, steps))
+    return resolved, counts
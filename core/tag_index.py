@@ -0,0 +1,253 @@
+import os
+import re
+from bisect import bisect_left
+
+WORD_RE = re.compile(r"[^\W_]+", re.UNICODE)
+
+def split_tags(text):
+    """'a, b ,c' -> ['a', 'b', 'c'] (lowercase, empty entries dropped)."""
+    return [t.strip().lower() for t in text.split(',') if t.strip()]
+
+class TagIndex:
+    """
+    In-memory inverted index over captions: exact tag -> docs and word -> docs.
+    Documents are image paths; file names are indexed as words too.
+
+    Query syntax (case-insensitive):
+        1girl, smile         AND (comma, space or the keyword AND)
+        cat OR dog | fox     OR
+        -text / NOT text     NOT
+        "simple background"  exact tag
+        blue                 tag or word in caption / file name
+        blu*                 prefix (bare terms without an exact hit fall back to this)
+        ( ... )              grouping
+    """
+    def __init__(self):
+        self.docs = {}        # doc -> (tags frozenset, words frozenset)
+        self.tag_postings = {}
+        self.word_postings = {}
+        self._sorted_tags = None
+        self._sorted_words = None
+
+    def __len__(self):
+        return len(self.docs)
+
+    def clear(self):
+        self.docs.clear()
+        self.tag_postings.clear()
+        self.word_postings.clear()
+        self._sorted_tags = self._sorted_words = None
+
+    # --- MAINTENANCE ---
+    def update(self, doc, text):
+        """(Re)indexes one document. Cheap enough to call on every edit."""
+        tags = frozenset(split_tags(text))
+        stem = os.path.splitext(os.path.basename(doc))[0].lower()
+        words = frozenset(WORD_RE.findall(text.lower())) | frozenset(WORD_RE.findall(stem)) | {stem}
+
+        old = self.docs.get(doc)
+        if old:
+            old_tags, old_words = old
+            if old_tags == tags and old_words == words:
+                return
+            self._unpost(self.tag_postings, doc, old_tags - tags)
+            self._unpost(self.word_postings, doc, old_words - words)
+            new_tags, new_words = tags - old_tags, words - old_words
+        else:
+            new_tags, new_words = tags, words
+
+        self._post(self.tag_postings, doc, new_tags)
+        self._post(self.word_postings, doc, new_words)
+        if new_tags: self._sorted_tags = None
+        if new_words: self._sorted_words = None
+        self.docs[doc] = (tags, words)
+
+    def remove(self, doc):
+        old = self.docs.pop(doc, None)
+        if old:
+            self._unpost(self.tag_postings, doc, old[0])
+            self._unpost(self.word_postings, doc, old[1])
+
+    def _post(self, postings, doc, keys):
+        for key in keys:
+            bucket = postings.get(key)
+            if bucket is None:
+                postings[key] = {doc}
+            else:
+                bucket.add(doc)
+
+    def _unpost(self, postings, doc, keys):
+        for key in keys:
+            bucket = postings.get(key)
+            if bucket is not None:
+                bucket.discard(doc)
+                if not bucket:
+                    del postings[key]
+                    self._sorted_tags = self._sorted_words = None
+
+    # --- LOOKUPS ---
+    def tag_docs(self, tag):
+        return self.tag_postings.get(tag.lower(), set())
+
+    def word_docs(self, word):
+        return self.word_postings.get(word.lower(), set())
+
+    def prefix_docs(self, prefix):
+        if self._sorted_tags is None:
+            self._sorted_tags = sorted(self.tag_postings)
+        if self._sorted_words is None:
+            self._sorted_words = sorted(self.word_postings)
+        result = set()
+        for keys, postings in ((self._sorted_tags, self.tag_postings), (self._sorted_words, self.word_postings)):
+            i = bisect_left(keys, prefix)
+            while i < len(keys) and keys[i].startswith(prefix):
+                result |= postings[keys[i]]
+                i += 1
+        return result
+
+    def term_docs(self, term):
+        """Exact tag or word; falls back to a prefix match so partially typed terms still hit."""
+        term = term.lower()
+        tag_hits = self.tag_postings.get(term)
+        word_hits = self.word_postings.get(term)
+        if tag_hits and word_hits:
+            return tag_hits | word_hits
+        if tag_hits or word_hits:
+            return tag_hits or word_hits
+        return self.prefix_docs(term)
+
+    # --- QUERIES ---
+    def search(self, query):
+        """Matching docs (read-only set), or None when the query puts no constraint (= everything)."""
+        tokens = tokenize_query(query)
+        if not tokens:
+            return None
+        return _QueryParser(tokens, self).parse()
+
+TOKEN_RE = re.compile(r'\s*(?:(")([^"]*)"?|(\()|(\))|(,)|(\|)|([^\s,()|"]+))')
+
+def tokenize_query(query):
+    tokens = []
+    pos = 0
+    query = query.strip()
+    while pos < len(query):
+        m = TOKEN_RE.match(query, pos)
+        if not m or m.end() == pos:
+            break
+        pos = m.end()
+        if m.group(1):
+            tokens.append(("PHRASE", m.group(2).strip().lower()))
+        elif m.group(3): tokens.append(("(", None))
+        elif m.group(4): tokens.append((")", None))
+        elif m.group(5): tokens.append(("AND", None))
+        elif m.group(6): tokens.append(("OR", None))
+        else:
+            word = m.group(7)
+            upper = word.upper()
+            if upper in ("AND", "&&"): tokens.append(("AND", None))
+            elif upper in ("OR", "||"): tokens.append(("OR", None))
+            elif upper == "NOT" or word == "-": tokens.append(("NOT", None))
+            elif word.startswith("-") and len(word) > 1:
+                tokens.append(("NOT", None))
+                tokens.append(("TERM", word[1:].lower()))
+            else:
+                tokens.append(("TERM", word.lower()))
+    return tokens
+
+OPERAND_END = (None, "AND", "OR", ")")
+
+def _and(a, b):
+    if a is None: return b
+    if b is None: return a
+    return a & b
+
+class _QueryParser:
+    """
+    Recursive descent: or := and ('OR' and)* ; and := unary ([AND] unary)* ;
+    unary := NOT unary | '(' or ')' | term. Incomplete pieces (a trailing OR,
+    a lone '-', empty quotes) evaluate to None and simply add no constraint.
+    """
+    def __init__(self, tokens, index):
+        self.tokens = tokens
+        self.pos = 0
+        self.index = index
+        self._all = None
+
+    def all_docs(self):
+        if self._all is None:
+            self._all = set(self.index.docs)
+        return self._all
+
+    def peek(self):
+        return self.tokens[self.pos][0] if self.pos < len(self.tokens) else None
+
+    def parse(self):
+        result = self.parse_or()
+        # Ignore stray closing parens and keep going as AND
+        while self.pos < len(self.tokens):
+            self.pos += 1
+            if self.pos < len(self.tokens):
+                result = _and(result, self.parse_or())
+        return result
+
+    def parse_or(self):
+        result = self.parse_and()
+        while self.peek() == "OR":
+            self.pos += 1
+            operand = self.parse_and()
+            if operand is not None:
+                result = operand if result is None else result | operand
+        return result
+
+    def parse_and(self):
+        result = None
+        while True:
+            kind = self.peek()
+            if kind == "AND":
+                self.pos += 1
+                continue
+            if kind is None or kind in ("OR", ")"):
+                break
+            if kind == "NOT" and result is not None:
+                # 'a -b' as a difference, without materialising the complement of b
+                self.pos += 1
+                if self.peek() not in OPERAND_END:
+                    operand = self.parse_unary()
+                    if operand is not None: result = result - operand
+                continue
+            result = _and(result, self.parse_unary())
+            if result is not None and not result:
+                # Short circuit, but consume the rest of this AND chain
+                self.skip_and_chain()
+                return set()
+        return result
+
+    def skip_and_chain(self):
+        depth = 0
+        while self.pos < len(self.tokens):
+            kind = self.peek()
+            if depth == 0 and kind in ("OR", ")"):
+                return
+            if kind == "(": depth += 1
+            elif kind == ")": depth -= 1
+            self.pos += 1
+
+    def parse_unary(self):
+        kind, value = self.tokens[self.pos]
+        self.pos += 1
+        if kind == "NOT":
+            if self.peek() in OPERAND_END:
+                return None
+            operand = self.parse_unary()
+            return None if operand is None else self.all_docs() - operand
+        if kind == "(":
+            result = self.parse_or()
+            if self.peek() == ")":
+                self.pos += 1
+            return result
+        if kind == "PHRASE":
+            return self.index.tag_docs(value) if value else None
+        # TERM
+        if value.endswith("*") and len(value) > 1:
+            return self.index.prefix_docs(value[:-1])
+        return self.index.term_docs(value)
@@ -0,0 +1,197 @@
+import os
+import re
+import csv
+
+# No Qt imports: compiled normalizers are pickled into the process pool for folder runs.
+
+ALIAS_FILE = "tag_aliases.csv"
+IMPLICATION_FILE = "tag_implications.csv"
+
+ORDER_MODES = {
+    "keep": "Keep original order",
+    "alpha": "Alphabetical",
+}
+
+DEFAULT_NORMALIZE = {
+    "lowercase": True,
+    "underscores": True,
+    "dedupe": True,
+    "aliases": True,
+    "implications": True,
+    "order": "keep",
+    "pin_first": "",
+    "alias_csv": ALIAS_FILE,
+    "implication_csv": IMPLICATION_FILE,
+    "after_autotag": False,
+    "after_caption": False,
+}
+
+_SPACES = re.compile(r"\s+")
+
+def read_pairs(path):
+    """CSV rows 'a,b' -> [(a, b)]. Blank rows, '#' comments and extra columns are ignored."""
+    pairs = []
+    if not path or not os.path.exists(path):
+        return pairs
+    try:
+        with open(path, 'r', encoding='utf-8', newline='') as f:
+            for row in csv.reader(f):
+                if len(row) < 2 or row[0].lstrip().startswith('#'):
+                    continue
+                a, b = row[0].strip(), row[1].strip()
+                if a and b:
+                    pairs.append((a, b))
+    except Exception as e:
+        print(f"Tag Normalizer: cannot read {path}: {e}")
+    return pairs
+
+def _closure(graph):
+    """tag -> every tag reachable through implications, excluding itself."""
+    closure = {}
+    for start in graph:
+        seen = set()
+        stack = list(graph[start])
+        while stack:
+            tag = stack.pop()
+            if tag in seen or tag == start:
+                continue
+            seen.add(tag)
+            if tag in closure:
+                seen |= closure[tag]
+            else:
+                stack.extend(graph.get(tag, ()))
+        seen.discard(start)
+        closure[start] = seen
+    # Mutual implications (a cycle in the table) would prune both tags, drop them instead
+    return {tag: frozenset(t for t in implied if tag not in closure.get(t, ())) for tag, implied in closure.items()}
+
+class TagNormalizer:
+    """
+    Alias and implication tables compiled into plain dicts keyed by the
+    casefolded tag, so normalizing a caption is a few hash lookups per tag.
+    Holds no Qt objects and pickles into the process pool.
+    """
+    def __init__(self, options=None, aliases=(), implications=()):
+        opts = dict(DEFAULT_NORMALIZE)
+        opts.update(options or {})
+        self.lowercase = opts["lowercase"]
+        self.underscores = opts["underscores"]
+        self.dedupe = opts["dedupe"]
+        self.order = opts["order"]
+
+        # key -> canonical display form, chains (a -> b -> c) resolved to the last tag
+        raw = {self.key(a): self.clean(b) for a, b in aliases} if opts["aliases"] else {}
+        self.aliases = {}
+        for key, target in raw.items():
+            visited = {key}
+            while target.casefold() in raw and target.casefold() not in visited:
+                visited.add(target.casefold())
+                target = raw[target.casefold()]
+            self.aliases[key] = target
+
+        graph = {}
+        if opts["implications"]:
+            for a, b in implications:
+                a, b = self.canonical_key(a), self.canonical_key(b)
+                if a != b:
+                    graph.setdefault(a, set()).add(b)
+        self.implied = {k: v for k, v in _closure(graph).items() if v}
+
+        pins = [t for t in (p.strip() for p in opts["pin_first"].split(',')) if t]
+        self.pin_rank = {}
+        for tag in pins:
+            self.pin_rank.setdefault(self.canonical_key(tag), len(self.pin_rank))
+        # raw piece -> (key, display); datasets repeat the same few thousand tags
+        self._resolved = {}
+
+    def clean(self, tag):
+        tag = tag.strip()
+        if self.underscores:
+            tag = tag.replace('_', ' ')
+        if '  ' in tag or '\t' in tag or '\n' in tag:
+            tag = _SPACES.sub(' ', tag)
+        return tag.lower() if self.lowercase else tag
+
+    def key(self, tag):
+        return self.clean(tag).casefold()
+
+    def canonical_key(self, tag):
+        key = self.key(tag)
+        target = self.aliases.get(key)
+        return target.casefold() if target else key
+
+    def resolve(self, raw):
+        """raw tag -> (key, display) after cleanup and aliasing."""
+        tag = self.clean(raw)
+        target = self.aliases.get(tag.casefold())
+        if target:
+            tag = target
+        return tag.casefold(), tag
+
+    def normalize_tags(self, tags):
+        """[tag] -> [tag] after cleanup, aliasing, dedupe, implication pruning and ordering."""
+        entries = []  # (key, display)
+        seen = set()
+        resolved = self._resolved
+        for raw in tags:
+            entry = resolved.get(raw)
+            if entry is None:
+                entry = resolved[raw] = self.resolve(raw)
+            key, tag = entry
+            if not tag:
+                continue
+            if self.dedupe:
+                if key in seen:
+                    continue
+                seen.add(key)
+            entries.append((key, tag))
+
+        if self.implied:
+            implied = set()
+            for key, _ in entries:
+                implied.update(self.implied.get(key, ()))
+            if implied:
+                entries = [e for e in entries if e[0] not in implied]
+
+        if self.pin_rank or self.order == "alpha":
+            last = len(self.pin_rank)
+            alpha = self.order == "alpha"
+            indexed = list(enumerate(entries))
+            indexed.sort(key=lambda item: (self.pin_rank.get(item[1][0], last), item[1][0] if alpha else "", item[0]))
+            entries = [e for _, e in indexed]
+        return [tag for _, tag in entries]
+
+    def normalize(self, text):
+        return ", ".join(self.normalize_tags(text.split(',')))
+
+def rewrite(text, normalizer):
+    """find_replace rewriter: text -> (new_text, 1 if changed else 0)."""
+    new_text = normalizer.normalize(text)
+    return new_text, int(new_text != text)
+
+# --- SHARED INSTANCE ---
+_state = {"options": dict(DEFAULT_NORMALIZE), "normalizer": None, "stamp": None}
+
+def configure(options):
+    opts = dict(DEFAULT_NORMALIZE)
+    opts.update(options or {})
+    _state["options"] = opts
+    _state["normalizer"] = None
+
+def normalize_options():
+    return dict(_state["options"])
+
+def _mtime(path):
+    try:
+        return os.path.getmtime(path)
+    except OSError:
+        return None
+
+def get_normalizer():
+    """Compiled normalizer for the current settings, rebuilt when the CSV tables change on disk."""
+    opts = _state["options"]
+    stamp = (_mtime(opts["alias_csv"]), _mtime(opts["implication_csv"]))
+    if _state["normalizer"] is None or _state["stamp"] != stamp:
+        _state["normalizer"] = TagNormalizer(opts, read_pairs(opts["alias_csv"]), read_pairs(opts["implication_csv"]))
+        _state["stamp"] = stamp
+    return _state["normalizer"]
@@ -0,0 +1,120 @@
+import heapq
+from collections import Counter
+from itertools import combinations, product
+from core.tag_index import split_tags
+
+# Pair counting is quadratic per caption, long VLM tag dumps only contribute their first tags (in caption order)
+PAIR_TAG_LIMIT = 64
+
+class TagStats:
+    """
+    Tag frequencies and sparse co-occurrence counts over a set of captions.
+    update() applies only the delta between a caption's old and new tag set,
+    so edits cost O(changed tags x caption length) regardless of dataset size.
+    """
+    def __init__(self):
+        self.doc_tags = {}      # doc -> frozenset of tags
+        self.doc_pair_tags = {} # doc -> tags its pairs were counted from, for captions over PAIR_TAG_LIMIT
+        self.counts = Counter()
+        self.pairs = Counter()  # (a, b) with a < b
+        self.version = 0
+        self._pairs_cache = (None, None)
+
+    def __len__(self):
+        return len(self.doc_tags)
+
+    def clear(self):
+        self.doc_tags.clear()
+        self.doc_pair_tags.clear()
+        self.counts.clear()
+        self.pairs.clear()
+        self.version += 1
+
+    # --- MAINTENANCE ---
+    def update(self, doc, text):
+        tag_list = split_tags(text)
+        tags = frozenset(tag_list)
+        old = self.doc_tags.get(doc)
+        if old == tags:
+            return False
+        old_pair_tags = self.doc_pair_tags.get(doc, old) if old else frozenset()
+        if old:
+            self._count(old - tags, -1)
+        self._count(tags - old if old else tags, 1)
+
+        new_pair_tags = self._pair_tags(tag_list, tags)
+        if old_pair_tags != new_pair_tags:
+            self._pair_delta(old_pair_tags, new_pair_tags)
+        if new_pair_tags is tags:
+            self.doc_pair_tags.pop(doc, None)
+        else:
+            # Kept, so removing the doc later subtracts the same pairs whatever its order is then
+            self.doc_pair_tags[doc] = new_pair_tags
+
+        if tags:
+            self.doc_tags[doc] = tags
+        else:
+            self.doc_tags.pop(doc, None)
+        self.version += 1
+        return True
+
+    def remove(self, doc):
+        if doc in self.doc_tags:
+            self.update(doc, "")
+
+    def _pair_tags(self, tag_list, tags):
+        if len(tags) <= PAIR_TAG_LIMIT:
+            return tags
+        # Taggers list the most confident tags first
+        return frozenset(list(dict.fromkeys(tag_list))[:PAIR_TAG_LIMIT])
+
+    def _count(self, tags, delta):
+        counts = self.counts
+        for tag in tags:
+            counts[tag] += delta
+            if counts[tag] <= 0:
+                del counts[tag]
+
+    def _pair_delta(self, old, new):
+        pairs = self.pairs
+        removed, added = old - new, new - old
+        for tag in removed:
+            for other in old:
+                if other != tag and (other not in removed or tag < other):
+                    key = (tag, other) if tag < other else (other, tag)
+                    pairs[key] -= 1
+                    if pairs[key] <= 0:
+                        del pairs[key]
+        if not added:
+            return
+        kept = sorted(new - added)
+        added = sorted(added)
+        # Counter.update over itertools runs in C, this is the bulk of a first build
+        pairs.update(combinations(added, 2))
+        if kept:
+            pairs.update((a, b) if a < b else (b, a) for a, b in product(added, kept))
+
+    # --- QUERIES ---
+    def top(self, n=50, contains=""):
+        items = self.counts.items()
+        if contains:
+            items = [(t, c) for t, c in items if contains in t]
+        return heapq.nlargest(n, items, key=lambda item: item[1])
+
+    def rare(self, n=50, contains=""):
+        items = self.counts.items()
+        if contains:
+            items = [(t, c) for t, c in items if contains in t]
+        return heapq.nsmallest(n, items, key=lambda item: item[1])
+
+    def top_pairs(self, n=50, contains=""):
+        # Scans every pair, so reuse the last answer until something changes
+        key = (self.version, n, contains)
+        if self._pairs_cache[0] == key:
+            return self._pairs_cache[1]
+        items = self.pairs.items()
+        if contains:
+            items = [(p, c) for p, c in items if contains in p[0] or contains in p[1]]
+        result = heapq.nlargest(n, items, key=lambda item: item[1])
+        self._pairs_cache = (key, result)
+        return result
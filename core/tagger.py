@@ -1,86 +1,436 @@
 import os
+import time
+import threading
+from collections import OrderedDict
 import numpy as np
 import pandas as pd
 import onnxruntime as ort
-from PIL import Image
 from huggingface_hub import hf_hub_download
+from core.preprocess import decode_for_tagger, prepare_image, PreprocessRing
+from core.model_manager import MODEL_MANAGER
 
-# Best general purpose anime/illustration tagger
-REPO_ID = "SmilingWolf/wd-v1-4-convnextv2-tagger-v2"
-MODEL_FILE = "model.onnx"
-TAGS_FILE = "selected_tags.csv"
+# --- TAGGER REGISTRY ---
+# Every entry describes one downloadable WD14-style tagger.
+#   size:   square input resolution the model was exported with
+#   resize: "squash" stretches to a square, "pad" letterboxes on white first
+#           (the SmilingWolf reference preprocessing used by the v3 models)
+TAGGER_MODELS = {
+    "wd-v1-4-convnextv2-tagger-v2": {
+        "label": "ConvNextV2 v2 (Default)",
+        "repo_id": "SmilingWolf/wd-v1-4-convnextv2-tagger-v2",
+        "model_file": "model.onnx",
+        "tags_file": "selected_tags.csv",
+        # FIX: ConvNextV2 requires 448x448 input (SwinV2 used 446)
+        "size": 448,
+        "resize": "squash",
+    },
+    "wd-v1-4-swinv2-tagger-v2": {
+        "label": "SwinV2 v2",
+        "repo_id": "SmilingWolf/wd-v1-4-swinv2-tagger-v2",
+        "model_file": "model.onnx",
+        "tags_file": "selected_tags.csv",
+        "size": 448,
+        "resize": "pad",
+    },
+    "wd-v1-4-vit-tagger-v2": {
+        "label": "ViT v2",
+        "repo_id": "SmilingWolf/wd-v1-4-vit-tagger-v2",
+        "model_file": "model.onnx",
+        "tags_file": "selected_tags.csv",
+        "size": 448,
+        "resize": "pad",
+    },
+    "wd-v1-4-moat-tagger-v2": {
+        "label": "MOAT v2",
+        "repo_id": "SmilingWolf/wd-v1-4-moat-tagger-v2",
+        "model_file": "model.onnx",
+        "tags_file": "selected_tags.csv",
+        "size": 448,
+        "resize": "pad",
+    },
+    "wd-swinv2-tagger-v3": {
+        "label": "SwinV2 v3",
+        "repo_id": "SmilingWolf/wd-swinv2-tagger-v3",
+        "model_file": "model.onnx",
+        "tags_file": "selected_tags.csv",
+        "size": 448,
+        "resize": "pad",
+    },
+    "wd-convnext-tagger-v3": {
+        "label": "ConvNext v3",
+        "repo_id": "SmilingWolf/wd-convnext-tagger-v3",
+        "model_file": "model.onnx",
+        "tags_file": "selected_tags.csv",
+        "size": 448,
+        "resize": "pad",
+    },
+    "wd-vit-tagger-v3": {
+        "label": "ViT v3",
+        "repo_id": "SmilingWolf/wd-vit-tagger-v3",
+        "model_file": "model.onnx",
+        "tags_file": "selected_tags.csv",
+        "size": 448,
+        "resize": "pad",
+    },
+    "wd-vit-large-tagger-v3": {
+        "label": "ViT Large v3",
+        "repo_id": "SmilingWolf/wd-vit-large-tagger-v3",
+        "model_file": "model.onnx",
+        "tags_file": "selected_tags.csv",
+        "size": 448,
+        "resize": "pad",
+    },
+    "wd-eva02-large-tagger-v3": {
+        "label": "EVA02 Large v3 (Best, Slowest)",
+        "repo_id": "SmilingWolf/wd-eva02-large-tagger-v3",
+        "model_file": "model.onnx",
+        "tags_file": "selected_tags.csv",
+        "size": 448,
+        "resize": "pad",
+    },
+}
+
+DEFAULT_TAGGER = "wd-v1-4-convnextv2-tagger-v2"
+DEFAULT_CACHE_MB = 2048
+
+# Batches smaller than this are preprocessed on the calling thread,
+# starting pool workers would cost more than it saves
+POOL_MIN_BATCH = 4
+
+# Rating tags that are never written into captions
+SYSTEM_TAGS = ["general", "sensitive", "questionable", "explicit"]
+
+def int8_model_path(model_path):
+    """Where the locally quantized copy of an fp32 model is cached."""
+    base, ext = os.path.splitext(model_path)
+    return f"{base}.int8{ext}"
+
+def ensure_int8_model(model_path):
+    """
+    Quantizes the fp32 ONNX model to int8 (dynamic, weights only) once and
+    caches it next to the downloaded model. Returns the int8 path.
+    """
+    out_path = int8_model_path(model_path)
+    if os.path.exists(out_path):
+        return out_path
+
+    from onnxruntime.quantization import quantize_dynamic, QuantType
+
+    # hf_hub_download returns a symlink into the blob store, quantize the real file
+    src = os.path.realpath(model_path)
+    tmp_path = out_path + ".tmp"
+    print(f"Quantizing tagger to int8: {out_path}")
+    quantize_dynamic(src, tmp_path, weight_type=QuantType.QUInt8)
+    os.replace(tmp_path, out_path)
+    return out_path
+
+# --- SESSION CACHE ---
+class LoadedTagger:
+    """An ONNX session plus everything needed to feed it and read its output."""
+    def __init__(self, name, session, tags, size, resize, nbytes):
+        self.name = name
+        self.session = session
+        self.tags = tags
+        self.size = size
+        self.resize = resize
+        self.nbytes = nbytes
+        self.input_name = session.get_inputs()[0].name
+
+class SessionCache:
+    """
+    LRU of loaded tagger sessions keyed by (model name, int8).
+    Least recently used sessions are dropped once the RAM budget is exceeded.
+    The on-disk model size is used as the resident size estimate.
+    """
+    def __init__(self, budget_mb=DEFAULT_CACHE_MB):
+        self.budget_bytes = int(budget_mb * 1024 * 1024)
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.load_locks = {}
+
+    def set_budget(self, budget_mb):
+        with self.lock:
+            self.budget_bytes = int(budget_mb * 1024 * 1024)
+            self._evict()
+
+    def get(self, name, use_int8=False):
+        key = (name, use_int8)
+        MODEL_MANAGER.touch("wd14")
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry:
+                self.entries.move_to_end(key)
+                return entry
+            load_lock = self.load_locks.setdefault(key, threading.Lock())
+
+        # Only one thread loads a given model, the others wait for it
+        with load_lock:
+            with self.lock:
+                entry = self.entries.get(key)
+                if entry:
+                    self.entries.move_to_end(key)
+                    return entry
+
+            entry = self._load(name, use_int8)
+            with self.lock:
+                self.entries[key] = entry
+                self._evict()
+            return entry
+
+    def _load(self, name, use_int8):
+        spec = TAGGER_MODELS[name]
+
+        # Download/Cache Model
+        model_path = hf_hub_download(repo_id=spec["repo_id"], filename=spec["model_file"])
+        tags_path = hf_hub_download(repo_id=spec["repo_id"], filename=spec["tags_file"])
 
+        # Load Tags
+        df = pd.read_csv(tags_path)
+        tags = df["name"].tolist()
+
+        if use_int8:
+            model_path = ensure_int8_model(model_path)
+
+        # Load ONNX Session (CPU is fast enough for tagging)
+        session = ort.InferenceSession(model_path, providers=['CPUExecutionProvider'])
+
+        # Trust the exported input shape over the registry if they disagree
+        size = spec["size"]
+        shape = session.get_inputs()[0].shape
+        if len(shape) == 4 and isinstance(shape[1], int):
+            size = shape[1]
+
+        nbytes = os.path.getsize(os.path.realpath(model_path))
+        return LoadedTagger(name, session, tags, size, spec["resize"], nbytes)
+
+    def _evict(self):
+        # Caller holds self.lock. The most recent entry is never evicted.
+        while len(self.entries) > 1 and self.total_bytes_locked() > self.budget_bytes:
+            key, entry = self.entries.popitem(last=False)
+            print(f"Tagger cache: evicted {key[0]}{' (int8)' if key[1] else ''}")
+
+    def total_bytes_locked(self):
+        return sum(e.nbytes for e in self.entries.values())
+
+    def total_bytes(self):
+        with self.lock:
+            return self.total_bytes_locked()
+
+    def resident(self):
+        """[(name, use_int8, nbytes)] from least to most recently used."""
+        with self.lock:
+            return [(k[0], k[1], e.nbytes) for k, e in self.entries.items()]
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+SESSION_CACHE = SessionCache()
+MODEL_MANAGER.register("wd14", "WD14 Tagger (ONNX)", SESSION_CACHE.clear, SESSION_CACHE.total_bytes)
+
+# --- TAGGER ---
 class WD14Tagger:
-    def __init__(self):
-        self.model = None
-        self.tags = None
-        self.model_path = None
-        self.tags_path = None
-        # FIX: ConvNextV2 requires 448x448 input (SwinV2 used 446)
-        self.target_size = 448 
+    def __init__(self, model_name=DEFAULT_TAGGER, use_int8=False, ensemble=None):
+        self.model_name = model_name
+        self.ensemble = list(ensemble or [])
+        self.use_int8 = use_int8
 
-    def load_model(self):
-        """Downloads and loads the ONNX model."""
-        try:
-            # Download/Cache Model
-            self.model_path = hf_hub_download(repo_id=REPO_ID, filename=MODEL_FILE)
-            self.tags_path = hf_hub_download(repo_id=REPO_ID, filename=TAGS_FILE)
+    @property
+    def model_names(self):
+        return [self.model_name] + [m for m in self.ensemble if m != self.model_name]
 
-            # Load Tags
-            df = pd.read_csv(self.tags_path)
-            self.tags = df["name"].tolist()
+    def set_int8(self, enabled):
+        """Switch between the fp32 and int8 model. Both stay in the session cache."""
+        self.use_int8 = enabled
 
-            # Load ONNX Session (CPU is fast enough for tagging)
-            self.model = ort.InferenceSession(self.model_path, providers=['CPUExecutionProvider'])
+    def set_models(self, model_name, ensemble=None):
+        self.model_name = model_name
+        self.ensemble = list(ensemble or [])
+
+    def load_model(self):
+        """Downloads and loads every ONNX model this tagger uses."""
+        try:
+            for name in self.model_names:
+                SESSION_CACHE.get(name, self.use_int8)
             return True
         except Exception as e:
             print(f"Tagger Load Error: {e}")
             return False
 
+    def preprocess(self, image_path, model):
+        img_np = decode_for_tagger(image_path, model.size, model.resize)
+        # Add batch dimension: (1, 448, 448, 3) float32 NHWC
+        return np.expand_dims(img_np.astype(np.float32), 0)
+
+    def predict(self, input_tensor, model):
+        return model.session.run(None, {model.input_name: input_tensor})[0][0]
+
+    def filter_tags(self, tag_probs, threshold=0.35, max_tags=50, blacklist=None):
+        # 1. Filter by Threshold & System Tags
+        filtered = []
+        blacklist = blacklist or []
+
+        for tag, prob in tag_probs:
+            if prob > threshold:
+                if tag not in SYSTEM_TAGS and tag not in blacklist:
+                    filtered.append((tag, prob))
+
+        # 2. Sort by Confidence
+        filtered.sort(key=lambda x: x[1], reverse=True)
+
+        # 3. Cutoff Max Tags
+        return [t[0] for t in filtered[:max_tags]]
+
+    def tag_probs(self, image_path, tensors=None):
+        """[(tag, prob)] averaged over the primary model and any ensemble members."""
+        models = [SESSION_CACHE.get(name, self.use_int8) for name in self.model_names]
+
+        tensors = dict(tensors or {})
+        totals = {}
+        for model in models:
+            key = (model.size, model.resize)
+            if key not in tensors:
+                tensors[key] = self.preprocess(image_path, model)
+            probs = self.predict(tensors[key], model)
+            if len(models) == 1:
+                return list(zip(model.tags, probs))
+            # Vocabularies differ between model generations, so sum per tag name. A model
+            # without the tag counts as a 0 vote, else one model alone could pass the threshold.
+            for tag, prob in zip(model.tags, probs):
+                totals[tag] = totals.get(tag, 0.0) + float(prob)
+        return [(tag, total / len(models)) for tag, total in totals.items()]
+
     def tag_image(self, image_path, threshold=0.35, max_tags=50, blacklist=None):
-        if not self.model:
-            if not self.load_model():
-                return []
+        try:
+            return self.filter_tags(self.tag_probs(image_path), threshold, max_tags, blacklist)
+        except Exception as e:
+            print(f"Inference Error {image_path}: {e}")
+            return []
 
+    def tag_pil_image(self, img, threshold=0.35, max_tags=50, blacklist=None):
+        """Tags an image that is already decoded (e.g. shared with the VLM)."""
         try:
-            # Preprocess
-            img = Image.open(image_path).convert("RGB")
-            # Resize to expected dim (squash is standard for WD14)
-            img = img.resize((self.target_size, self.target_size), Image.Resampling.BICUBIC)
-            
-            # Convert to numpy array (NHWC)
-            # The model expects BGR float32
-            img_np = np.array(img).astype(np.float32)
-            # Flip RGB to BGR
-            img_np = img_np[:, :, ::-1] 
-            # Add batch dimension: (1, 448, 448, 3)
-            input_tensor = np.expand_dims(img_np, 0)
-
-            # Inference
-            input_name = self.model.get_inputs()[0].name
-            probs = self.model.run(None, {input_name: input_tensor})[0][0]
-
-            # Pair tags with probabilities
-            tag_probs = list(zip(self.tags, probs))
-            
-            # 1. Filter by Threshold & System Tags
-            filtered = []
-            sys_tags = ["general", "sensitive", "questionable", "explicit"]
-            blacklist = blacklist or []
-            
-            for tag, prob in tag_probs:
-                if prob > threshold:
-                    if tag not in sys_tags and tag not in blacklist:
-                        filtered.append((tag, prob))
-            
-            # 2. Sort by Confidence
-            filtered.sort(key=lambda x: x[1], reverse=True)
-            
-            # 3. Cutoff Max Tags
-            final_tags = [t[0] for t in filtered[:max_tags]]
-
-            return final_tags
+            tensors = {}
+            for name in self.model_names:
+                model = SESSION_CACHE.get(name, self.use_int8)
+                key = (model.size, model.resize)
+                if key not in tensors:
+                    tensors[key] = np.expand_dims(prepare_image(img, model.size, model.resize).astype(np.float32), 0)
+            return self.filter_tags(self.tag_probs(None, tensors), threshold, max_tags, blacklist)
+        except Exception as e:
+            print(f"Inference Error (in-memory image): {e}")
+            return []
 
+    def tag_images(self, image_paths, threshold=0.35, max_tags=50, blacklist=None):
+        """
+        Yields (path, tags) for a batch. Decoding and resizing run in the process
+        pool and arrive as shared-memory tensors, so this thread only runs inference.
+        """
+        image_paths = list(image_paths)
+        try:
+            primary = SESSION_CACHE.get(self.model_name, self.use_int8)
         except Exception as e:
-            print(f"Inference Error {image_path}: {e}")
-            return []
\ No newline at end of file
+            print(f"Tagger Load Error: {e}")
+            return
+
+        ring = None
+        if len(image_paths) >= POOL_MIN_BATCH:
+            try:
+                ring = PreprocessRing(primary.size, primary.resize)
+            except Exception as e:
+                print(f"Preprocess pool unavailable, tagging in-process: {e}")
+
+        if ring is None:
+            for path in image_paths:
+                yield path, self.tag_image(path, threshold, max_tags, blacklist)
+            return
+
+        done = set()
+        try:
+            for path, tensor, error in ring.run(image_paths):
+                MODEL_MANAGER.touch("wd14")
+                done.add(path)
+                if error:
+                    print(f"Inference Error {path}: {error}")
+                    yield path, []
+                    continue
+                try:
+                    probs = self.tag_probs(path, {(primary.size, primary.resize): tensor})
+                    tags = self.filter_tags(probs, threshold, max_tags, blacklist)
+                except Exception as e:
+                    print(f"Inference Error {path}: {e}")
+                    tags = []
+                tensor = None
+                yield path, tags
+        except Exception as e:
+            # Pool died mid-batch: finish the rest on this thread
+            print(f"Preprocess pool failed, tagging in-process: {e}")
+            for path in image_paths:
+                if path not in done:
+                    yield path, self.tag_image(path, threshold, max_tags, blacklist)
+        finally:
+            ring.close()
+
+def int8_agreement_report(image_paths, model_name=DEFAULT_TAGGER, top_k=10, threshold=0.35):
+    """
+    Runs the fp32 and int8 taggers side by side on a sample of images and
+    measures how much the quantized model agrees with the original.
+    """
+    try:
+        fp32 = SESSION_CACHE.get(model_name, False)
+        int8 = SESSION_CACHE.get(model_name, True)
+    except Exception as e:
+        print(f"Tagger Load Error: {e}")
+        return None
+
+    tagger = WD14Tagger(model_name)
+    # Rating tags are excluded so the overlap reflects content tags only
+    content = np.array([t not in SYSTEM_TAGS for t in fp32.tags])
+
+    overlaps, jaccards, max_diffs = [], [], []
+    fp32_time = int8_time = 0.0
+
+    for path in image_paths:
+        try:
+            input_tensor = tagger.preprocess(path, fp32)
+        except Exception as e:
+            print(f"Report skipped {path}: {e}")
+            continue
+
+        t0 = time.perf_counter()
+        p32 = tagger.predict(input_tensor, fp32)
+        t1 = time.perf_counter()
+        p8 = tagger.predict(input_tensor, int8)
+        t2 = time.perf_counter()
+        fp32_time += t1 - t0
+        int8_time += t2 - t1
+
+        p32 = np.where(content, p32, -1.0)
+        p8 = np.where(content, p8, -1.0)
+        top32 = set(np.argsort(p32)[::-1][:top_k])
+        top8 = set(np.argsort(p8)[::-1][:top_k])
+        overlaps.append(len(top32 & top8) / top_k)
+
+        tags32 = set(np.flatnonzero(p32 > threshold))
+        tags8 = set(np.flatnonzero(p8 > threshold))
+        union = tags32 | tags8
+        jaccards.append(len(tags32 & tags8) / len(union) if union else 1.0)
+        max_diffs.append(float(np.max(np.abs(p32[content] - p8[content]))))
+
+    count = len(overlaps)
+    if not count:
+        return None
+
+    return {
+        "images": count,
+        "model": model_name,
+        "top_k": top_k,
+        "top_k_overlap": float(np.mean(overlaps)),
+        "min_top_k_overlap": float(np.min(overlaps)),
+        "threshold": threshold,
+        "tag_jaccard": float(np.mean(jaccards)),
+        "max_prob_diff": float(np.max(max_diffs)),
+        "fp32_ms": fp32_time / count * 1000,
+        "int8_ms": int8_time / count * 1000,
+        "speedup": fp32_time / int8_time if int8_time > 0 else 0.0,
+    }
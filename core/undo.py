@@ -0,0 +1,249 @@
+import os
+import sys
+import difflib
+from PySide6.QtCore import QObject, QRunnable, QThreadPool, Signal, Slot
+from PySide6.QtGui import QUndoCommand
+from core.find_replace import write_texts
+
+DEFAULT_UNDO_MB = 64
+# Middles longer than this on both sides get a real sequence diff instead of one replace block
+DIFF_BLOCK_PIECES = 4
+
+_budget = {"bytes": DEFAULT_UNDO_MB * 1024 * 1024}
+
+def set_undo_budget(mb):
+    _budget["bytes"] = max(1, int(mb)) * 1024 * 1024
+
+def undo_budget_bytes():
+    return _budget["bytes"]
+
+# --- TAG-LEVEL DIFFS ---
+def split_pieces(text):
+    """Raw ','-separated pieces; ','.join() gives the exact text back. Interned so repeats cost nothing."""
+    return [sys.intern(p) for p in text.split(',')]
+
+def caption_diff(old, new):
+    """
+    old/new captions -> ((i1, j1, old_pieces, new_pieces), ...). Common leading
+    and trailing pieces are trimmed first, which covers append/prepend/remove
+    without running a full sequence match.
+    """
+    if old == new:
+        return ()
+    a, b = split_pieces(old), split_pieces(new)
+    start = 0
+    limit = min(len(a), len(b))
+    while start < limit and a[start] is b[start]:
+        start += 1
+    end_a, end_b = len(a), len(b)
+    while end_a > start and end_b > start and a[end_a - 1] is b[end_b - 1]:
+        end_a -= 1
+        end_b -= 1
+
+    if end_a - start <= DIFF_BLOCK_PIECES or end_b - start <= DIFF_BLOCK_PIECES:
+        return ((start, start, tuple(a[start:end_a]), tuple(b[start:end_b])),)
+
+    ops = []
+    matcher = difflib.SequenceMatcher(None, a[start:end_a], b[start:end_b], autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag != 'equal':
+            ops.append((start + i1, start + j1, tuple(a[start + i1:start + i2]), tuple(b[start + j1:start + j2])))
+    return tuple(ops)
+
+def apply_diff(text, ops, forward=True):
+    pieces = text.split(',')
+    # Right to left so earlier indices stay valid
+    for i1, j1, old, new in reversed(ops):
+        if forward:
+            pieces[i1:i1 + len(old)] = new
+        else:
+            pieces[j1:j1 + len(new)] = old
+    return ','.join(pieces)
+
+def diff_bytes(changes):
+    """Rough footprint of [(path, ops)], counting shared ops and strings once (paths belong to the store)."""
+    size = sys.getsizeof(changes)
+    seen = set()
+    for entry in changes:
+        path, ops = entry
+        size += sys.getsizeof(entry)
+        if id(ops) in seen:
+            continue
+        seen.add(id(ops))
+        size += sys.getsizeof(ops)
+        for op in ops:
+            size += sys.getsizeof(op) + sys.getsizeof(op[2]) + sys.getsizeof(op[3])
+            for piece in op[2] + op[3]:
+                if id(piece) not in seen:
+                    seen.add(id(piece))
+                    size += sys.getsizeof(piece)
+    return size
+
+# --- COMMANDS ---
+class DiffCommand(QUndoCommand):
+    """Base for caption commands that keep tag-level diffs and can be pruned under the memory cap."""
+    def __init__(self, description):
+        super().__init__(description)
+        self.changes = ()
+        self.memory_bytes = 0
+        self.pruned = False
+
+    def set_changes(self, triples):
+        """[(key, old, new)] -> diffs. Batch ops like "add tag X" give the same diff for most captions, keep one copy."""
+        shared = {}
+        self.changes = tuple(
+            (key, shared.setdefault(ops, ops))
+            for key, ops in ((k, caption_diff(old, new)) for k, old, new in triples)
+            if ops
+        )
+        self.memory_bytes = diff_bytes(self.changes)
+
+    def prune(self):
+        """Drops the payload; the command stays on the stack as an inert marker."""
+        self.changes = ()
+        self.memory_bytes = 0
+        self.pruned = True
+        self.setText(f"{self.text()} (pruned)")
+
+class BatchUpdateCommand(DiffCommand):
+    """
+    Caption edits on a CaptionStore, kept as tag-level diffs keyed by path.
+    No widget references, so entries survive grid reloads and stay small.
+    """
+    def __init__(self, store, paths, new_texts, description="Batch Update", old_texts=None):
+        super().__init__(description)
+        self.store = store
+        if old_texts is None:
+            old_texts = store.texts(paths)
+        self.set_changes(zip(paths, old_texts, new_texts))
+        # Applied verbatim on push: the store may already hold the new text (live typing / auto-tag preview)
+        self._initial = dict(zip(paths, new_texts))
+
+    def redo(self):
+        if self._initial is not None:
+            self.store.set_many(self._initial)
+            self._initial = None
+        elif not self.pruned:
+            self._apply(True)
+
+    def undo(self):
+        if not self.pruned:
+            self._apply(False)
+
+    def _apply(self, forward):
+        text = self.store.text
+        self.store.set_many({path: apply_diff(text(path), ops, forward) for path, ops in self.changes})
+
+class UpdateCaptionCommand(BatchUpdateCommand):
+    def __init__(self, store, path, old_text, new_text):
+        super().__init__(store, [path], [new_text], f"Edit: {os.path.basename(path)}", old_texts=[old_text])
+
+class CaptionFilesSignals(QObject):
+    written = Signal(object)  # {txt_path: text}
+    failed = Signal(str)
+
+class CaptionFilesWorker(QRunnable):
+    """Reads the current files, applies the diffs and writes them all-or-nothing."""
+    def __init__(self, changes, forward):
+        super().__init__()
+        self.changes = changes
+        self.forward = forward
+        self.signals = CaptionFilesSignals()
+
+    @Slot()
+    def run(self):
+        try:
+            texts = {}
+            for path, ops in self.changes:
+                with open(path, 'r', encoding='utf-8') as f:
+                    texts[path] = apply_diff(f.read(), ops, self.forward)
+            write_texts(texts)
+            self.signals.written.emit(texts)
+        except Exception as e:
+            self.signals.failed.emit(str(e))
+
+_rewrites = None
+
+def rewrite_pool():
+    """One thread, so undo/redo of the same files are written in the order they were asked for."""
+    global _rewrites
+    if _rewrites is None:
+        _rewrites = QThreadPool()
+        _rewrites.setMaxThreadCount(1)
+    return _rewrites
+
+class CaptionFilesCommand(DiffCommand):
+    """
+    Captions rewritten directly on disk (find/replace). The change is already
+    written when pushed; undo/redo rewrite the files all-or-nothing in the
+    background and report the new texts through on_written({txt_path: text}, started)
+    so views can follow, or the error through on_failed(description, message).
+    started is what on_started([txt_path]) returned when the rewrite was queued, so a
+    view can tell which of its captions were edited again while the files were written.
+    """
+    def __init__(self, changes, description, on_written=None, on_failed=None, on_started=None):
+        super().__init__(description)
+        self.set_changes(changes)
+        # These paths are not shared with a store
+        self.memory_bytes += sum(sys.getsizeof(path) for path, _ in self.changes)
+        self.on_written = on_written
+        self.on_failed = on_failed
+        self.on_started = on_started
+        self.failed = False
+        self.worker = None
+        self._first = True
+
+    def redo(self):
+        if self._first:
+            self._first = False
+        elif not self.pruned and not self.failed:
+            self._write(True)
+
+    def undo(self):
+        if not self.pruned and not self.failed:
+            self._write(False)
+
+    def _write(self, forward):
+        self.worker = CaptionFilesWorker(self.changes, forward)
+        if self.on_written:
+            started = self.on_started([path for path, _ in self.changes]) if self.on_started else None
+            self.worker.signals.written.connect(lambda texts: self.on_written(texts, started))
+        self.worker.signals.failed.connect(self._write_failed)
+        rewrite_pool().start(self.worker)
+
+    def _write_failed(self, message):
+        # Nothing was written, so the files no longer match this step of the history;
+        # the stack drops the command the next time it reaches it
+        print(f"Undo: failed to rewrite captions for '{self.text()}': {message}")
+        self.failed = True
+        self.setObsolete(True)
+        if self.on_failed:
+            self.on_failed(self.text(), message)
+
+# --- MEMORY CAP ---
+def stack_commands(stack):
+    return [stack.command(i) for i in range(stack.count())]
+
+def enforce_undo_budget(stack, max_bytes=None):
+    """
+    Prunes the oldest applied commands until the stack fits the budget.
+    Returns (total_bytes, floor): undo must not go below index `floor`.
+    """
+    max_bytes = undo_budget_bytes() if max_bytes is None else max_bytes
+    commands = stack_commands(stack)
+    sizes = [getattr(cmd, "memory_bytes", 0) for cmd in commands]
+    total = sum(sizes)
+    floor = 0
+    # Only commands below the current index are applied (pruning a redo-side one would lose data),
+    # and the most recent one is always kept
+    for i in range(stack.index() - 1):
+        cmd = commands[i]
+        if getattr(cmd, "pruned", False):
+            floor = i + 1
+            continue
+        if total <= max_bytes or not hasattr(cmd, "prune"):
+            break
+        total -= sizes[i]
+        cmd.prune()
+        floor = i + 1
+    return total, floor
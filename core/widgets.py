@@ -1,10 +1,16 @@
+import os
+import re
 from PySide6.QtWidgets import (
     QWidget, QLayout, QSizePolicy, QLabel, QPushButton, QHBoxLayout, 
     QVBoxLayout, QFrame, QLineEdit, QDialog, QComboBox, QSpinBox, 
     QDoubleSpinBox, QGroupBox, QFormLayout, QDialogButtonBox, QRadioButton,
-    QButtonGroup
+    QButtonGroup, QCheckBox, QListWidget, QFileDialog, QProgressBar,
+    QTableWidget, QTableWidgetItem, QHeaderView, QAbstractItemView, QMessageBox
 )
-from PySide6.QtCore import Qt, QRect, QSize, QPoint, Signal
+from PySide6.QtCore import Qt, QRect, QSize, QPoint, Signal, QObject, QRunnable, QThreadPool, Slot
+from core.tagger import TAGGER_MODELS, DEFAULT_TAGGER
+from core import find_replace, dedupe, quality, dataset_stats
+from core.catalog import CATALOG, SORT_MODES, QUALITY_SORTS
 
 # --- CUSTOM FLOW LAYOUT (For wrapping bubbles) ---
 class FlowLayout(QLayout):
@@ -187,6 +193,15 @@ class AutoTagDialog(QDialog):
         # 2. Settings
         form = QFormLayout()
         
+        self.combo_model = QComboBox()
+        self.combo_ensemble = QComboBox()
+        self.combo_ensemble.addItem("(None)", "")
+        for name, spec in TAGGER_MODELS.items():
+            self.combo_model.addItem(spec["label"], name)
+            self.combo_ensemble.addItem(spec["label"], name)
+        self.combo_model.setCurrentIndex(self.combo_model.findData(DEFAULT_TAGGER))
+        self.combo_ensemble.setToolTip("Average predictions with a second tagger (both stay loaded)")
+        
         self.spin_max = QSpinBox()
         self.spin_max.setRange(1, 100)
         self.spin_max.setValue(20)
@@ -205,6 +220,8 @@ class AutoTagDialog(QDialog):
         self.line_append = QLineEdit()
         self.line_append.setPlaceholderText("Tags to force at end...")
         
+        form.addRow("Model:", self.combo_model)
+        form.addRow("Ensemble With:", self.combo_ensemble)
         form.addRow("Max Tags:", self.spin_max)
         form.addRow("Min Threshold:", self.spin_thresh)
         form.addRow("Blacklist:", self.line_blacklist)
@@ -212,6 +229,11 @@ class AutoTagDialog(QDialog):
         form.addRow("Force Append:", self.line_append)
         
         layout.addLayout(form)
+
+        # 3. Speed
+        self.chk_int8 = QCheckBox("Use int8 quantized model (faster on CPU)")
+        self.chk_int8.setToolTip("Quantizes the tagger locally on first use. See the agreement report for the accuracy cost.")
+        layout.addWidget(self.chk_int8)
         
         # Buttons
         btns = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel)
@@ -231,5 +253,639 @@ class AutoTagDialog(QDialog):
             "threshold": self.spin_thresh.value(),
             "blacklist": [t.strip() for t in self.line_blacklist.text().split(',') if t.strip()],
             "prepend": [t.strip() for t in self.line_prepend.text().split(',') if t.strip()],
-            "append": [t.strip() for t in self.line_append.text().split(',') if t.strip()]
-        }
\ No newline at end of file
+            "append": [t.strip() for t in self.line_append.text().split(',') if t.strip()],
+            "int8": self.chk_int8.isChecked(),
+            "model": self.combo_model.currentData(),
+            "ensemble": [self.combo_ensemble.currentData()] if self.combo_ensemble.currentData() else []
+        }
+
+# --- FOLDER LOADING ---
+class CatalogLoadSignals(QObject):
+    progress = Signal(object)   # (done, total) new or changed files read
+    finished = Signal(str, object)   # folder, entries
+    failed = Signal(str, str)   # folder, error
+
+class CatalogLoadWorker(QRunnable):
+    """CATALOG.refresh off the UI thread; a folder with many new files is read on the process pool."""
+    def __init__(self, folder, exts, order="name"):
+        super().__init__()
+        self.folder = folder
+        self.exts = exts
+        self.order = order
+        self.signals = CatalogLoadSignals()
+
+    @Slot()
+    def run(self):
+        try:
+            entries = CATALOG.refresh(self.folder, self.exts, self.order,
+                                      lambda done, total: self.signals.progress.emit((done, total)))
+            self.signals.finished.emit(self.folder, entries)
+        except Exception as e:
+            self.signals.failed.emit(self.folder, str(e))
+
+class LoadingLabel(QLabel):
+    """Grid placeholder while a CatalogLoadWorker runs."""
+    def __init__(self):
+        super().__init__("📂 Reading folder...")
+        self.setStyleSheet("color: #aaa; padding: 20px;")
+
+    def set_progress(self, state):
+        self.setText(f"📂 Reading folder... {state[0]:,} / {state[1]:,} new files")
+
+# --- FIND / REPLACE ---
+class FindReplaceSignals(QObject):
+    progress = Signal(object)   # (done, total)
+    scanned = Signal(object)
+    applied = Signal(object, object)   # changes [(txt_path, old, new)], errors
+    failed = Signal(str)
+
+class FindReplaceWorker(QRunnable):
+    def __init__(self, action, paths, rule, rewriter=find_replace.rewrite):
+        super().__init__()
+        self.action = action
+        self.paths = paths
+        self.rule = rule
+        self.rewriter = rewriter
+        self.cancel_requested = False
+        self.signals = FindReplaceSignals()
+
+    @Slot()
+    def run(self):
+        try:
+            progress = lambda done, total: self.signals.progress.emit((done, total))
+            cancelled = lambda: self.cancel_requested
+            if self.action == "scan":
+                self.signals.scanned.emit(find_replace.scan(self.paths, self.rule, progress, cancelled, self.rewriter))
+            else:
+                changes, errors = find_replace.apply_rule(self.paths, self.rule, progress, cancelled, self.rewriter)
+                self.signals.applied.emit(changes, errors)
+        except Exception as e:
+            self.signals.failed.emit(str(e))
+
+class FindReplaceDialog(QDialog):
+    """
+    Find/replace over .txt sidecars on disk, previewed first and committed all-or-nothing.
+    preset=(title, rule, rewriter) runs a fixed rewrite (e.g. tag normalization) instead of the rule form.
+    """
+    applied = Signal(object, str)  # changes [(txt_path, old, new)], description
+
+    def __init__(self, folders=None, parent=None, preset=None):
+        super().__init__(parent)
+        self.preset = preset
+        self.rewriter = preset[2] if preset else find_replace.rewrite
+        self.setWindowTitle(preset[0] if preset else "Find / Replace in Captions")
+        self.resize(760, 620)
+        self.worker = None
+        self.thread_pool = QThreadPool()
+        self.last_scan = None
+        
+        layout = QVBoxLayout(self)
+        
+        # 1. Rule
+        grp_rule = QGroupBox("Rule")
+        form = QFormLayout(grp_rule)
+        self.inp_find = QLineEdit()
+        self.inp_find.setPlaceholderText("Text, pattern or tag to find...")
+        self.inp_replace = QLineEdit()
+        self.inp_replace.setPlaceholderText("Replacement (empty removes; regex may use \\1)")
+        self.combo_mode = QComboBox()
+        for key, label in find_replace.MODES.items():
+            self.combo_mode.addItem(label, key)
+        self.chk_case = QCheckBox("Case sensitive")
+        form.addRow("Find:", self.inp_find)
+        form.addRow("Replace with:", self.inp_replace)
+        form.addRow("Mode:", self.combo_mode)
+        form.addRow("", self.chk_case)
+        layout.addWidget(grp_rule)
+        grp_rule.setVisible(preset is None)
+        
+        # 2. Scope
+        grp_scope = QGroupBox("Folders")
+        lyt_scope = QVBoxLayout(grp_scope)
+        self.list_folders = QListWidget()
+        self.list_folders.setFixedHeight(80)
+        for folder in folders or []:
+            if folder: self.list_folders.addItem(folder)
+        scope_btns = QHBoxLayout()
+        self.btn_add_folder = QPushButton("Add Folder...")
+        self.btn_add_folder.clicked.connect(self.add_folder)
+        self.btn_remove_folder = QPushButton("Remove")
+        self.btn_remove_folder.clicked.connect(lambda: self.list_folders.takeItem(self.list_folders.currentRow()))
+        self.chk_recursive = QCheckBox("Include subfolders")
+        scope_btns.addWidget(self.btn_add_folder)
+        scope_btns.addWidget(self.btn_remove_folder)
+        scope_btns.addStretch()
+        scope_btns.addWidget(self.chk_recursive)
+        lyt_scope.addWidget(self.list_folders)
+        lyt_scope.addLayout(scope_btns)
+        layout.addWidget(grp_scope)
+        
+        # 3. Preview
+        self.table_preview = QTableWidget()
+        self.table_preview.setColumnCount(3)
+        self.table_preview.setHorizontalHeaderLabels(["File", "Before", "After"])
+        self.table_preview.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        self.table_preview.verticalHeader().setVisible(False)
+        self.table_preview.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.table_preview.setWordWrap(True)
+        layout.addWidget(self.table_preview, 1)
+        
+        self.lbl_summary = QLabel("Preview to see how many captions match.")
+        self.lbl_summary.setWordWrap(True)
+        layout.addWidget(self.lbl_summary)
+        self.progress = QProgressBar()
+        self.progress.setFormat("%v / %m files")
+        layout.addWidget(self.progress)
+        
+        btns = QHBoxLayout()
+        self.btn_preview = QPushButton("🔍 Preview")
+        self.btn_preview.clicked.connect(self.run_preview)
+        self.btn_apply = QPushButton("✅ Apply")
+        self.btn_apply.setEnabled(False)
+        self.btn_apply.setStyleSheet("background-color: #00b894; color: white; font-weight: bold;")
+        self.btn_apply.clicked.connect(self.run_apply)
+        self.btn_cancel = QPushButton("Cancel")
+        self.btn_cancel.setEnabled(False)
+        self.btn_cancel.clicked.connect(self.cancel_job)
+        self.btn_close = QPushButton("Close")
+        self.btn_close.clicked.connect(self.reject)
+        btns.addWidget(self.btn_preview)
+        btns.addWidget(self.btn_apply)
+        btns.addWidget(self.btn_cancel)
+        btns.addStretch()
+        btns.addWidget(self.btn_close)
+        layout.addLayout(btns)
+        
+        # Any edit invalidates the preview
+        for widget in (self.inp_find, self.inp_replace):
+            widget.textChanged.connect(self.invalidate_preview)
+        self.combo_mode.currentIndexChanged.connect(self.invalidate_preview)
+        self.chk_case.toggled.connect(self.invalidate_preview)
+        self.chk_recursive.toggled.connect(self.invalidate_preview)
+
+    def reject(self):
+        # Let a running job finish or cancel first, it still reports back to this dialog
+        if self.worker:
+            self.cancel_job()
+            return
+        super().reject()
+
+    def add_folder(self):
+        folder = QFileDialog.getExistingDirectory(self, "Add Caption Folder")
+        if folder:
+            self.list_folders.addItem(folder)
+            self.invalidate_preview()
+
+    def folders(self):
+        return [self.list_folders.item(i).text() for i in range(self.list_folders.count())]
+
+    def build_rule(self):
+        if self.preset:
+            return self.preset[1]
+        if not self.inp_find.text():
+            QMessageBox.warning(self, "Find / Replace", "Enter something to find.")
+            return None
+        try:
+            return find_replace.make_rule(self.inp_find.text(), self.inp_replace.text(),
+                                          self.combo_mode.currentData(), self.chk_case.isChecked())
+        except re.error as e:
+            QMessageBox.warning(self, "Invalid Pattern", f"Regex error: {e}")
+            return None
+
+    def invalidate_preview(self, *args):
+        self.last_scan = None
+        self.btn_apply.setEnabled(False)
+
+    def set_running(self, running):
+        for widget in (self.btn_preview, self.btn_close, self.btn_add_folder, self.btn_remove_folder):
+            widget.setEnabled(not running)
+        self.btn_apply.setEnabled(not running and self.last_scan is not None and bool(self.last_scan["matched"]))
+        self.btn_cancel.setEnabled(running)
+
+    def start_worker(self, action, paths, rule):
+        self.progress.setMaximum(max(1, len(paths)))
+        self.progress.setValue(0)
+        self.worker = FindReplaceWorker(action, paths, rule, self.rewriter)
+        self.worker.signals.progress.connect(lambda state: self.progress.setValue(state[0]))
+        self.worker.signals.scanned.connect(self.on_scanned)
+        self.worker.signals.applied.connect(self.on_applied)
+        self.worker.signals.failed.connect(self.on_failed)
+        self.set_running(True)
+        self.thread_pool.start(self.worker)
+
+    def cancel_job(self):
+        if self.worker:
+            self.worker.cancel_requested = True
+
+    def run_preview(self):
+        rule = self.build_rule()
+        if rule is None: return
+        paths = find_replace.find_caption_files(self.folders(), self.chk_recursive.isChecked())
+        if not paths:
+            self.lbl_summary.setText("No caption files in the selected folders.")
+            return
+        self.lbl_summary.setText(f"Scanning {len(paths):,} caption files...")
+        self.start_worker("scan", paths, rule)
+
+    def on_scanned(self, result):
+        self.last_scan = result if not self.worker.cancel_requested else None
+        self.worker = None
+        samples = result["samples"]
+        self.table_preview.setRowCount(len(samples))
+        for i, (path, before, after) in enumerate(samples):
+            self.table_preview.setItem(i, 0, QTableWidgetItem(os.path.basename(path)))
+            self.table_preview.setItem(i, 1, QTableWidgetItem(before[:300]))
+            self.table_preview.setItem(i, 2, QTableWidgetItem(after[:300]))
+        self.table_preview.resizeRowsToContents()
+        summary = (f"{result['matches']:,} matches in {result['matched_files']:,} of "
+                   f"{result['files']:,} caption files.")
+        if result["errors"]:
+            summary += f" {len(result['errors'])} files could not be read (first: {result['errors'][0][1]})."
+        if self.last_scan is None:
+            summary = "Preview cancelled."
+        self.lbl_summary.setText(summary)
+        self.set_running(False)
+
+    def run_apply(self):
+        if not self.last_scan or not self.last_scan["matched"]: return
+        rule = self.build_rule()
+        if rule is None: return
+        paths = [p for p, _ in self.last_scan["matched"]]
+        self.lbl_summary.setText(f"Rewriting {len(paths):,} caption files...")
+        self.start_worker("apply", paths, rule)
+
+    def on_applied(self, changes, errors):
+        cancelled = self.worker.cancel_requested
+        self.worker = None
+        self.last_scan = None
+        if errors:
+            self.lbl_summary.setText(f"Nothing was changed: {len(errors)} files failed (first: {errors[0][0]}: {errors[0][1]}).")
+        elif cancelled and not changes:
+            self.lbl_summary.setText("Cancelled, nothing was changed.")
+        else:
+            self.lbl_summary.setText(f"Rewrote {len(changes):,} caption files.")
+            if changes:
+                description = (f"{self.preset[0]} ({len(changes)} files)" if self.preset
+                               else f"Find/Replace: {self.inp_find.text()[:40]}")
+                self.applied.emit(changes, description)
+        self.set_running(False)
+
+    def on_failed(self, message):
+        self.worker = None
+        self.lbl_summary.setText(f"Error: {message}")
+        self.set_running(False)
+
+# --- DUPLICATE FINDER ---
+class DuplicateScanSignals(QObject):
+    progress = Signal(object)   # (done, total)
+    finished = Signal(object, object)   # groups [[path]], errors [(path, error)]
+    failed = Signal(str)
+
+class DuplicateScanWorker(QRunnable):
+    def __init__(self, paths, method, threshold):
+        super().__init__()
+        self.paths = paths
+        self.method = method
+        self.threshold = threshold
+        self.cancel_requested = False
+        self.signals = DuplicateScanSignals()
+
+    @Slot()
+    def run(self):
+        try:
+            groups, errors = dedupe.find_duplicates(
+                self.paths, self.method, self.threshold,
+                lambda done, total: self.signals.progress.emit((done, total)),
+                lambda: self.cancel_requested)
+            self.signals.finished.emit(groups, errors)
+        except Exception as e:
+            self.signals.failed.emit(str(e))
+
+class QualityScanSignals(QObject):
+    progress = Signal(object)   # (done, total)
+    finished = Signal(object, object)   # {path: metrics}, errors [(path, error)]
+    failed = Signal(str)
+
+class QualityScanWorker(QRunnable):
+    def __init__(self, paths):
+        super().__init__()
+        self.paths = paths
+        self.cancel_requested = False
+        self.signals = QualityScanSignals()
+
+    @Slot()
+    def run(self):
+        try:
+            results, errors = quality.compute_quality(
+                self.paths, CATALOG,
+                lambda done, total: self.signals.progress.emit((done, total)),
+                lambda: self.cancel_requested)
+            self.signals.finished.emit(results, errors)
+        except Exception as e:
+            self.signals.failed.emit(str(e))
+
+class QualitySortMixin:
+    """
+    Sort order and quality filter for a grid of image cards, with the background quality scan
+    behind them. The tab provides thread_pool, selection, grid_layout, grid_container, grid_cols,
+    apply_filter(), quality_cards() -> {path: card} and sort_source() -> (folder, exts), or None
+    while the shown cards have an order of their own.
+    """
+    def setup_quality_sort(self):
+        self.quality = {}   # path -> core.quality metrics
+        self.quality_failed = set()
+        self.quality_worker = None
+
+        self.combo_sort = QComboBox()
+        for key, label in SORT_MODES.items():
+            self.combo_sort.addItem(label, key)
+        self.combo_sort.setToolTip("Sort order")
+        self.combo_sort.currentIndexChanged.connect(self.apply_sort)
+
+        self.combo_quality = QComboBox()
+        for key, label in quality.FILTERS.items():
+            self.combo_quality.addItem(label, key)
+        self.combo_quality.setToolTip("Quality filter. Images are analyzed on first use (blur, resolution, JPEG quality,\n"
+                                      "entropy, exposure) and the results cached until the file changes.")
+        self.combo_quality.currentIndexChanged.connect(self.on_quality_mode_changed)
+        self.lbl_quality = QLabel("")
+        self.lbl_quality.setStyleSheet("color: #888; font-size: 10px;")
+
+    def reset_quality(self, entries):
+        """A new folder is shown: stops the previous scan and starts from the catalog's metrics."""
+        self.cancel_quality_scan()
+        self.quality = {e.path: e.quality for e in entries if e.quality}
+        # Files that failed may have been fixed since
+        self.quality_failed = set()
+
+    def cancel_quality_scan(self):
+        worker, self.quality_worker = self.quality_worker, None
+        if worker:
+            # Chunks already measured stay in the catalog; its signals are ignored from now on
+            worker.cancel_requested = True
+            self.lbl_quality.setText("")
+
+    def apply_sort(self):
+        """Re-lays the existing cards in the chosen order; captions, selection and undo history stay."""
+        cards = self.quality_cards()
+        source = self.sort_source()
+        if not cards or not source: return
+        folder, exts = source
+        order = [e.path for e in CATALOG.entries(folder, exts, self.combo_sort.currentData())]
+        order = [p for p in order if p in cards]
+        self.selection.reorder(order)
+        self.grid_container.setUpdatesEnabled(False)
+        for i, path in enumerate(order):
+            card = cards[path]
+            self.grid_layout.removeWidget(card)
+            self.grid_layout.addWidget(card, i // self.grid_cols, i % self.grid_cols)
+        self.grid_container.setUpdatesEnabled(True)
+        self.analyze_quality_if_needed()
+
+    def on_quality_mode_changed(self):
+        self.apply_filter()
+        self.analyze_quality_if_needed()
+
+    def analyze_quality_if_needed(self):
+        """Measures the shown images that lack metrics, if the quality filter or a quality sort is active."""
+        if not (self.combo_quality.currentData() or self.combo_sort.currentData() in QUALITY_SORTS): return
+        if self.quality_worker: return
+        todo = [p for p in self.quality_cards() if p not in self.quality and p not in self.quality_failed]
+        if not todo: return
+        self.quality_worker = QualityScanWorker(todo)
+        self.quality_worker.signals.progress.connect(self.on_quality_progress)
+        self.quality_worker.signals.finished.connect(self.on_quality_done)
+        self.quality_worker.signals.failed.connect(self.on_quality_failed)
+        self.lbl_quality.setText(f"Analyzing 0/{len(todo)}...")
+        self.thread_pool.start(self.quality_worker)
+
+    def is_current_quality_scan(self):
+        # A cancelled scan still reports when its last chunks finish
+        return self.quality_worker is not None and self.sender() is self.quality_worker.signals
+
+    def on_quality_progress(self, state):
+        if not self.is_current_quality_scan(): return
+        self.lbl_quality.setText(f"Analyzing {state[0]}/{state[1]}...")
+
+    def on_quality_done(self, results, errors):
+        if not self.is_current_quality_scan(): return
+        self.quality_worker = None
+        self.lbl_quality.setText("")
+        if errors:
+            print(f"Quality: {len(errors)} images could not be read (first: {errors[0][0]}: {errors[0][1]})")
+            self.quality_failed.update(path for path, _ in errors)
+        self.quality.update(results)
+        cards = self.quality_cards()
+        for path, metrics in results.items():
+            if path in cards:
+                cards[path].setToolTip(quality.describe(metrics))
+        if self.combo_sort.currentData() in QUALITY_SORTS:
+            self.apply_sort()
+        self.apply_filter()
+        # Images shown while this scan ran
+        self.analyze_quality_if_needed()
+
+    def on_quality_failed(self, message):
+        if not self.is_current_quality_scan(): return
+        self.quality_worker = None
+        self.lbl_quality.setText("")
+        QMessageBox.critical(self, "Quality", f"Analysis failed: {message}")
+
+class DatasetStatsSignals(QObject):
+    progress = Signal(object)   # (done, total)
+    finished = Signal(object, object)   # report dict, errors [(path, error)]
+    failed = Signal(str)
+
+class DatasetStatsWorker(QRunnable):
+    def __init__(self, folder, exts):
+        super().__init__()
+        self.folder = folder
+        self.exts = exts
+        self.cancel_requested = False
+        self.signals = DatasetStatsSignals()
+
+    @Slot()
+    def run(self):
+        try:
+            report, errors = dataset_stats.collection_stats(
+                self.folder, CATALOG, self.exts,
+                lambda done, total: self.signals.progress.emit((done, total)),
+                lambda: self.cancel_requested)
+            self.signals.finished.emit(report, errors)
+        except Exception as e:
+            self.signals.failed.emit(str(e))
+
+class DatasetStatsDialog(QDialog):
+    """Pixel mean/std, resolution, aspect and format counts of one folder, with JSON export."""
+    def __init__(self, folder, exts, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle(f"Statistics · {os.path.basename(folder) or folder}")
+        self.resize(520, 620)
+        self.folder = folder
+        self.report = None
+        self.thread_pool = QThreadPool()
+        
+        layout = QVBoxLayout(self)
+        self.table = QTableWidget()
+        self.table.setColumnCount(2)
+        self.table.setHorizontalHeaderLabels(["Statistic", "Value"])
+        self.table.horizontalHeader().setSectionResizeMode(0, QHeaderView.ResizeToContents)
+        self.table.horizontalHeader().setSectionResizeMode(1, QHeaderView.Stretch)
+        self.table.verticalHeader().setVisible(False)
+        self.table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        layout.addWidget(self.table, 1)
+        
+        self.lbl_summary = QLabel("Images already measured are read from the catalog; only new or changed files are decoded.")
+        self.lbl_summary.setWordWrap(True)
+        layout.addWidget(self.lbl_summary)
+        self.progress = QProgressBar()
+        self.progress.setFormat("%v / %m images")
+        layout.addWidget(self.progress)
+        
+        btns = QHBoxLayout()
+        self.btn_export = QPushButton("💾 Export JSON...")
+        self.btn_export.setEnabled(False)
+        self.btn_export.clicked.connect(self.export_json)
+        self.btn_close = QPushButton("Close")
+        self.btn_close.clicked.connect(self.reject)
+        btns.addWidget(self.btn_export)
+        btns.addStretch()
+        btns.addWidget(self.btn_close)
+        layout.addLayout(btns)
+        
+        self.worker = DatasetStatsWorker(folder, exts)
+        self.worker.signals.progress.connect(self.on_progress)
+        self.worker.signals.finished.connect(self.on_finished)
+        self.worker.signals.failed.connect(self.on_failed)
+        self.thread_pool.start(self.worker)
+
+    def reject(self):
+        # The worker still reports back to this dialog; stop it and close once it has
+        if self.worker:
+            self.worker.cancel_requested = True
+            self.btn_close.setEnabled(False)
+            return
+        super().reject()
+
+    def on_progress(self, state):
+        self.progress.setMaximum(state[1])
+        self.progress.setValue(state[0])
+
+    def on_finished(self, report, errors):
+        cancelled = self.worker.cancel_requested
+        self.worker = None
+        if cancelled:
+            super().reject()
+            return
+        self.report = report
+        self.progress.setValue(self.progress.maximum())
+        self.btn_export.setEnabled(True)
+        if errors:
+            print(f"Dataset stats: {len(errors)} images could not be read (first: {errors[0][0]}: {errors[0][1]})")
+            self.lbl_summary.setText(f"⚠️ {len(errors)} images could not be read and are left out of the pixel statistics.")
+        else:
+            self.lbl_summary.setText(f"Pixel statistics from decodes of at most {report['analysis_size']} px, "
+                                     "so every image weighs about the same.")
+        self.show_report(report)
+
+    def on_failed(self, message):
+        self.worker = None
+        self.btn_close.setEnabled(True)
+        QMessageBox.critical(self, "Statistics", f"Failed: {message}")
+
+    def show_report(self, report):
+        channels = lambda values: " · ".join(f"{c} {v:.4f}" for c, v in zip("RGB", values))
+        rows = [
+            ("Images", f"{report['images']} ({report['analyzed']} measured)"),
+            ("Total pixels", f"{report['total_pixels'] / 1e6:,.1f} MP"),
+            ("Mean size", f"{report['megapixels_mean']:.2f} MP"),
+            ("Smallest", "{} x {}".format(*report['min_size'])),
+            ("Largest", "{} x {}".format(*report['max_size'])),
+            ("Mean (0..1)", channels(report['mean'])),
+            ("Std (0..1)", channels(report['std'])),
+        ]
+        for title, key in (("Shorter side", "resolution"), ("Aspect", "aspect"), ("Format", "formats"), ("Mode", "modes")):
+            rows.append((f"— {title} —", ""))
+            rows.extend((f"    {name}", str(count)) for name, count in report[key].items())
+        self.table.setRowCount(len(rows))
+        for i, (name, value) in enumerate(rows):
+            self.table.setItem(i, 0, QTableWidgetItem(name))
+            self.table.setItem(i, 1, QTableWidgetItem(value))
+
+    def export_json(self):
+        default = os.path.join(self.folder, dataset_stats.REPORT_FILE)
+        path, _ = QFileDialog.getSaveFileName(self, "Export Statistics", default, "JSON (*.json)")
+        if not path: return
+        try:
+            dataset_stats.write_report(path, self.report)
+        except Exception as e:
+            QMessageBox.critical(self, "Export", f"Could not write {path}:\n{e}")
+
+class DuplicateScanDialog(QDialog):
+    def __init__(self, folders=None, collections_root="", parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Find Duplicates")
+        self.resize(460, 380)
+        self.collections_root = collections_root
+        
+        layout = QVBoxLayout(self)
+        
+        # 1. Scope
+        grp_scope = QGroupBox("Folders")
+        lyt_scope = QVBoxLayout(grp_scope)
+        self.list_folders = QListWidget()
+        self.list_folders.setFixedHeight(90)
+        for folder in folders or []:
+            if folder: self.list_folders.addItem(folder)
+        scope_btns = QHBoxLayout()
+        btn_add = QPushButton("Add Folder...")
+        btn_add.clicked.connect(self.add_folder)
+        btn_remove = QPushButton("Remove")
+        btn_remove.clicked.connect(lambda: self.list_folders.takeItem(self.list_folders.currentRow()))
+        scope_btns.addWidget(btn_add)
+        scope_btns.addWidget(btn_remove)
+        scope_btns.addStretch()
+        lyt_scope.addWidget(self.list_folders)
+        lyt_scope.addLayout(scope_btns)
+        self.chk_collections = QCheckBox("Include all dataset collections")
+        self.chk_collections.setEnabled(bool(collections_root))
+        self.chk_recursive = QCheckBox("Include subfolders")
+        lyt_scope.addWidget(self.chk_collections)
+        lyt_scope.addWidget(self.chk_recursive)
+        layout.addWidget(grp_scope)
+        
+        # 2. Matching
+        form = QFormLayout()
+        self.combo_method = QComboBox()
+        for key, label in dedupe.METHODS.items():
+            self.combo_method.addItem(label, key)
+        self.spin_threshold = QSpinBox()
+        self.spin_threshold.setRange(0, dedupe.MAX_THRESHOLD)
+        self.spin_threshold.setValue(dedupe.DEFAULT_THRESHOLD)
+        self.spin_threshold.setSuffix(" bits")
+        self.spin_threshold.setToolTip("Max differing bits out of 64. 0 = identical hashes, higher also matches crops and edits.")
+        form.addRow("Hash:", self.combo_method)
+        form.addRow("Max Distance:", self.spin_threshold)
+        layout.addLayout(form)
+        
+        btns = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel)
+        btns.accepted.connect(self.accept)
+        btns.rejected.connect(self.reject)
+        layout.addWidget(btns)
+
+    def add_folder(self):
+        folder = QFileDialog.getExistingDirectory(self, "Add Image Folder")
+        if folder: self.list_folders.addItem(folder)
+
+    def get_settings(self):
+        folders = [self.list_folders.item(i).text() for i in range(self.list_folders.count())]
+        if self.chk_collections.isChecked() and os.path.isdir(self.collections_root):
+            for name in sorted(os.listdir(self.collections_root)):
+                path = os.path.join(self.collections_root, name)
+                if os.path.isdir(path): folders.append(path)
+        return {
+            "folders": folders,
+            "recursive": self.chk_recursive.isChecked(),
+            "method": self.combo_method.currentData(),
+            "threshold": self.spin_threshold.value(),
+        }
@@ -9,8 +9,14 @@ from PySide6.QtWidgets import (
 )
 from PySide6.QtCore import Qt, QThread, Signal, Slot, QRunnable, QThreadPool, QObject
 from PySide6.QtGui import QPixmap, QShortcut, QKeySequence
-from core.ai_backend import QwenWorker, DownloadWorker
+from core.ai_backend import QwenWorker, DownloadWorker, unload_qwen_model
 from core.image_utils import load_thumbnail
+from core.caption_io import read_caption
+from core.widgets import CatalogLoadWorker, LoadingLabel
+from core.caption_writer import CAPTION_WRITER
+from core.tagger import WD14Tagger, TAGGER_MODELS, DEFAULT_TAGGER
+from core import tag_normalizer
+from core.selection import SelectionModel, restyle_cards, paint_selection_border
 
 API_PRESETS_FILE = "api_presets.json"
 
@@ -45,12 +51,13 @@ class ThumbnailWorker(QRunnable):
         self.signals.loaded.emit(self.path, pix)
 
 class CaptionCard(QFrame):
-    selection_changed = Signal(str, bool)
+    clicked = Signal(str, bool)  # path, shift held
 
-    def __init__(self, path):
+    def __init__(self, path, text=None):
         super().__init__()
         self.path = path
         self.is_selected = False
+        self.saved_text = ""
         self.setFixedWidth(240)
         self.setFixedHeight(340)
         self.setFrameShape(QFrame.StyledPanel)
@@ -70,7 +77,7 @@ class CaptionCard(QFrame):
         layout.addWidget(self.lbl_image)
         layout.addWidget(self.txt_caption)
         
-        self.load_current_text()
+        self.load_current_text(text)
         self.update_style()
 
     def set_image(self, path, pix):
@@ -78,54 +85,55 @@ class CaptionCard(QFrame):
             self.lbl_image.setPixmap(pix)
             self.lbl_image.setText("")
 
-    def load_current_text(self):
-        txt_path = os.path.splitext(self.path)[0] + ".txt"
-        if os.path.exists(txt_path):
-            try:
-                with open(txt_path, 'r', encoding='utf-8') as f:
-                    self.txt_caption.setText(f.read())
-            except: pass
+    def load_current_text(self, text=None):
+        self.saved_text = read_caption(self.path) if text is None else text
+        self.txt_caption.setPlainText(self.saved_text)
 
     def update_caption_from_ai(self, text):
-        self.txt_caption.setText(text)
+        self.txt_caption.setPlainText(text)
         self.save_text()
 
     def save_text(self):
-        txt_path = os.path.splitext(self.path)[0] + ".txt"
-        try:
-            with open(txt_path, 'w', encoding='utf-8') as f:
-                f.write(self.txt_caption.toPlainText())
-            return True
-        except: return False
-
-    def toggle_selection(self, state=None):
-        if state is not None:
+        """Queues the caption on the background writer if it changed. Returns True if queued."""
+        text = self.txt_caption.toPlainText()
+        if text == self.saved_text:
+            return False
+        CAPTION_WRITER.write(self.path, text)
+        self.saved_text = text
+        return True
+
+    def set_selected(self, state):
+        if self.is_selected != state:
             self.is_selected = state
-        else:
-            self.is_selected = not self.is_selected
-        self.update_style()
-        self.selection_changed.emit(self.path, self.is_selected)
+            self.update()
 
     def update_style(self):
-        border = "#00b894" if self.is_selected else "transparent"
-        self.setStyleSheet(f"CaptionCard {{ background-color: #2b2b2b; border: 2px solid {border}; border-radius: 8px; }}")
+        self.setStyleSheet("CaptionCard { background-color: #2b2b2b; border: 2px solid transparent; border-radius: 8px; }")
+
+    def paintEvent(self, event):
+        super().paintEvent(event)
+        if self.is_selected:
+            paint_selection_border(self, "#00b894")
 
     def mousePressEvent(self, event):
         if event.button() == Qt.LeftButton:
-            self.toggle_selection()
+            self.clicked.emit(self.path, bool(event.modifiers() & Qt.ShiftModifier))
         super().mousePressEvent(event)
 
 class CaptionTab(QWidget):
     def __init__(self):
         super().__init__()
         self.cards = {}
-        self.selected_paths = set()
+        self.selection = SelectionModel(self)
+        self.selection.changed.connect(self.on_selection)
         self.thread_pool = QThreadPool()
+        self.current_folder = ""
         self.is_processing = False 
         self.api_presets = {}
         self.worker = None
         self.thread = None
         self.stale_threads = [] # Keep references to old threads so they don't crash the app
+        self.tagger = WD14Tagger()
         
         layout = QHBoxLayout(self)
         splitter = QSplitter(Qt.Horizontal)
@@ -138,6 +146,7 @@ class CaptionTab(QWidget):
         self.btn_folder = QPushButton("📂 Open Folder")
         self.btn_folder.clicked.connect(self.load_folder)
         self.btn_select_all = QPushButton("Select All")
+        self.btn_select_all.setToolTip("Ctrl+A · Shift+Click: select range · Ctrl+I: invert")
         self.btn_select_all.clicked.connect(self.select_all)
         grid_tools.addWidget(self.btn_folder)
         grid_tools.addWidget(self.btn_select_all)
@@ -274,7 +283,32 @@ class CaptionTab(QWidget):
         lyt_prompt.addWidget(self.prompt_input)
         right_layout.addWidget(grp_prompt)
 
-        # 4. Actions
+        # 4. Fused WD14 pass (one decode feeds both models)
+        self.grp_fused = QGroupBox("4. WD14 Tags (Fused Pass)")
+        self.grp_fused.setCheckable(True)
+        self.grp_fused.setChecked(False)
+        self.grp_fused.setToolTip("Run the WD14 tagger on the same decoded image before captioning")
+        lyt_fused = QFormLayout(self.grp_fused)
+        self.combo_tagger = QComboBox()
+        for name, spec in TAGGER_MODELS.items():
+            self.combo_tagger.addItem(spec["label"], name)
+        self.combo_tagger.setCurrentIndex(self.combo_tagger.findData(DEFAULT_TAGGER))
+        self.spin_tag_thresh = QDoubleSpinBox(); self.spin_tag_thresh.setRange(0.01, 1.0); self.spin_tag_thresh.setSingleStep(0.05); self.spin_tag_thresh.setValue(0.35)
+        self.spin_tag_max = QSpinBox(); self.spin_tag_max.setRange(1, 100); self.spin_tag_max.setValue(20)
+        self.chk_tag_hints = QCheckBox("Inject tags into prompt as hints")
+        self.chk_tag_hints.setChecked(True)
+        self.combo_tag_output = QComboBox()
+        self.combo_tag_output.addItem("Prepend tags to caption", "prepend")
+        self.combo_tag_output.addItem("Append tags to caption", "append")
+        self.combo_tag_output.addItem("Hints only (don't write tags)", "hints")
+        lyt_fused.addRow("Tagger:", self.combo_tagger)
+        lyt_fused.addRow("Threshold:", self.spin_tag_thresh)
+        lyt_fused.addRow("Max Tags:", self.spin_tag_max)
+        lyt_fused.addRow(self.chk_tag_hints)
+        lyt_fused.addRow("Output:", self.combo_tag_output)
+        right_layout.addWidget(self.grp_fused)
+
+        # 5. Actions
         self.btn_run = QPushButton("🚀 Caption Selected")
         self.btn_run.setFixedHeight(50)
         self.btn_run.setStyleSheet("background-color: #d63031; font-weight: bold; font-size: 14px;")
@@ -324,6 +358,7 @@ class CaptionTab(QWidget):
 
     def setup_hotkeys(self):
         QShortcut(QKeySequence("Ctrl+A"), self).activated.connect(self.select_all)
+        QShortcut(QKeySequence("Ctrl+I"), self).activated.connect(self.selection.invert)
         QShortcut(QKeySequence("Ctrl+Return"), self).activated.connect(self.run_process)
         QShortcut(QKeySequence("Ctrl+Enter"), self).activated.connect(self.run_process)
         QShortcut(QKeySequence("Esc"), self).activated.connect(self.abort_process)
@@ -341,6 +376,7 @@ class CaptionTab(QWidget):
     def force_cleanup(self):
         """Called by the Free VRAM button."""
         self.cleanup_worker()
+        unload_qwen_model()
         self.log_box.append("🧹 VRAM Cleanup requested.")
 
     def cleanup_worker(self):
@@ -481,33 +517,61 @@ class CaptionTab(QWidget):
     def load_folder(self):
         folder = QFileDialog.getExistingDirectory(self, "Select Folder")
         if not folder: return
+        self.current_folder = folder
+        self.clear_grid()
+        self.cards.clear()
+        self.selection.set_items([])
+        self.on_selection(set(), set())
+        loading = LoadingLabel()
+        self.grid_layout.addWidget(loading, 0, 0, 1, 3)
+        worker = CatalogLoadWorker(folder, ('.jpg', '.png', '.jpeg', '.webp'))
+        worker.signals.progress.connect(loading.set_progress)
+        worker.signals.finished.connect(self.on_folder_loaded)
+        worker.signals.failed.connect(self.on_folder_load_failed)
+        # Ahead of thumbnails still queued for the previous folder
+        self.thread_pool.start(worker, 1)
+
+    def clear_grid(self):
         for i in reversed(range(self.grid_layout.count())): 
             self.grid_layout.itemAt(i).widget().setParent(None)
-        self.cards.clear()
-        self.selected_paths.clear()
-        exts = ('.jpg', '.png', '.jpeg', '.webp')
-        files = [f for f in os.listdir(folder) if f.lower().endswith(exts)]
+
+    def on_folder_load_failed(self, folder, message):
+        if folder != self.current_folder: return
+        self.clear_grid()
+        QMessageBox.critical(self, "Error", f"Failed to read folder: {message}")
+
+    def on_folder_loaded(self, folder, entries):
+        # Another folder was opened meanwhile
+        if folder != self.current_folder: return
+        self.clear_grid()
+        self.selection.set_items(e.path for e in entries)
+        self.on_selection(set(), set())
         cols = 3
-        for i, f in enumerate(files):
-            path = os.path.join(folder, f)
-            card = CaptionCard(path)
-            card.selection_changed.connect(self.on_selection)
+        for i, entry in enumerate(entries):
+            path = entry.path
+            card = CaptionCard(path, entry.caption)
+            card.clicked.connect(self.on_card_clicked)
             self.grid_layout.addWidget(card, i // cols, i % cols)
             self.cards[path] = card
             worker = ThumbnailWorker(path, (230, 170))
             worker.signals.loaded.connect(card.set_image)
             self.thread_pool.start(worker)
 
-    def on_selection(self, path, is_selected):
-        if is_selected: self.selected_paths.add(path)
-        else: self.selected_paths.discard(path)
+    @property
+    def selected_paths(self):
+        return self.selection.selected
+
+    def on_card_clicked(self, path, shift):
+        if shift: self.selection.select_range(path)
+        else: self.selection.toggle(path)
+
+    def on_selection(self, added, removed):
+        restyle_cards(self.grid_container, self.cards, added, removed)
         if not self.is_processing:
             self.btn_run.setText(f"🚀 Caption Selected ({len(self.selected_paths)})")
 
     def select_all(self):
-        all_selected = len(self.selected_paths) == len(self.cards) and len(self.cards) > 0
-        target = not all_selected
-        for card in self.cards.values(): card.toggle_selection(target)
+        self.selection.toggle_all()
 
     def set_processing_ui(self, running):
         self.is_processing = running
@@ -570,7 +634,18 @@ class CaptionTab(QWidget):
             "top_p": self.spin_top_p.value()
         }
         
-        self.worker = QwenWorker(model_path, list(self.selected_paths), self.prompt_input.toPlainText(), params, api_config)
+        fused = None
+        if self.grp_fused.isChecked():
+            self.tagger.set_models(self.combo_tagger.currentData())
+            fused = {
+                "tagger": self.tagger,
+                "threshold": self.spin_tag_thresh.value(),
+                "max_tags": self.spin_tag_max.value(),
+                "hints": self.chk_tag_hints.isChecked(),
+                "output": self.combo_tag_output.currentData()
+            }
+        
+        self.worker = QwenWorker(model_path, list(self.selected_paths), self.prompt_input.toPlainText(), params, api_config, fused)
         self.thread = QThread()
         self.worker.moveToThread(self.thread)
         self.thread.started.connect(self.worker.run)
@@ -581,6 +656,8 @@ class CaptionTab(QWidget):
         self.thread.start()
 
     def on_single_finished(self, path, caption):
+        if tag_normalizer.normalize_options()["after_caption"]:
+            caption = tag_normalizer.get_normalizer().normalize(caption)
         if path in self.cards: self.cards[path].update_caption_from_ai(caption)
         self.progress_bar.setValue(self.progress_bar.value() + 1)
 
@@ -596,11 +673,11 @@ class CaptionTab(QWidget):
 
     def save_selected(self):
         c = sum(1 for p in self.selected_paths if self.cards[p].save_text())
-        QMessageBox.information(self, "Saved", f"Saved {c} captions.")
+        QMessageBox.information(self, "Saved", f"Saved {c} changed captions.")
 
     def save_all(self):
         c = sum(1 for card in self.cards.values() if card.save_text())
-        QMessageBox.information(self, "Saved", f"Saved {c} captions.")
+        QMessageBox.information(self, "Saved", f"Saved {c} changed captions.")
 
     def save_to_dataset(self):
         if not self.selected_paths:
@@ -613,9 +690,13 @@ class CaptionTab(QWidget):
         target_dir = os.path.join(dataset_root, name.strip())
         if not os.path.exists(target_dir): os.makedirs(target_dir)
             
-        count = 0
         for path in self.selected_paths:
             if path in self.cards: self.cards[path].save_text()
+        # The copy below reads the sidecars from disk
+        CAPTION_WRITER.flush()
+
+        count = 0
+        for path in self.selected_paths:
             try:
                 shutil.copy2(path, target_dir)
                 txt_path = os.path.splitext(path)[0] + ".txt"
@@ -4,14 +4,22 @@ from PySide6.QtWidgets import (
     QWidget, QVBoxLayout, QHBoxLayout, QPushButton, QLabel, 
     QScrollArea, QGridLayout, QFrame, QSplitter, QFileDialog, 
     QMessageBox, QListWidget, QLineEdit, QInputDialog, QTextEdit,
-    QSizePolicy
+    QSizePolicy, QComboBox
 )
-from PySide6.QtCore import Qt, Signal, QRunnable, QThreadPool, QObject, Slot
+from PySide6.QtCore import Qt, Signal, QRunnable, QThreadPool, QObject, Slot, QTimer
 from PySide6.QtGui import QPixmap, QShortcut, QKeySequence
 from core.image_utils import load_thumbnail
+from core.tag_index import TagIndex
+from core.selection import SelectionModel, restyle_cards, paint_selection_border
+from core.widgets import DuplicateScanDialog, DuplicateScanWorker, QualitySortMixin, DatasetStatsDialog, CatalogLoadWorker, LoadingLabel
+from core import dedupe, quality
+from core.catalog import CATALOG
 
 # Root folder for collections
 DATASETS_ROOT = os.path.join(os.getcwd(), "Dataset Collections")
+FILTER_DEBOUNCE_MS = 150
+GRID_COLS = 4
+DATASET_EXTS = ('.jpg', '.png', '.jpeg', '.webp')
 
 class ThumbnailWorker(QRunnable):
     class Signals(QObject):
@@ -26,8 +34,8 @@ class ThumbnailWorker(QRunnable):
         self.signals.loaded.emit(self.path, pix)
 
 class DatasetCard(QFrame):
-    selection_changed = Signal(str, bool)
-    def __init__(self, path):
+    clicked = Signal(str, bool)  # path, shift held
+    def __init__(self, path, caption=None):
         super().__init__()
         self.path = path
         self.caption_text = ""
@@ -67,9 +75,13 @@ class DatasetCard(QFrame):
         lay.addWidget(self.lbl_name)
         lay.addWidget(self.txt_caption)
         
-        self.load_caption()
+        self.load_caption(caption)
 
-    def load_caption(self):
+    def load_caption(self, caption=None):
+        if caption is not None:
+            self.caption_text = caption.strip()
+            self.txt_caption.setText(self.caption_text)
+            return
         txt_path = os.path.splitext(self.path)[0] + ".txt"
         if os.path.exists(txt_path):
             try:
@@ -81,24 +93,35 @@ class DatasetCard(QFrame):
     def set_pixmap(self, path, pix):
         if not pix.isNull(): self.lbl_img.setPixmap(pix)
 
-    def toggle(self, state=None):
-        if state is not None: self.is_selected = state
-        else: self.is_selected = not self.is_selected
-        
-        border = "#0984e3" if self.is_selected else "transparent"
-        self.setStyleSheet(f"background-color: #2b2b2b; border-radius: 6px; border: 2px solid {border};")
-        self.selection_changed.emit(self.path, self.is_selected)
+    def set_selected(self, state):
+        if self.is_selected == state: return
+        self.is_selected = state
+        self.update()
+
+    def paintEvent(self, event):
+        super().paintEvent(event)
+        if self.is_selected:
+            paint_selection_border(self, "#0984e3", radius=6)
 
     def mousePressEvent(self, e):
-        if e.button() == Qt.LeftButton: self.toggle()
+        if e.button() == Qt.LeftButton: self.clicked.emit(self.path, bool(e.modifiers() & Qt.ShiftModifier))
+
+class DatasetsTab(QWidget, QualitySortMixin):
+    grid_cols = GRID_COLS
 
-class DatasetsTab(QWidget):
     def __init__(self):
         super().__init__()
         self.cards = {}
-        self.selected_paths = set()
+        self.selection = SelectionModel(self)
+        self.selection.changed.connect(self.on_selection)
         self.thread_pool = QThreadPool()
         self.current_view_folder = "" 
+        self.dedupe_worker = None
+        self.tag_index = TagIndex()
+        self.filter_timer = QTimer(self)
+        self.filter_timer.setSingleShot(True)
+        self.filter_timer.setInterval(FILTER_DEBOUNCE_MS)
+        self.filter_timer.timeout.connect(self.apply_filter)
         
         if not os.path.exists(DATASETS_ROOT):
             os.makedirs(DATASETS_ROOT)
@@ -116,14 +139,25 @@ class DatasetsTab(QWidget):
         self.btn_load.clicked.connect(self.load_folder_dialog)
         
         self.inp_filter = QLineEdit()
-        self.inp_filter.setPlaceholderText("Filter tags...")
-        self.inp_filter.textChanged.connect(self.apply_filter)
+        self.inp_filter.setPlaceholderText("Filter tags...  (a, b | c, -d, \"exact tag\", pre*)")
+        self.inp_filter.textChanged.connect(self.filter_timer.start)
         
         self.btn_sel_all = QPushButton("Select All")
         self.btn_sel_all.setMinimumWidth(80) 
+        self.btn_sel_all.setToolTip("Select all shown (Ctrl+A)\nShift+Click: select range · Ctrl+I: invert · Ctrl+Shift+A: select only filter matches")
         self.btn_sel_all.clicked.connect(self.select_all)
         
+        self.btn_dupes = QPushButton("🔍 Find Duplicates")
+        self.btn_dupes.setToolTip("Group near-identical images by perceptual hash; every copy but the best is preselected")
+        self.btn_dupes.clicked.connect(self.find_duplicates)
+        
+        self.setup_quality_sort()
+        
         tools.addWidget(self.btn_load, 0)
+        tools.addWidget(self.btn_dupes, 0)
+        tools.addWidget(self.combo_sort, 0)
+        tools.addWidget(self.combo_quality, 0)
+        tools.addWidget(self.lbl_quality, 0)
         tools.addWidget(self.inp_filter, 1) 
         tools.addWidget(self.btn_sel_all, 0)
         left_lay.addLayout(tools)
@@ -174,6 +208,12 @@ class DatasetsTab(QWidget):
         col_tools.addWidget(self.btn_refresh)
         right_lay.addLayout(col_tools)
         
+        self.btn_stats = QPushButton("📊 Statistics")
+        self.btn_stats.setToolTip("Pixel mean/std per channel, resolution, aspect and format counts of the selected\n"
+                                  "collection (or the folder shown). Only images added since the last run are decoded.")
+        self.btn_stats.clicked.connect(self.show_statistics)
+        right_lay.addWidget(self.btn_stats)
+        
         self.btn_add = QPushButton("➕ Add Selected to Collection")
         self.btn_add.clicked.connect(self.add_to_collection)
         self.btn_add.setStyleSheet("background-color: #00b894; color: white; font-weight: bold; height: 40px;")
@@ -191,6 +231,8 @@ class DatasetsTab(QWidget):
 
     def setup_hotkeys(self):
         QShortcut(QKeySequence("Ctrl+A"), self).activated.connect(self.select_all)
+        QShortcut(QKeySequence("Ctrl+I"), self).activated.connect(self.invert_selection)
+        QShortcut(QKeySequence("Ctrl+Shift+A"), self).activated.connect(self.select_filtered)
         QShortcut(QKeySequence("Ctrl+F"), self).activated.connect(self.inp_filter.setFocus)
         QShortcut(QKeySequence("Ctrl+N"), self).activated.connect(self.create_collection)
         QShortcut(QKeySequence("F5"), self).activated.connect(self.refresh_collections)
@@ -207,38 +249,154 @@ class DatasetsTab(QWidget):
         folder = os.path.join(DATASETS_ROOT, col_name)
         self.load_grid(folder)
 
-    def load_grid(self, folder):
-        self.current_view_folder = folder
+    def clear_grid(self, paths):
         for i in reversed(range(self.grid_layout.count())): 
             self.grid_layout.itemAt(i).widget().setParent(None)
         self.cards.clear()
-        self.selected_paths.clear()
+        self.tag_index.clear()
         self.btn_del_imgs.hide()
-        
-        files = [f for f in os.listdir(folder) if f.lower().endswith(('.jpg','.png','.jpeg','.webp'))]
-        cols = 4
-        
-        for i, f in enumerate(files):
-            path = os.path.join(folder, f)
-            card = DatasetCard(path)
-            card.selection_changed.connect(self.on_selection)
-            self.grid_layout.addWidget(card, i//cols, i%cols)
-            self.cards[path] = card
-            
-            worker = ThumbnailWorker(path)
-            worker.signals.loaded.connect(card.set_pixmap)
-            self.thread_pool.start(worker)
+        self.selection.set_items(paths)
+        self.update_buttons()
+
+    def add_card(self, path, row, col, caption=None):
+        card = DatasetCard(path, caption)
+        card.clicked.connect(self.on_card_clicked)
+        self.grid_layout.addWidget(card, row, col)
+        self.cards[path] = card
+        if path in self.quality:
+            card.setToolTip(quality.describe(self.quality[path]))
+        self.tag_index.update(path, card.caption_text)
+        
+        worker = ThumbnailWorker(path)
+        worker.signals.loaded.connect(card.set_pixmap)
+        self.thread_pool.start(worker)
+
+    def load_grid(self, folder):
+        self.current_view_folder = folder
+        self.cancel_quality_scan()
+        self.clear_grid([])
+        loading = LoadingLabel()
+        self.grid_layout.addWidget(loading, 0, 0, 1, GRID_COLS)
+        worker = CatalogLoadWorker(folder, DATASET_EXTS, self.combo_sort.currentData())
+        worker.signals.progress.connect(loading.set_progress)
+        worker.signals.finished.connect(self.on_grid_loaded)
+        worker.signals.failed.connect(self.on_grid_load_failed)
+        # Ahead of thumbnails still queued for the previous folder
+        self.thread_pool.start(worker, 1)
+
+    def on_grid_loaded(self, folder, entries):
+        # Another folder (or the duplicate view) was opened meanwhile
+        if folder != self.current_view_folder: return
+        self.reset_quality(entries)
+        self.clear_grid([e.path for e in entries])
+        
+        for i, entry in enumerate(entries):
+            self.add_card(entry.path, i // GRID_COLS, i % GRID_COLS, entry.caption)
 
-    def apply_filter(self, text):
-        search = text.lower().strip()
+        if self.inp_filter.text().strip() or self.combo_quality.currentData():
+            self.apply_filter()
+        self.analyze_quality_if_needed()
+
+    def on_grid_load_failed(self, folder, message):
+        if folder != self.current_view_folder: return
+        self.clear_grid([])
+        QMessageBox.critical(self, "Error", f"Failed to read folder: {message}")
+
+    def quality_cards(self):
+        return self.cards
+
+    def sort_source(self):
+        # The duplicate view has no folder; its group order is the point of it
+        return (self.current_view_folder, DATASET_EXTS) if self.current_view_folder else None
+
+    # --- DUPLICATES ---
+    def find_duplicates(self):
+        if self.dedupe_worker:
+            self.dedupe_worker.cancel_requested = True
+            self.btn_dupes.setText("Cancelling...")
+            return
+        
+        dlg = DuplicateScanDialog([self.current_view_folder], DATASETS_ROOT, self)
+        if not dlg.exec(): return
+        settings = dlg.get_settings()
+        paths = dedupe.find_images(settings["folders"], settings["recursive"])
+        if len(paths) < 2:
+            QMessageBox.information(self, "Find Duplicates", "Need at least two images to compare.")
+            return
+        
+        self.dedupe_worker = DuplicateScanWorker(paths, settings["method"], settings["threshold"])
+        self.dedupe_worker.signals.progress.connect(self.on_dedupe_progress)
+        self.dedupe_worker.signals.finished.connect(self.on_duplicates_found)
+        self.dedupe_worker.signals.failed.connect(self.on_dedupe_failed)
+        self.btn_dupes.setText(f"Hashing 0/{len(paths)} (click to cancel)")
+        self.thread_pool.start(self.dedupe_worker)
+
+    def on_dedupe_progress(self, state):
+        if self.dedupe_worker and not self.dedupe_worker.cancel_requested:
+            self.btn_dupes.setText(f"Hashing {state[0]}/{state[1]} (click to cancel)")
+
+    def on_duplicates_found(self, groups, errors):
+        cancelled = self.dedupe_worker.cancel_requested
+        self.dedupe_worker = None
+        self.btn_dupes.setText("🔍 Find Duplicates")
+        if cancelled: return
+        if errors:
+            print(f"Dedupe: {len(errors)} images could not be read (first: {errors[0][0]}: {errors[0][1]})")
+        if not groups:
+            QMessageBox.information(self, "Find Duplicates", "No duplicates found.")
+            return
+        self.show_duplicate_groups(groups)
+
+    def on_dedupe_failed(self, message):
+        self.dedupe_worker = None
+        self.btn_dupes.setText("🔍 Find Duplicates")
+        QMessageBox.critical(self, "Find Duplicates", f"Scan failed: {message}")
+
+    def show_duplicate_groups(self, groups):
+        """One header row per group, best copy first; every other copy starts selected for deletion."""
+        self.current_view_folder = ""
+        self.clear_grid([p for group in groups for p in group])
+        
+        self.grid_container.setUpdatesEnabled(False)
+        row = 0
+        for n, group in enumerate(groups, 1):
+            header = QLabel(f"<b>Group {n}</b> · {len(group)} copies · keeping {os.path.basename(group[0])}")
+            header.setStyleSheet("color: #aaa; padding-top: 8px;")
+            self.grid_layout.addWidget(header, row, 0, 1, GRID_COLS)
+            row += 1
+            for i, path in enumerate(group):
+                self.add_card(path, row + i // GRID_COLS, i % GRID_COLS)
+            row += (len(group) + GRID_COLS - 1) // GRID_COLS
+        self.grid_container.setUpdatesEnabled(True)
+        
+        if self.inp_filter.text().strip() or self.combo_quality.currentData():
+            self.apply_filter()
+        self.analyze_quality_if_needed()
+        self.selection.select(p for group in groups for p in group[1:])
+
+    def apply_filter(self):
+        matches = self.tag_index.search(self.inp_filter.text())
+        mode = self.combo_quality.currentData()
+        self.grid_container.setUpdatesEnabled(False)
         for path, card in self.cards.items():
-            match = (search in card.caption_text.lower()) or (search in os.path.basename(path).lower())
-            if not search: match = True
-            card.setVisible(match)
+            visible = (matches is None or path in matches) and quality.matches(self.quality.get(path), mode)
+            if card.isHidden() == visible:
+                card.setVisible(visible)
+        self.grid_container.setUpdatesEnabled(True)
 
-    def on_selection(self, path, state):
-        if state: self.selected_paths.add(path)
-        else: self.selected_paths.discard(path)
+    @property
+    def selected_paths(self):
+        return self.selection.selected
+
+    def visible_paths(self):
+        return [p for p, c in self.cards.items() if not c.isHidden()]
+
+    def on_card_clicked(self, path, shift):
+        if shift: self.selection.select_range(path, lambda p: not self.cards[p].isHidden())
+        else: self.selection.toggle(path)
+
+    def on_selection(self, added, removed):
+        restyle_cards(self.grid_container, self.cards, added, removed)
         
         if len(self.selected_paths) > 0:
             self.btn_del_imgs.show()
@@ -249,10 +407,13 @@ class DatasetsTab(QWidget):
         self.update_buttons()
 
     def select_all(self):
-        visible_cards = [c for c in self.cards.values() if not c.isHidden()]
-        all_vis_selected = all(c.is_selected for c in visible_cards)
-        target = not all_vis_selected
-        for c in visible_cards: c.toggle(target)
+        self.selection.toggle_all(self.visible_paths())
+
+    def invert_selection(self):
+        self.selection.invert(self.visible_paths())
+
+    def select_filtered(self):
+        self.selection.select_only(self.visible_paths())
 
     def refresh_collections(self):
         self.list_datasets.clear()
@@ -260,6 +421,14 @@ class DatasetsTab(QWidget):
             folders = [f for f in os.listdir(DATASETS_ROOT) if os.path.isdir(os.path.join(DATASETS_ROOT, f))]
             self.list_datasets.addItems(folders)
 
+    def show_statistics(self):
+        item = self.list_datasets.currentItem()
+        folder = os.path.join(DATASETS_ROOT, item.text()) if item else self.current_view_folder
+        if not folder:
+            QMessageBox.information(self, "Statistics", "Select a collection or load a folder first.")
+            return
+        DatasetStatsDialog(folder, DATASET_EXTS, self).exec()
+
     def create_collection(self):
         name, ok = QInputDialog.getText(self, "New Collection", "Name:")
         if ok and name:
@@ -295,6 +464,7 @@ class DatasetsTab(QWidget):
                                      QMessageBox.Yes | QMessageBox.No)
         
         if reply == QMessageBox.Yes:
+            deleted = []
             for path in list(self.selected_paths):
                 try:
                     os.remove(path)
@@ -302,17 +472,18 @@ class DatasetsTab(QWidget):
                     if os.path.exists(txt_path):
                         os.remove(txt_path)
                     
+                    self.tag_index.remove(path)
                     if path in self.cards:
                         card = self.cards.pop(path)
                         card.setParent(None)
                         card.deleteLater()
                     
-                    self.selected_paths.discard(path)
+                    deleted.append(path)
                 except Exception as e:
                     print(f"Error deleting {path}: {e}")
             
-            self.btn_del_imgs.hide()
-            self.update_buttons()
+            CATALOG.forget(deleted)
+            self.selection.remove_items(deleted)
 
     def update_buttons(self):
         has_sel = len(self.selected_paths) > 0
@@ -342,4 +513,4 @@ class DatasetsTab(QWidget):
                 print(f"Copy error: {e}")
         
         QMessageBox.information(self, "Success", f"Added {count} images to '{col_name}'.")
-        for c in self.cards.values(): c.toggle(False)
\ No newline at end of file
+        self.selection.clear()
\ No newline at end of file
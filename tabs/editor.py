@@ -1,23 +1,25 @@
 import os
-import cv2
-import numpy as np
-import traceback
-import gc
-from PIL import Image
+from concurrent.futures.process import BrokenProcessPool
 from PySide6.QtWidgets import (
     QWidget, QVBoxLayout, QHBoxLayout, QPushButton, QLabel, 
     QScrollArea, QGridLayout, QFrame, QSplitter, QFileDialog, 
     QMessageBox, QGroupBox, QSpinBox, QComboBox, QRadioButton, 
     QCheckBox, QProgressBar, QTextEdit, QFormLayout, QSlider,
-    QProgressDialog, QApplication
+    QListWidget, QInputDialog
 )
 from PySide6.QtCore import Qt, Signal, QRunnable, QThreadPool, QObject, Slot
 from PySide6.QtGui import QPixmap, QShortcut, QKeySequence
 from core.image_utils import load_thumbnail
+from core.selection import SelectionModel, restyle_cards, paint_selection_border
+from core.catalog import CATALOG
+from core.widgets import CatalogLoadWorker, LoadingLabel
+from core.process_pool import reset_process_pool
+from core import edit_ops, buckets, smart_crop, derived_cache
 
 # Determine Root Directory
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 EDIT_DIR = os.path.join(BASE_DIR, "Image Edits")
+EDITOR_EXTS = ('.jpg', '.png', '.jpeg', '.webp', '.bmp', '.tiff')
 
 # --- WORKER FOR THUMBNAILS (Keep this threaded, it's read-only and safe) ---
 class ThumbnailSignals(QObject):
@@ -35,15 +37,93 @@ class ThumbnailWorker(QRunnable):
         pix = load_thumbnail(self.path, self.size)
         info = "?"
         try:
-            with Image.open(self.path) as img:
-                w, h = img.size
-                info = f"{w} x {h}"
-        except: pass
+            # Stat check against the catalog; the header is only re-read if the file changed
+            entry = CATALOG.entry(self.path)
+            if entry: info = entry.dimensions
+        except Exception as e:
+            print(f"Catalog lookup failed for {self.path}: {e}")
         self.signals.loaded.emit(self.path, pix, info)
 
+# --- WORKER FOR BATCH EDITS (decode/transform/encode run in the process pool) ---
+class BatchSignals(QObject):
+    progress = Signal(object)        # (done, total)
+    file_done = Signal(object)       # (status, path, save_path, message, timings, peak bytes, decode mode, (worker pid, peak RSS))
+    finished = Signal(int, bool)     # processed, cancelled
+    failed = Signal(str)
+    message = Signal(str)
+
+class BatchEditWorker(QRunnable):
+    def __init__(self, jobs, output_folder, memory_budget_mb=edit_ops.MEMORY_BUDGET_MB, use_cache=True):
+        super().__init__()
+        self.jobs = jobs   # [(path, steps)]
+        self.output_folder = output_folder
+        self.memory_budget_mb = memory_budget_mb
+        self.use_cache = use_cache
+        self.cancel_requested = False
+        self.signals = BatchSignals()
+
+    @Slot()
+    def run(self):
+        processed = 0
+        progress = lambda done, total: self.signals.progress.emit((done, total))
+        cancelled = lambda: self.cancel_requested
+        try:
+            jobs = self.jobs
+            if any(smart_crop.needs_focus(steps) for _, steps in jobs):
+                # Detection first (cached per file in the catalog), then every crop knows its window
+                if not smart_crop.faces_available():
+                    self.signals.message.emit("⚠️ " + smart_crop.FACES_UNAVAILABLE)
+                jobs, counts = smart_crop.resolve_focus(jobs, CATALOG, progress, cancelled)
+                self.signals.message.emit("🎯 Smart focus: " + ", ".join(f"{kind} ×{n}" for kind, n in sorted(counts.items())))
+                if self.cancel_requested:
+                    self.signals.finished.emit(0, True)
+                    return
+            cache = derived_cache.DerivedCache() if self.use_cache else None
+            try:
+                keys, done = {}, 0
+                if cache:
+                    hits, jobs, keys = cache.split(jobs, self.output_folder, CATALOG, progress, cancelled)
+                    for path, steps, save_path, cached in hits:
+                        try:
+                            derived_cache.export(cached, save_path)
+                        except Exception as e:
+                            print(f"Derived cache: cannot link {cached} to {save_path}: {e}")
+                            jobs.append((path, steps))
+                            continue
+                        processed += 1
+                        self.signals.file_done.emit(('ok', path, save_path, "", [], 0, 'cached', (0, 0)))
+                    done = processed
+                    if hits:
+                        self.signals.message.emit(f"🗃 Reused {done} cached results, {len(jobs)} to edit")
+                    if self.cancel_requested:
+                        self.signals.finished.emit(processed, True)
+                        return
+                total = done + len(jobs)
+                report = lambda n, _: self.signals.progress.emit((done + n, total))
+                if jobs:
+                    self.signals.message.emit(f"🧠 Memory budget {self.memory_budget_mb} MB: up to "
+                                              f"{edit_ops.image_limit_mb(self.memory_budget_mb, len(jobs))} MB per image")
+                for result in edit_ops.run_jobs(jobs, self.output_folder, report, cancelled, self.memory_budget_mb):
+                    if result[0] == 'ok':
+                        processed += 1
+                        if result[1] in keys and result[2]:
+                            try:
+                                cache.put(keys[result[1]], result[2])
+                            except Exception as e:
+                                print(f"Derived cache: cannot store {result[2]}: {e}")
+                    self.signals.file_done.emit(result)
+            finally:
+                if cache: cache.save()
+            self.signals.finished.emit(processed, self.cancel_requested)
+        except BrokenProcessPool:
+            reset_process_pool()
+            self.signals.failed.emit("A worker process crashed (out of memory?).")
+        except Exception as e:
+            self.signals.failed.emit(str(e))
+
 # --- VISUAL CARD ---
 class EditorCard(QFrame):
-    selection_changed = Signal(str, bool)
+    clicked = Signal(str, bool)  # path, shift held
 
     def __init__(self, path):
         super().__init__()
@@ -79,21 +159,22 @@ class EditorCard(QFrame):
             self.lbl_image.setPixmap(pix)
         self.lbl_res.setText(info)
 
-    def toggle_selection(self, state=None):
-        if state is not None:
+    def set_selected(self, state):
+        if self.is_selected != state:
             self.is_selected = state
-        else:
-            self.is_selected = not self.is_selected
-        self.update_style()
-        self.selection_changed.emit(self.path, self.is_selected)
+            self.update()
 
     def update_style(self):
-        border = "#e17055" if self.is_selected else "transparent"
-        self.setStyleSheet(f"EditorCard {{ background-color: #2b2b2b; border: 2px solid {border}; border-radius: 8px; }}")
+        self.setStyleSheet("EditorCard { background-color: #2b2b2b; border: 2px solid transparent; border-radius: 8px; }")
+
+    def paintEvent(self, event):
+        super().paintEvent(event)
+        if self.is_selected:
+            paint_selection_border(self, "#e17055")
 
     def mousePressEvent(self, event):
         if event.button() == Qt.LeftButton:
-            self.toggle_selection()
+            self.clicked.emit(self.path, bool(event.modifiers() & Qt.ShiftModifier))
         super().mousePressEvent(event)
 
 # --- MAIN EDITOR TAB ---
@@ -101,9 +182,22 @@ class EditorTab(QWidget):
     def __init__(self):
         super().__init__()
         self.cards = {}
-        self.selected_paths = set()
+        self.selection = SelectionModel(self)
+        self.selection.changed.connect(self.on_selection)
         self.thread_pool = QThreadPool()
         self.current_folder = ""
+        self.batch_worker = None
+        self.batch_labels = []
+        self.batch_timings = []
+        self.batch_timed = 0
+        self.batch_budget = edit_ops.MEMORY_BUDGET_MB
+        self.batch_rss = {}
+        self.batch_peak = 0
+        self.batch_decodes = {}
+        self.batch_manifest = None
+        self.bucket_planner = None
+        self.pipeline_steps = []
+        self.recipes = edit_ops.load_recipes()
         
         layout = QHBoxLayout(self)
         splitter = QSplitter(Qt.Horizontal)
@@ -116,6 +210,7 @@ class EditorTab(QWidget):
         self.btn_folder = QPushButton("📂 Open Folder")
         self.btn_folder.clicked.connect(self.load_folder)
         self.btn_select_all = QPushButton("Select All")
+        self.btn_select_all.setToolTip("Ctrl+A · Shift+Click: select range · Ctrl+I: invert")
         self.btn_select_all.clicked.connect(self.select_all)
         grid_tools.addWidget(self.btn_folder)
         grid_tools.addWidget(self.btn_select_all)
@@ -145,16 +240,37 @@ class EditorTab(QWidget):
         self.rad_overwrite = QRadioButton("Overwrite Originals")
         lyt_out.addWidget(self.rad_folder)
         lyt_out.addWidget(self.rad_overwrite)
+        mem_row = QHBoxLayout()
+        self.spin_memory = QSpinBox(); self.spin_memory.setRange(256, 65536); self.spin_memory.setSingleStep(256)
+        self.spin_memory.setValue(edit_ops.MEMORY_BUDGET_MB); self.spin_memory.setSuffix(" MB")
+        self.spin_memory.setToolTip(
+            "Pixel memory for the whole batch. It is split between the worker processes editing at the\n"
+            "same time; images whose decode would need more than their share are skipped instead of exhausting RAM.")
+        mem_row.addWidget(QLabel("Memory budget:")); mem_row.addWidget(self.spin_memory)
+        lyt_out.addLayout(mem_row)
+        self.chk_cache = QCheckBox("Reuse earlier results of the same edits")
+        self.chk_cache.setChecked(True)
+        self.chk_cache.setToolTip(
+            "Outputs are kept in cache/derived, keyed by the source file's content and the exact steps.\n"
+            f"Re-running a recipe hardlinks them instead of re-editing. Oldest results go past {derived_cache.DEFAULT_BUDGET_MB} MB.")
+        lyt_out.addWidget(self.chk_cache)
         right_layout.addWidget(grp_out)
 
         grp_rot = QGroupBox("2. Batch Rotate")
-        lyt_rot = QHBoxLayout(grp_rot)
+        lyt_rot = QVBoxLayout(grp_rot)
+        row_rot = QHBoxLayout()
         self.btn_ccw = QPushButton("⟲ Left")
         self.btn_cw = QPushButton("⟳ Right")
-        self.btn_ccw.clicked.connect(lambda: self.run_batch_main_thread('rotate', {'direction': 'ccw'}))
-        self.btn_cw.clicked.connect(lambda: self.run_batch_main_thread('rotate', {'direction': 'cw'}))
-        lyt_rot.addWidget(self.btn_ccw)
-        lyt_rot.addWidget(self.btn_cw)
+        self.btn_ccw.clicked.connect(lambda: self.run_batch('rotate', self.rotate_params('ccw')))
+        self.btn_cw.clicked.connect(lambda: self.run_batch('rotate', self.rotate_params('cw')))
+        row_rot.addWidget(self.btn_ccw)
+        row_rot.addWidget(self.btn_cw)
+        lyt_rot.addLayout(row_rot)
+        self.chk_lossless = QCheckBox("Lossless for JPEG (EXIF orientation tag)")
+        self.chk_lossless.setToolTip(
+            "Rewrites only the Orientation tag: no re-encode, no quality loss, near-instant.\n"
+            "Pixels stay stored as before, so tools that ignore EXIF will still see the old orientation.")
+        lyt_rot.addWidget(self.chk_lossless)
         right_layout.addWidget(grp_rot)
 
         grp_res = QGroupBox("3. Batch Resize")
@@ -182,7 +298,10 @@ class EditorTab(QWidget):
         self.spin_cw = QSpinBox(); self.spin_cw.setRange(64, 8192); self.spin_cw.setValue(512); self.spin_cw.setPrefix("W: ")
         self.spin_ch = QSpinBox(); self.spin_ch.setRange(64, 8192); self.spin_ch.setValue(512); self.spin_ch.setPrefix("H: ")
         crop_dim.addWidget(self.spin_cw); crop_dim.addWidget(self.spin_ch)
-        self.combo_focus = QComboBox(); self.combo_focus.addItems(["Center", "Top-Left", "Top-Center", "Top-Right", "Bottom-Center"])
+        self.combo_focus = QComboBox(); self.combo_focus.addItems(["Center", "Top-Left", "Top-Center", "Top-Right", "Bottom-Center", smart_crop.SMART_FOCUS])
+        self.combo_focus.setToolTip("Smart: keeps detected faces (with hair and chin) in frame, otherwise\n"
+                                    "centres on the most salient region. Detected once per file and cached."
+                                    + ("" if smart_crop.faces_available() else "\n\n⚠️ " + smart_crop.FACES_UNAVAILABLE))
         self.btn_crop = QPushButton("Apply Crop")
         self.btn_crop.clicked.connect(self.prep_crop)
         self.btn_crop.setStyleSheet("background-color: #d63031; color: white;")
@@ -201,10 +320,89 @@ class EditorTab(QWidget):
         lyt_conv.addWidget(QLabel("Format:")); lyt_conv.addWidget(self.combo_format); lyt_conv.addWidget(self.lbl_quality); lyt_conv.addWidget(self.slider_quality); lyt_conv.addWidget(self.btn_convert)
         right_layout.addWidget(grp_conv)
 
+        grp_pipe = QGroupBox("6. Pipeline (one decode, one encode)")
+        lyt_pipe = QVBoxLayout(grp_pipe)
+        recipe_row = QHBoxLayout()
+        self.combo_recipe = QComboBox()
+        self.combo_recipe.setPlaceholderText("Load recipe...")
+        self.combo_recipe.activated.connect(self.load_recipe)
+        self.btn_save_recipe = QPushButton("💾")
+        self.btn_save_recipe.setToolTip("Save steps as a named recipe")
+        self.btn_save_recipe.setFixedWidth(30)
+        self.btn_save_recipe.clicked.connect(self.save_recipe)
+        self.btn_del_recipe = QPushButton("🗑️")
+        self.btn_del_recipe.setToolTip("Delete the selected recipe")
+        self.btn_del_recipe.setFixedWidth(30)
+        self.btn_del_recipe.clicked.connect(self.delete_recipe)
+        recipe_row.addWidget(self.combo_recipe, 1); recipe_row.addWidget(self.btn_save_recipe); recipe_row.addWidget(self.btn_del_recipe)
+        self.list_steps = QListWidget()
+        self.list_steps.setFixedHeight(100)
+        add_row = QHBoxLayout()
+        self.combo_step = QComboBox()
+        self.combo_step.addItem("Rotate ⟳ Right", "rotate_cw")
+        self.combo_step.addItem("Rotate ⟲ Left", "rotate_ccw")
+        self.combo_step.addItem("Resize", "resize")
+        self.combo_step.addItem("Crop", "crop")
+        self.combo_step.addItem("Convert", "convert")
+        self.combo_step.setToolTip("Steps take their values from the panels above")
+        btn_add_step = QPushButton("➕ Add")
+        btn_add_step.clicked.connect(self.add_step)
+        add_row.addWidget(self.combo_step, 1); add_row.addWidget(btn_add_step)
+        step_row = QHBoxLayout()
+        btn_up = QPushButton("▲"); btn_up.clicked.connect(lambda: self.move_step(-1))
+        btn_down = QPushButton("▼"); btn_down.clicked.connect(lambda: self.move_step(1))
+        btn_remove = QPushButton("Remove"); btn_remove.clicked.connect(self.remove_step)
+        btn_clear = QPushButton("Clear"); btn_clear.clicked.connect(lambda: self.set_pipeline([]))
+        for btn in (btn_up, btn_down, btn_remove, btn_clear): step_row.addWidget(btn)
+        self.btn_run_pipeline = QPushButton("▶ Run Pipeline")
+        self.btn_run_pipeline.clicked.connect(self.run_pipeline)
+        self.btn_run_pipeline.setStyleSheet("background-color: #00b894; color: white; font-weight: bold;")
+        lyt_pipe.addLayout(recipe_row); lyt_pipe.addWidget(self.list_steps); lyt_pipe.addLayout(add_row); lyt_pipe.addLayout(step_row); lyt_pipe.addWidget(self.btn_run_pipeline)
+        right_layout.addWidget(grp_pipe)
+        self.refresh_recipes()
+
+        grp_bucket = QGroupBox("7. Aspect Buckets (training sets)")
+        grp_bucket.setToolTip("Uses the selected images, or the whole folder when nothing is selected.\n"
+                              "Crops use the Focus from 4. Batch Crop.")
+        lyt_bucket = QVBoxLayout(grp_bucket)
+        form_bucket = QFormLayout()
+        self.combo_bucket_res = QComboBox()
+        for label, resolution in buckets.PRESETS.items():
+            self.combo_bucket_res.addItem(label, resolution)
+        self.combo_bucket_res.setCurrentIndex(self.combo_bucket_res.count() - 1)
+        self.spin_bucket_step = QSpinBox(); self.spin_bucket_step.setRange(8, 256); self.spin_bucket_step.setSingleStep(8)
+        self.spin_bucket_step.setValue(buckets.DEFAULT_STEP); self.spin_bucket_step.setSuffix(" px")
+        form_bucket.addRow("Resolution:", self.combo_bucket_res)
+        form_bucket.addRow("Side multiple:", self.spin_bucket_step)
+        self.chk_bucket_upscale = QCheckBox("Upscale images smaller than their bucket")
+        self.chk_bucket_upscale.setChecked(True)
+        self.chk_bucket_upscale.setToolTip("Off: small images get a bucket of their own size (rounded down) instead")
+        self.bucket_view = QTextEdit()
+        self.bucket_view.setReadOnly(True)
+        self.bucket_view.setFixedHeight(120)
+        self.bucket_view.setPlaceholderText("Analyze to see how images fall into buckets")
+        self.bucket_view.setStyleSheet("font-family: monospace;")
+        bucket_row = QHBoxLayout()
+        self.btn_bucket_analyze = QPushButton("📊 Analyze")
+        self.btn_bucket_analyze.clicked.connect(self.analyze_buckets)
+        self.btn_bucket_run = QPushButton("▶ Resize && Crop")
+        self.btn_bucket_run.clicked.connect(self.run_buckets)
+        self.btn_bucket_run.setStyleSheet("background-color: #0984e3; color: white; font-weight: bold;")
+        bucket_row.addWidget(self.btn_bucket_analyze); bucket_row.addWidget(self.btn_bucket_run)
+        lyt_bucket.addLayout(form_bucket); lyt_bucket.addWidget(self.chk_bucket_upscale)
+        lyt_bucket.addWidget(self.bucket_view); lyt_bucket.addLayout(bucket_row)
+        right_layout.addWidget(grp_bucket)
+
         right_layout.addStretch()
         
+        progress_row = QHBoxLayout()
         self.progress = QProgressBar()
-        right_layout.addWidget(self.progress)
+        self.btn_cancel = QPushButton("🛑 Cancel")
+        self.btn_cancel.clicked.connect(self.cancel_batch)
+        self.btn_cancel.hide()
+        progress_row.addWidget(self.progress)
+        progress_row.addWidget(self.btn_cancel)
+        right_layout.addLayout(progress_row)
         self.log_box = QTextEdit()
         self.log_box.setPlaceholderText("Log...")
         self.log_box.setReadOnly(True)
@@ -221,8 +419,9 @@ class EditorTab(QWidget):
 
     def setup_hotkeys(self):
         QShortcut(QKeySequence("Ctrl+A"), self).activated.connect(self.select_all)
-        QShortcut(QKeySequence("Ctrl+R"), self).activated.connect(lambda: self.run_batch_main_thread('rotate', {'direction': 'cw'}))
-        QShortcut(QKeySequence("Ctrl+Shift+R"), self).activated.connect(lambda: self.run_batch_main_thread('rotate', {'direction': 'ccw'}))
+        QShortcut(QKeySequence("Ctrl+I"), self).activated.connect(self.selection.invert)
+        QShortcut(QKeySequence("Ctrl+R"), self).activated.connect(lambda: self.run_batch('rotate', self.rotate_params('cw')))
+        QShortcut(QKeySequence("Ctrl+Shift+R"), self).activated.connect(lambda: self.run_batch('rotate', self.rotate_params('ccw')))
 
     def load_folder(self):
         folder = QFileDialog.getExistingDirectory(self, "Select Folder")
@@ -234,34 +433,66 @@ class EditorTab(QWidget):
         for i in reversed(range(self.grid_layout.count())): 
             self.grid_layout.itemAt(i).widget().setParent(None)
         self.cards.clear()
-        self.selected_paths.clear()
-        
-        exts = ('.jpg', '.png', '.jpeg', '.webp', '.bmp', '.tiff')
-        files = [f for f in os.listdir(self.current_folder) if f.lower().endswith(exts)]
+        self.selection.set_items([])
+        loading = LoadingLabel()
+        self.grid_layout.addWidget(loading, 0, 0, 1, 3)
+        worker = CatalogLoadWorker(self.current_folder, EDITOR_EXTS)
+        worker.signals.progress.connect(loading.set_progress)
+        worker.signals.finished.connect(self.on_grid_loaded)
+        worker.signals.failed.connect(self.on_grid_load_failed)
+        # Ahead of thumbnails still queued for the previous folder
+        self.thread_pool.start(worker, 1)
+
+    def clear_loading(self):
+        for i in reversed(range(self.grid_layout.count())): 
+            self.grid_layout.itemAt(i).widget().setParent(None)
+
+    def on_grid_loaded(self, folder, entries):
+        # Another folder was opened meanwhile
+        if folder != self.current_folder: return
+        self.clear_loading()
+        self.selection.set_items(e.path for e in entries)
         cols = 3
-        for i, f in enumerate(files):
-            path = os.path.join(self.current_folder, f)
+        for i, entry in enumerate(entries):
+            path = entry.path
             card = EditorCard(path)
-            card.selection_changed.connect(self.on_selection)
+            card.clicked.connect(self.on_card_clicked)
             self.grid_layout.addWidget(card, i // cols, i % cols)
             self.cards[path] = card
             self.reload_card_thumbnail(path)
 
+    def on_grid_load_failed(self, folder, message):
+        if folder != self.current_folder: return
+        self.clear_loading()
+        self.log_box.append(f"❌ Failed to read folder: {message}")
+
     def reload_card_thumbnail(self, path):
         if path in self.cards:
             worker = ThumbnailWorker(path, (220, 220))
             worker.signals.loaded.connect(self.cards[path].set_data)
             self.thread_pool.start(worker)
 
-    def on_selection(self, path, is_selected):
-        if is_selected: self.selected_paths.add(path)
-        else: self.selected_paths.discard(path)
+    @property
+    def selected_paths(self):
+        return self.selection.selected
+
+    def on_card_clicked(self, path, shift):
+        if shift: self.selection.select_range(path)
+        else: self.selection.toggle(path)
+
+    def on_selection(self, added, removed):
+        restyle_cards(self.grid_container, self.cards, added, removed)
 
     def select_all(self):
-        target = not (len(self.selected_paths) == len(self.cards) and len(self.cards) > 0)
-        for card in self.cards.values(): card.toggle_selection(target)
+        self.selection.toggle_all()
 
-    def prep_resize(self):
+    def rotate_params(self, direction):
+        params = {'direction': direction}
+        if self.chk_lossless.isChecked():
+            params['lossless'] = True
+        return params
+
+    def resize_params(self):
         params = {}
         if self.rad_longest.isChecked():
             params['mode'] = 'longest'
@@ -270,150 +501,324 @@ class EditorTab(QWidget):
             params['mode'] = 'force'
             params['w'] = self.spin_w.value()
             params['h'] = self.spin_h.value()
-        self.run_batch_main_thread('resize', params)
+        return params
 
-    def prep_crop(self):
-        params = {
+    def crop_params(self):
+        return {
             'w': self.spin_cw.value(),
             'h': self.spin_ch.value(),
             'focus': self.combo_focus.currentText()
         }
-        self.run_batch_main_thread('crop', params)
 
-    def prep_convert(self):
-        params = {
+    def convert_params(self):
+        return {
             'format': self.combo_format.currentText(),
             'quality': self.slider_quality.value()
         }
-        self.run_batch_main_thread('convert', params)
 
-    def run_batch_main_thread(self, operation, params):
-        if not self.selected_paths:
-            self.log_box.append("⚠️ No images selected!")
-            return
+    def prep_resize(self):
+        self.run_batch('resize', self.resize_params())
 
-        mode = 'overwrite' if self.rad_overwrite.isChecked() else 'folder'
-        output_folder = EDIT_DIR if mode == 'folder' else ""
-        
-        if mode == 'folder':
-            if not os.path.exists(output_folder):
-                try: os.makedirs(output_folder)
-                except Exception as e:
-                    QMessageBox.critical(self, "Error", f"Could not create output folder:\n{e}")
-                    return
+    def prep_crop(self):
+        self.run_batch('crop', self.crop_params())
 
-        paths = list(self.selected_paths)
-        count = len(paths)
-        progress = QProgressDialog(f"Running {operation}...", "Abort", 0, count, self)
-        progress.setWindowModality(Qt.WindowModal)
-        progress.show()
+    def prep_convert(self):
+        self.run_batch('convert', self.convert_params())
+
+    # --- PIPELINE ---
+    def set_pipeline(self, steps):
+        self.pipeline_steps = list(steps)
+        self.list_steps.clear()
+        self.list_steps.addItems([f"{i}. {edit_ops.describe_step(s)}" for i, s in enumerate(self.pipeline_steps, 1)])
+
+    def add_step(self):
+        kind = self.combo_step.currentData()
+        if kind == 'rotate_cw': step = edit_ops.make_step('rotate', self.rotate_params('cw'))
+        elif kind == 'rotate_ccw': step = edit_ops.make_step('rotate', self.rotate_params('ccw'))
+        elif kind == 'resize': step = edit_ops.make_step('resize', self.resize_params())
+        elif kind == 'crop': step = edit_ops.make_step('crop', self.crop_params())
+        else: step = edit_ops.make_step('convert', self.convert_params())
+        self.set_pipeline(self.pipeline_steps + [step])
+        self.list_steps.setCurrentRow(len(self.pipeline_steps) - 1)
+
+    def move_step(self, offset):
+        row = self.list_steps.currentRow()
+        target = row + offset
+        if row < 0 or not 0 <= target < len(self.pipeline_steps): return
+        steps = list(self.pipeline_steps)
+        steps[row], steps[target] = steps[target], steps[row]
+        self.set_pipeline(steps)
+        self.list_steps.setCurrentRow(target)
+
+    def remove_step(self):
+        row = self.list_steps.currentRow()
+        if row < 0: return
+        self.set_pipeline(self.pipeline_steps[:row] + self.pipeline_steps[row + 1:])
+
+    def refresh_recipes(self):
+        self.combo_recipe.clear()
+        self.combo_recipe.addItems(sorted(self.recipes))
+        self.combo_recipe.setCurrentIndex(-1)
+
+    def load_recipe(self, index):
+        name = self.combo_recipe.itemText(index)
+        if name in self.recipes:
+            self.set_pipeline(self.recipes[name])
+
+    def save_recipe(self):
+        if not self.pipeline_steps:
+            self.log_box.append("⚠️ Add steps before saving a recipe.")
+            return
+        name, ok = QInputDialog.getText(self, "Save Recipe", "Recipe name:", text=self.combo_recipe.currentText())
+        name = name.strip()
+        if not ok or not name: return
+        self.recipes[name] = list(self.pipeline_steps)
+        try:
+            edit_ops.save_recipes(self.recipes)
+        except Exception as e:
+            QMessageBox.critical(self, "Error", f"Could not save recipes:\n{e}")
+            return
+        self.refresh_recipes()
+        self.combo_recipe.setCurrentText(name)
 
-        processed_count = 0
-        
-        for i, path in enumerate(paths):
-            if progress.wasCanceled():
-                self.log_box.append("🛑 Batch Aborted.")
-                break
-            
-            progress.setValue(i)
-            QApplication.processEvents()
-            
-            try:
-                img = cv2.imread(path, cv2.IMREAD_UNCHANGED)
-                if img is None:
-                    # Unicode fallback
-                    stream = np.fromfile(path, dtype=np.uint8)
-                    img = cv2.imdecode(stream, cv2.IMREAD_UNCHANGED)
-                
-                if img is None:
-                    self.log_box.append(f"❌ Failed load: {os.path.basename(path)}")
-                    continue
-
-                h, w = img.shape[:2]
-                res_img = img
-                new_ext = None
-                save_params = []
-
-                if operation == 'rotate':
-                    direction = params.get('direction', 'cw')
-                    if direction == 'cw': res_img = cv2.rotate(img, cv2.ROTATE_90_CLOCKWISE)
-                    else: res_img = cv2.rotate(img, cv2.ROTATE_90_COUNTERCLOCKWISE)
-
-                elif operation == 'resize':
-                    mode_r = params.get('mode', 'longest')
-                    new_w, new_h = w, h
-                    if mode_r == 'longest':
-                        target = int(params['size'])
-                        scale = target / max(h, w)
-                        new_w, new_h = int(w * scale), int(h * scale)
-                    else:
-                        new_w, new_h = int(params['w']), int(params['h'])
-                    
-                    new_w = max(1, new_w); new_h = max(1, new_h)
-                    if new_w != w or new_h != h:
-                        res_img = cv2.resize(img, (new_w, new_h), interpolation=cv2.INTER_AREA)
-
-                elif operation == 'crop':
-                    t_w, t_h = int(params['w']), int(params['h'])
-                    focus = params.get('focus', 'Center')
-                    if w < t_w or h < t_h:
-                        self.log_box.append(f"⚠️ Too small: {os.path.basename(path)}")
-                        continue
-                    
-                    x = (w - t_w) // 2
-                    y = (h - t_h) // 2
-                    
-                    if focus == 'Top-Left': x, y = 0, 0
-                    elif focus == 'Top-Center': x, y = (w - t_w)//2, 0
-                    elif focus == 'Top-Right': x, y = w - t_w, 0
-                    elif focus == 'Center-Left': x, y = 0, (h - t_h)//2
-                    elif focus == 'Center-Right': x, y = w - t_w, (h - t_h)//2
-                    elif focus == 'Bottom-Left': x, y = 0, h - t_h
-                    elif focus == 'Bottom-Center': x, y = (w - t_w)//2, h - t_h
-                    elif focus == 'Bottom-Right': x, y = w - t_w, h - t_h
-                    
-                    x = max(0, min(x, w - t_w))
-                    y = max(0, min(y, h - t_h))
-                    res_img = img[y:y+t_h, x:x+t_w]
-
-                elif operation == 'convert':
-                    fmt = params['format'].lower()
-                    quality = params['quality']
-                    new_ext = f".{fmt}"
-                    if fmt in ['jpg', 'jpeg']:
-                        save_params = [int(cv2.IMWRITE_JPEG_QUALITY), quality]
-                        if len(res_img.shape) == 3 and res_img.shape[2] == 4:
-                            res_img = cv2.cvtColor(res_img, cv2.COLOR_BGRA2BGR)
-                    elif fmt == 'webp':
-                        save_params = [int(cv2.IMWRITE_WEBP_QUALITY), quality]
-
-                filename = os.path.basename(path)
-                if new_ext:
-                    base = os.path.splitext(filename)[0]
-                    filename = f"{base}{new_ext}"
-                
-                if mode == 'folder':
-                    save_path = os.path.join(output_folder, filename)
-                else:
-                    save_path = os.path.join(os.path.dirname(path), filename)
-
-                ext = os.path.splitext(save_path)[1]
-                if not ext: ext = os.path.splitext(path)[1]
-                
-                success, encoded_img = cv2.imencode(ext, res_img, save_params)
-                if success:
-                    with open(save_path, "wb") as f:
-                        encoded_img.tofile(f)
-                    processed_count += 1
-                    if save_path == path:
-                        self.reload_card_thumbnail(path)
-                else:
-                    self.log_box.append(f"❌ Save failed: {filename}")
-
-                gc.collect()
+    def delete_recipe(self):
+        name = self.combo_recipe.currentText()
+        if name not in self.recipes: return
+        del self.recipes[name]
+        try:
+            edit_ops.save_recipes(self.recipes)
+        except Exception as e:
+            QMessageBox.critical(self, "Error", f"Could not save recipes:\n{e}")
+        self.refresh_recipes()
+
+    def run_pipeline(self):
+        if not self.pipeline_steps:
+            self.log_box.append("⚠️ Pipeline is empty!")
+            return
+        self.run_steps(self.pipeline_steps)
+
+    # --- BATCH ---
+    def run_batch(self, operation, params):
+        self.run_steps([edit_ops.make_step(operation, params)])
 
+    def run_steps(self, steps):
+        if self.batch_worker:
+            self.log_box.append("⚠️ A batch is already running.")
+            return
+        if not self.selected_paths:
+            self.log_box.append("⚠️ No images selected!")
+            return
+        output_folder = self.output_folder()
+        if output_folder is None: return
+
+        paths = sorted(self.selected_paths, key=lambda p: self.selection.position.get(p, 0))
+        labels = [edit_ops.describe_step(s) for s in steps]
+        self.log_box.append(f"Running {' → '.join(labels)} on {len(paths)} images...")
+        self.start_jobs([(p, steps) for p in paths], labels, output_folder)
+
+    def output_folder(self):
+        """'' to overwrite originals, the edits folder otherwise; None if it cannot be created."""
+        if self.rad_overwrite.isChecked():
+            return ""
+        if not os.path.exists(EDIT_DIR):
+            try: os.makedirs(EDIT_DIR)
             except Exception as e:
-                self.log_box.append(f"❌ Error {os.path.basename(path)}: {e}")
+                QMessageBox.critical(self, "Error", f"Could not create output folder:\n{e}")
+                return None
+        return EDIT_DIR
+
+    def start_jobs(self, jobs, labels, output_folder, manifest=None):
+        """Every job must have the same number of steps, `labels` names them for the timing log."""
+        self.progress.setMaximum(len(jobs))
+        self.progress.setValue(0)
+        self.batch_labels = ["Decode"] + labels + ["Encode + write"]
+        self.batch_timings = [0.0] * len(self.batch_labels)
+        self.batch_timed = 0
+        self.batch_budget = self.spin_memory.value()
+        self.batch_peak = 0
+        self.batch_rss = {}
+        self.batch_decodes = {}
+        self.batch_manifest = manifest
+
+        self.batch_worker = BatchEditWorker(jobs, output_folder, self.batch_budget, self.chk_cache.isChecked())
+        self.batch_worker.signals.progress.connect(lambda state: self.progress.setValue(state[0]))
+        self.batch_worker.signals.file_done.connect(self.on_file_edited)
+        self.batch_worker.signals.finished.connect(self.on_batch_finished)
+        self.batch_worker.signals.failed.connect(self.on_batch_failed)
+        self.batch_worker.signals.message.connect(self.log_box.append)
+        self.set_batch_running(True)
+        self.thread_pool.start(self.batch_worker)
+
+    def set_batch_running(self, running):
+        for btn in (self.btn_ccw, self.btn_cw, self.btn_resize, self.btn_crop, self.btn_convert, self.btn_folder,
+                    self.btn_run_pipeline, self.btn_bucket_run):
+            btn.setEnabled(not running)
+        self.btn_cancel.setVisible(running)
+        self.btn_cancel.setEnabled(True)
+
+    def cancel_batch(self):
+        if self.batch_worker:
+            self.batch_worker.cancel_requested = True
+            self.btn_cancel.setEnabled(False)
+
+    def on_file_edited(self, result):
+        status, path, save_path, message, timings, peak, decode, (pid, rss) = result
+        name = os.path.basename(path)
+        self.batch_peak = max(self.batch_peak, peak)
+        if pid:
+            self.batch_rss[pid] = max(self.batch_rss.get(pid, 0), rss)
+        if status == 'ok':
+            if timings:   # Cached results took no decode or encode
+                self.batch_timed += 1
+            for i, seconds in enumerate(timings):
+                self.batch_timings[i] += seconds
+            self.batch_decodes[decode] = self.batch_decodes.get(decode, 0) + 1
+            if self.batch_manifest:
+                self.batch_manifest["done"].append((path, save_path))
+        if status == 'skipped':
+            self.log_box.append(f"⚠️ {message}: {name}")
+        elif status == 'error':
+            self.log_box.append(f"❌ {message}: {name}")
+        elif save_path == path:
+            self.reload_card_thumbnail(path)
 
-        progress.setValue(count)
-        self.log_box.append(f"✅ Finished. Processed {processed_count} images.")
\ No newline at end of file
+    def on_batch_finished(self, processed, cancelled):
+        self.batch_worker = None
+        self.set_batch_running(False)
+        if cancelled:
+            self.log_box.append("🛑 Batch Aborted.")
+        else:
+            self.progress.setValue(self.progress.maximum())
+        self.log_box.append(f"✅ Finished. Processed {processed} images.")
+        self.log_timings()
+        self.log_memory()
+        self.write_bucket_manifest()
+
+    def log_timings(self):
+        if not self.batch_timed: return
+        total = sum(self.batch_timings)
+        parts = [f"{label} {seconds / self.batch_timed * 1000:.0f} ms ({seconds / total * 100:.0f}%)"
+                 for label, seconds in zip(self.batch_labels, self.batch_timings)]
+        self.log_box.append("⏱ Per image: " + " · ".join(parts))
+
+    def log_memory(self):
+        if not self.batch_peak: return
+        decodes = ", ".join(f"{mode} ×{count}" for mode, count in sorted(self.batch_decodes.items()))
+        rss = ""
+        if any(self.batch_rss.values()):
+            # Lifetime high-water marks, interpreter and libraries included
+            rss = (f" · Worker RSS peak {max(self.batch_rss.values()) / 2**20:.0f} MB, "
+                   f"{sum(self.batch_rss.values()) / 2**20:.0f} MB across {len(self.batch_rss)} workers")
+        self.log_box.append(f"🧠 Peak pixel memory per image: {self.batch_peak / 2**20:.0f} MB (budget {self.batch_budget} MB)"
+                            + rss + (f" · Decodes: {decodes}" if decodes else ""))
+
+    def on_batch_failed(self, message):
+        self.batch_worker = None
+        self.set_batch_running(False)
+        self.log_box.append(f"❌ Batch failed: {message}")
+        self.write_bucket_manifest()
+
+    # --- ASPECT BUCKETS ---
+    def bucket_settings(self):
+        return {
+            "resolution": self.combo_bucket_res.currentData(),
+            "step": self.spin_bucket_step.value(),
+            "upscale": self.chk_bucket_upscale.isChecked(),
+            "focus": self.combo_focus.currentText(),
+        }
+
+    def plan_buckets(self, then):
+        """
+        Syncs the folder in a worker (edits may have changed sizes since it was shown), then calls
+        then(plan) with [(path, (w, h), bucket or None)] from catalog headers; no image is decoded.
+        """
+        if not self.current_folder:
+            self.log_box.append("⚠️ Open a folder first!")
+            return
+        if self.bucket_planner: return
+        self.btn_bucket_analyze.setEnabled(False)
+        self.btn_bucket_run.setEnabled(False)
+        self.bucket_planner = CatalogLoadWorker(self.current_folder, EDITOR_EXTS)
+        self.bucket_planner.signals.progress.connect(lambda state: self.bucket_view.setPlainText(f"Reading sizes {state[0]} / {state[1]}..."))
+        self.bucket_planner.signals.finished.connect(lambda folder, entries: self.on_bucket_entries(folder, entries, then))
+        self.bucket_planner.signals.failed.connect(self.on_bucket_entries_failed)
+        self.thread_pool.start(self.bucket_planner, 1)
+
+    def on_bucket_entries(self, folder, entries, then):
+        self.end_bucket_planning()
+        # Another folder was opened meanwhile
+        if folder != self.current_folder: return
+        selected = self.selected_paths
+        if selected:
+            entries = [e for e in entries if e.path in selected]
+        unsized = [e.name for e in entries if not (e.width and e.height)]
+        if unsized:
+            self.log_box.append(f"⚠️ {len(unsized)} images left out of the buckets, their size could not be read: "
+                                + ", ".join(unsized[:10]) + (" ..." if len(unsized) > 10 else ""))
+        entries = [e for e in entries if e.width and e.height]
+        settings = self.bucket_settings()
+        sizes = [(e.width, e.height) for e in entries]
+        assigned = buckets.assign(sizes, settings["resolution"], settings["step"], settings["upscale"])
+        then([(e.path, size, bucket) for e, size, bucket in zip(entries, sizes, assigned)])
+
+    def on_bucket_entries_failed(self, folder, message):
+        self.end_bucket_planning()
+        self.bucket_view.clear()
+        self.log_box.append(f"❌ Failed to read folder: {message}")
+
+    def end_bucket_planning(self):
+        self.bucket_planner = None
+        self.btn_bucket_analyze.setEnabled(True)
+        self.btn_bucket_run.setEnabled(not self.batch_worker)
+
+    def show_bucket_histogram(self, plan):
+        hist = buckets.histogram([bucket for _, _, bucket in plan])
+        top = max((count for _, count in hist), default=1)
+        lines = [f"{bw:>5}×{bh:<5} {bw / bh:4.2f}  {'█' * max(1, round(count / top * 12)):<12} {count}"
+                 for (bw, bh), count in hist]
+        too_small = sum(1 for _, _, bucket in plan if bucket is None)
+        summary = f"{len(plan) - too_small} images → {len(hist)} buckets"
+        if too_small:
+            summary += f" · {too_small} too small"
+        self.bucket_view.setPlainText("\n".join([summary] + lines))
+
+    def analyze_buckets(self):
+        self.plan_buckets(self.show_bucket_histogram)
+
+    def run_buckets(self):
+        if self.batch_worker:
+            self.log_box.append("⚠️ A batch is already running.")
+            return
+        self.plan_buckets(self.start_buckets)
+
+    def start_buckets(self, plan):
+        if self.batch_worker: return
+        self.show_bucket_histogram(plan)
+        plan = [item for item in plan if item[2]]
+        if not plan:
+            self.log_box.append("⚠️ No images to bucket!")
+            return
+        output_folder = self.output_folder()
+        if output_folder is None: return
+
+        settings = self.bucket_settings()
+        jobs = [(path, buckets.bucket_steps(w, h, bucket, settings["focus"])) for path, (w, h), bucket in plan]
+        manifest = {
+            "path": os.path.join(output_folder or self.current_folder, buckets.MANIFEST_FILE),
+            "settings": settings,
+            "sizes": {path: (size, bucket) for path, size, bucket in plan},
+            "done": [],
+        }
+        self.log_box.append(f"Bucketing {len(jobs)} images at {settings['resolution']}² "
+                            f"(multiples of {settings['step']} px)...")
+        self.start_jobs(jobs, ["Resize to cover", "Crop to bucket"], output_folder, manifest)
+
+    def write_bucket_manifest(self):
+        manifest, self.batch_manifest = self.batch_manifest, None
+        if not manifest or not manifest["done"]: return
+        images = [(src, out, *manifest["sizes"][src]) for src, out in manifest["done"]]
+        try:
+            buckets.write_manifest(manifest["path"], manifest["settings"], images)
+            self.log_box.append(f"📄 Manifest: {manifest['path']}")
+        except Exception as e:
+            self.log_box.append(f"❌ Could not write manifest: {e}")
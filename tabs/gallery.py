@@ -1,57 +1,36 @@
 import os
 import shutil
+import time
 import unicodedata
 from PySide6.QtWidgets import (
     QWidget, QVBoxLayout, QHBoxLayout, QLabel, QScrollArea, QPushButton, 
     QLineEdit, QGridLayout, QTextEdit, QSplitter, QFileDialog, QMessageBox, 
     QFrame, QListWidget, QProgressBar, QApplication, QInputDialog, QRadioButton,
-    QGroupBox, QSizePolicy
+    QGroupBox, QSizePolicy, QComboBox, QTableWidget, QTableWidgetItem, QHeaderView,
+    QAbstractItemView
 )
-from PySide6.QtCore import Qt, Signal, QRunnable, QThreadPool, QObject, Slot, QEvent
-from PySide6.QtGui import QPixmap, QShortcut, QKeySequence, QIcon, QUndoStack, QUndoCommand
+from PySide6.QtCore import Qt, Signal, QRunnable, QThreadPool, QObject, Slot, QEvent, QTimer
+from PySide6.QtGui import QPixmap, QShortcut, QKeySequence, QIcon, QUndoStack
 from core.image_utils import load_thumbnail
-from core.tagger import WD14Tagger
-from core.widgets import TagEditorWidget, AutoTagDialog
+from core.tagger import WD14Tagger, int8_agreement_report
+from core.widgets import TagEditorWidget, AutoTagDialog, FindReplaceDialog, QualitySortMixin, CatalogLoadWorker, LoadingLabel
+from core.tag_index import TagIndex
+from core.tag_stats import TagStats
+from core.caption_store import CaptionStore
+from core.caption_writer import CAPTION_WRITER
+from core.undo import BatchUpdateCommand, UpdateCaptionCommand, CaptionFilesCommand, enforce_undo_budget, undo_budget_bytes, rewrite_pool
+from core.caption_io import caption_path
+from core.selection import SelectionModel, restyle_cards, paint_selection_border
+from core import tag_normalizer, quality
 
 TAG_FILE = "user_tags.txt"
-
-# --- UNDO COMMANDS ---
-class UpdateCaptionCommand(QUndoCommand):
-    def __init__(self, card, old_text, new_text):
-        super().__init__()
-        self.card = card
-        self.old_text = old_text
-        self.new_text = new_text
-        self.setText(f"Edit: {os.path.basename(card.path)}")
-
-    def redo(self):
-        self.card.txt_caption.setPlainText(self.new_text)
-        if self.card.is_selected:
-            self.card.text_changed_internal.emit(self.card.path, self.new_text)
-
-    def undo(self):
-        self.card.txt_caption.setPlainText(self.old_text)
-        if self.card.is_selected:
-            self.card.text_changed_internal.emit(self.card.path, self.old_text)
-
-class BatchUpdateCommand(QUndoCommand):
-    def __init__(self, cards, new_texts, description="Batch Update"):
-        super().__init__(description)
-        self.cards = cards
-        self.new_texts = new_texts
-        self.old_texts = [c.txt_caption.toPlainText() for c in cards]
-
-    def redo(self):
-        for i, card in enumerate(self.cards):
-            card.txt_caption.setPlainText(self.new_texts[i])
-            if card.is_selected:
-                card.text_changed_internal.emit(card.path, self.new_texts[i])
-
-    def undo(self):
-        for i, card in enumerate(self.cards):
-            card.txt_caption.setPlainText(self.old_texts[i])
-            if card.is_selected:
-                card.text_changed_internal.emit(card.path, self.old_texts[i])
+INT8_REPORT_SAMPLE = 32
+FILTER_DEBOUNCE_MS = 150
+STATS_SLICE_MS = 30
+STATS_REFRESH_MS = 300
+STATS_ROWS = 100
+GALLERY_EXTS = ('.jpg', '.jpeg', '.png', '.webp')
+GRID_COLS = 4
 
 # --- WORKERS ---
 class ThumbnailSignals(QObject):
@@ -70,36 +49,63 @@ class ThumbnailWorker(QRunnable):
         self.signals.loaded.emit(self.path, pix)
 
 class TaggerSignals(QObject):
-    finished = Signal(object, list)
+    finished = Signal(str, list)
 
 class TaggerWorker(QRunnable):
-    def __init__(self, tagger, card, settings):
+    """Tags a whole batch; decoding happens in the process pool, inference here."""
+    def __init__(self, tagger, paths, settings):
         super().__init__()
         self.tagger = tagger
-        self.card = card
+        self.paths = paths
         self.settings = settings
         self.signals = TaggerSignals()
         
     @Slot()
     def run(self):
-        tags = self.tagger.tag_image(
-            self.card.path, 
+        results = self.tagger.tag_images(
+            self.paths, 
             threshold=self.settings['threshold'],
             max_tags=self.settings['max_tags'],
             blacklist=self.settings['blacklist']
         )
-        self.signals.finished.emit(self.card, tags)
+        done = set()
+        for path, tags in results:
+            done.add(path)
+            self.signals.finished.emit(path, tags)
+        # Keep the job counter honest if the model failed to load
+        for path in self.paths:
+            if path not in done:
+                self.signals.finished.emit(path, [])
+
+class ReportSignals(QObject):
+    finished = Signal(object)
+
+class Int8ReportWorker(QRunnable):
+    def __init__(self, paths, model_name):
+        super().__init__()
+        self.paths = paths
+        self.model_name = model_name
+        self.signals = ReportSignals()
+
+    @Slot()
+    def run(self):
+        report = int8_agreement_report(self.paths, self.model_name)
+        self.signals.finished.emit(report)
 
 # --- IMAGE CARD ---
 class ImageCard(QFrame):
-    selection_changed = Signal(str, bool)
+    clicked = Signal(str, bool)  # path, shift held
     text_changed_internal = Signal(str, str) 
     undo_req = Signal(str, str, str) 
+    edited = Signal()   # Typing in the caption editor
 
     def __init__(self, path, parent=None):
+        """The caption editor is built by the first set_text, once the card is scrolled into view."""
         super().__init__(parent)
         self.path = path
         self.is_selected = False
+        self.stale = True
+        self.txt_caption = None
         self._cached_text = "" 
         
         self.setFrameShape(QFrame.StyledPanel)
@@ -114,18 +120,21 @@ class ImageCard(QFrame):
         self.lbl_image.setAlignment(Qt.AlignCenter)
         self.lbl_image.setStyleSheet("background-color: #1e1e1e; border-radius: 4px; color: #888;")
         self.lbl_image.setFixedHeight(200) 
-        
+
+        self.layout.addWidget(self.lbl_image)
+        self.layout.addStretch(1)   # Where the editor goes
+
+        self.update_style()
+
+    def build_editor(self):
         self.txt_caption = QTextEdit()
         self.txt_caption.setPlaceholderText("Caption...")
         self.txt_caption.setStyleSheet("QTextEdit { background-color: #1e1e1e; border: 1px solid #333; border-radius: 4px; padding: 5px; color: #ddd; }")
         self.txt_caption.installEventFilter(self)
-
-        self.layout.addWidget(self.lbl_image)
+        self.txt_caption.textChanged.connect(self.edited.emit)
+        self.layout.takeAt(1)
         self.layout.addWidget(self.txt_caption)
 
-        self.load_text()
-        self.update_style()
-
     def eventFilter(self, obj, event):
         if obj == self.txt_caption:
             if event.type() == QEvent.FocusIn:
@@ -144,55 +153,71 @@ class ImageCard(QFrame):
         else:
             self.lbl_image.setText("Error")
 
-    def load_text(self):
-        txt_path = os.path.splitext(self.path)[0] + ".txt"
-        if os.path.exists(txt_path):
-            try:
-                with open(txt_path, 'r', encoding='utf-8') as f:
-                    content = f.read()
-                    self.txt_caption.setPlainText(content)
-                    self._cached_text = content
-            except: pass
-
-    def save_text(self):
-        txt_path = os.path.splitext(self.path)[0] + ".txt"
-        with open(txt_path, 'w', encoding='utf-8') as f:
-            f.write(self.txt_caption.toPlainText())
-
-    def clear_text(self):
-        self.txt_caption.clear()
+    def set_text(self, text):
+        """Shows store text without echoing it back as an edit."""
+        self.stale = False
+        if self.txt_caption is None:
+            self.build_editor()
+        if self.txt_caption.toPlainText() == text:
+            return
+        self.txt_caption.blockSignals(True)
+        self.txt_caption.setPlainText(text)
+        self.txt_caption.blockSignals(False)
+        if not self.txt_caption.hasFocus():
+            self._cached_text = text
 
-    def toggle_selection(self, force_state=None):
-        if force_state is not None:
-            self.is_selected = force_state
-        else:
-            self.is_selected = not self.is_selected
-        self.update_style()
-        self.selection_changed.emit(self.path, self.is_selected)
+    def set_selected(self, state):
+        if self.is_selected != state:
+            self.is_selected = state
+            self.update()
 
     def update_style(self):
-        border_color = "#00b894" if self.is_selected else "transparent"
         bg_color = "#2b2b2b"
-        self.setStyleSheet(f"ImageCard {{ background-color: {bg_color}; border-radius: 8px; border: 2px solid {border_color}; }}")
+        self.setStyleSheet(f"ImageCard {{ background-color: {bg_color}; border-radius: 8px; border: 2px solid transparent; }}")
+
+    def paintEvent(self, event):
+        super().paintEvent(event)
+        if self.is_selected:
+            paint_selection_border(self, "#00b894")
 
     def mousePressEvent(self, event):
         if event.button() == Qt.LeftButton:
-            self.toggle_selection()
+            self.clicked.emit(self.path, bool(event.modifiers() & Qt.ShiftModifier))
         super().mousePressEvent(event)
 
 # --- GALLERY TAB ---
-class GalleryTab(QWidget):
+class GalleryTab(QWidget, QualitySortMixin):
     image_selected = Signal(str) 
+    grid_cols = GRID_COLS
 
     def __init__(self):
         super().__init__()
         self.current_folder = ""
         self.image_cards = {} 
-        self.selected_paths = set()
+        self.selection = SelectionModel(self)
+        self.selection.changed.connect(self.on_selection_changed)
         self.thread_pool = QThreadPool() 
         self.undo_stack = QUndoStack(self)
+        self.undo_floor = 0
         self.tagger = WD14Tagger() 
         self.active_card = None 
+        self.store = CaptionStore(self)
+        self.store.changed.connect(self.on_store_changed)
+        self.tag_index = TagIndex()
+        self.filter_timer = QTimer(self)
+        self.filter_timer.setSingleShot(True)
+        self.filter_timer.setInterval(FILTER_DEBOUNCE_MS)
+        self.filter_timer.timeout.connect(self.apply_filter)
+        self.tag_stats = TagStats()
+        self.stats_pending = set()
+        # Stats are fed in time-boxed slices so a 100k folder load never freezes the UI
+        self.stats_timer = QTimer(self)
+        self.stats_timer.setInterval(0)
+        self.stats_timer.timeout.connect(self.process_stats_slice)
+        self.stats_refresh_timer = QTimer(self)
+        self.stats_refresh_timer.setSingleShot(True)
+        self.stats_refresh_timer.setInterval(STATS_REFRESH_MS)
+        self.stats_refresh_timer.timeout.connect(self.refresh_stats_panel)
 
         main_layout = QHBoxLayout(self)
         splitter = QSplitter(Qt.Horizontal)
@@ -207,19 +232,22 @@ class GalleryTab(QWidget):
         self.btn_open.clicked.connect(self.select_folder)
         self.btn_open.setStyleSheet("background-color: #00b894; color: white; font-weight: bold;")
         
+        self.setup_quality_sort()
+        
         # Filter (Stretch 1)
         self.inp_filter = QLineEdit()
-        self.inp_filter.setPlaceholderText("Filter tags/names...")
-        self.inp_filter.textChanged.connect(self.apply_filter)
+        self.inp_filter.setPlaceholderText("Filter tags/names...  (a, b | c, -d, \"exact tag\", pre*)")
+        self.inp_filter.textChanged.connect(self.filter_timer.start)
         
         self.btn_select_all = QPushButton("Select All")
+        self.btn_select_all.setToolTip("Select all shown (Ctrl+A)\nShift+Click: select range · Ctrl+I: invert · Ctrl+Shift+A: select only filter matches")
         self.btn_select_all.clicked.connect(self.select_all)
         self.btn_select_all.setMinimumWidth(80)
         
         # Undo/Redo Buttons (Text Based for Visibility)
         self.btn_undo = QPushButton("Undo")
         self.btn_undo.setToolTip("Undo (Ctrl+Z)")
-        self.btn_undo.clicked.connect(self.undo_stack.undo)
+        self.btn_undo.clicked.connect(self.undo)
         self.btn_undo.setEnabled(False) 
         self.btn_undo.setMinimumWidth(50)
         
@@ -229,15 +257,23 @@ class GalleryTab(QWidget):
         self.btn_redo.setEnabled(False)
         self.btn_redo.setMinimumWidth(50)
 
-        self.undo_stack.canUndoChanged.connect(self.btn_undo.setEnabled)
+        self.undo_stack.indexChanged.connect(self.on_undo_index_changed)
         self.undo_stack.canRedoChanged.connect(self.btn_redo.setEnabled)
         
+        self.lbl_undo_mem = QLabel("")
+        self.lbl_undo_mem.setStyleSheet("color: #888; font-size: 10px;")
+        
         self.btn_sanitize = QPushButton("Sanitize")
         self.btn_sanitize.setToolTip("Convert special characters (ä->a)")
         self.btn_sanitize.clicked.connect(self.sanitize_selection)
         self.btn_sanitize.setStyleSheet("background-color: #e17055; color: white;")
         self.btn_sanitize.setMinimumWidth(70)
 
+        self.btn_find_replace = QPushButton("Find/Replace")
+        self.btn_find_replace.setToolTip("Find/replace across caption files (Ctrl+H)")
+        self.btn_find_replace.clicked.connect(self.open_find_replace)
+        self.btn_find_replace.setMinimumWidth(90)
+
         self.btn_save_all = QPushButton("💾 Save")
         self.btn_save_all.clicked.connect(self.save_all)
         self.btn_save_all.setStyleSheet("background-color: #0984e3; color: white; font-weight: bold;")
@@ -249,11 +285,16 @@ class GalleryTab(QWidget):
 
         # Add to Layout with stretch
         toolbar.addWidget(self.btn_open)
+        toolbar.addWidget(self.combo_sort)
+        toolbar.addWidget(self.combo_quality)
+        toolbar.addWidget(self.lbl_quality)
         toolbar.addWidget(self.inp_filter, 1) # Give filter max space
         toolbar.addWidget(self.btn_select_all)
         toolbar.addWidget(self.btn_undo)
         toolbar.addWidget(self.btn_redo)
+        toolbar.addWidget(self.lbl_undo_mem)
         toolbar.addWidget(self.btn_sanitize)
+        toolbar.addWidget(self.btn_find_replace)
         toolbar.addWidget(self.btn_save_all)
         toolbar.addWidget(self.btn_dataset)
         left_layout.addLayout(toolbar)
@@ -264,6 +305,9 @@ class GalleryTab(QWidget):
         self.grid_layout = QGridLayout(self.grid_container)
         self.grid_layout.setAlignment(Qt.AlignTop | Qt.AlignLeft)
         self.scroll.setWidget(self.grid_container)
+        self.scroll.verticalScrollBar().valueChanged.connect(self.refresh_visible_cards)
+        # The grid was laid out anew (load, filter, sort, resize)
+        self.scroll.verticalScrollBar().rangeChanged.connect(self.refresh_visible_cards)
         left_layout.addWidget(self.scroll)
 
         # RIGHT PANEL (INSPECTOR)
@@ -289,9 +333,59 @@ class GalleryTab(QWidget):
         self.btn_auto_tag.clicked.connect(self.run_auto_tagger)
         self.btn_auto_tag.setStyleSheet("background-color: #6c5ce7; color: white; font-weight: bold; padding: 6px;")
         lyt_auto.addWidget(self.btn_auto_tag)
+        self.btn_int8_report = QPushButton("📊 Int8 Agreement Report")
+        self.btn_int8_report.setToolTip("Compare the int8 tagger against fp32 on a sample of the selected images")
+        self.btn_int8_report.clicked.connect(self.run_int8_report)
+        lyt_auto.addWidget(self.btn_int8_report)
         right_layout.addWidget(grp_auto)
 
-        # 3. Quick Tags
+        # 3. Tag Normalization
+        grp_norm = QGroupBox("🧹 Tag Normalization")
+        lyt_norm = QVBoxLayout(grp_norm)
+        self.btn_normalize = QPushButton("Normalize Selected")
+        self.btn_normalize.setToolTip("Lowercase, dedupe, aliases, implied tags and ordering (rules in Settings)")
+        self.btn_normalize.clicked.connect(self.normalize_selection)
+        lyt_norm.addWidget(self.btn_normalize)
+        self.btn_normalize_folder = QPushButton("Normalize Whole Folder...")
+        self.btn_normalize_folder.setToolTip("Rewrite every caption file in the current folder")
+        self.btn_normalize_folder.clicked.connect(self.normalize_folder)
+        lyt_norm.addWidget(self.btn_normalize_folder)
+        right_layout.addWidget(grp_norm)
+
+        # 4. Tag Statistics
+        grp_stats = QGroupBox("📊 Tag Statistics")
+        lyt_stats = QVBoxLayout(grp_stats)
+        stats_opts = QHBoxLayout()
+        self.combo_stats_view = QComboBox()
+        self.combo_stats_view.addItem("Top Tags", "top")
+        self.combo_stats_view.addItem("Rare Tags", "rare")
+        self.combo_stats_view.addItem("Tag Pairs", "pairs")
+        self.combo_stats_view.currentIndexChanged.connect(self.refresh_stats_panel)
+        self.inp_stats_filter = QLineEdit()
+        self.inp_stats_filter.setPlaceholderText("Contains...")
+        self.inp_stats_filter.textChanged.connect(self.stats_refresh_timer.start)
+        stats_opts.addWidget(self.combo_stats_view)
+        stats_opts.addWidget(self.inp_stats_filter, 1)
+        lyt_stats.addLayout(stats_opts)
+        self.table_stats = QTableWidget()
+        self.table_stats.setColumnCount(3)
+        self.table_stats.setHorizontalHeaderLabels(["Tag", "Images", "%"])
+        self.table_stats.horizontalHeader().setSectionResizeMode(0, QHeaderView.Stretch)
+        self.table_stats.horizontalHeader().setSectionResizeMode(1, QHeaderView.ResizeToContents)
+        self.table_stats.horizontalHeader().setSectionResizeMode(2, QHeaderView.ResizeToContents)
+        self.table_stats.verticalHeader().setVisible(False)
+        self.table_stats.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.table_stats.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.table_stats.setFixedHeight(220)
+        self.table_stats.setToolTip("Double-click to filter the grid by this tag")
+        self.table_stats.itemDoubleClicked.connect(self.filter_by_stats_row)
+        lyt_stats.addWidget(self.table_stats)
+        self.lbl_stats = QLabel("No folder loaded")
+        self.lbl_stats.setStyleSheet("color: #888; font-size: 10px;")
+        lyt_stats.addWidget(self.lbl_stats)
+        right_layout.addWidget(grp_stats)
+
+        # 5. Quick Tags
         right_layout.addSpacing(10)
         right_layout.addWidget(QLabel("<b>Quick Tags (Presets)</b>"))
         
@@ -331,77 +425,204 @@ class GalleryTab(QWidget):
         
         self.setup_hotkeys()
         self.pending_tag_updates = {}
+        self.pending_tag_old = {}
         self.total_tag_jobs = 0
         self.auto_tag_settings = {}
 
     def setup_hotkeys(self):
         QShortcut(QKeySequence("Ctrl+A"), self).activated.connect(self.select_all)
+        QShortcut(QKeySequence("Ctrl+I"), self).activated.connect(self.invert_selection)
+        QShortcut(QKeySequence("Ctrl+Shift+A"), self).activated.connect(self.select_filtered)
         QShortcut(QKeySequence("Ctrl+S"), self).activated.connect(self.save_all)
         QShortcut(QKeySequence("Del"), self).activated.connect(self.delete_text_selection)
-        QShortcut(QKeySequence("Ctrl+Z"), self).activated.connect(self.undo_stack.undo)
+        QShortcut(QKeySequence("Ctrl+Z"), self).activated.connect(self.undo)
         QShortcut(QKeySequence("Ctrl+Y"), self).activated.connect(self.undo_stack.redo)
         QShortcut(QKeySequence("Ctrl+Shift+Z"), self).activated.connect(self.undo_stack.redo)
         QShortcut(QKeySequence("Ctrl+F"), self).activated.connect(self.inp_filter.setFocus)
+        QShortcut(QKeySequence("Ctrl+H"), self).activated.connect(self.open_find_replace)
+
+    # --- UNDO HISTORY ---
+    def undo(self):
+        # Entries below the floor were pruned to fit the memory cap
+        if self.undo_stack.index() > self.undo_floor:
+            self.undo_stack.undo()
+
+    def on_undo_index_changed(self, index):
+        total, self.undo_floor = enforce_undo_budget(self.undo_stack)
+        self.btn_undo.setEnabled(self.undo_stack.index() > self.undo_floor)
+        steps = self.undo_stack.count() - self.undo_floor
+        used = f"{total / (1024 * 1024):.1f} MB" if total >= 1024 * 1024 else f"{total / 1024:.0f} KB"
+        self.lbl_undo_mem.setText(f"{steps} steps · {used}" if steps else "")
+        self.lbl_undo_mem.setToolTip(
+            f"Undo history: {steps} steps using {used} "
+            f"of {undo_budget_bytes() / (1024 * 1024):.0f} MB (oldest steps are dropped first)"
+        )
 
     # --- FILTER LOGIC ---
-    def apply_filter(self, text):
-        search = text.lower().strip()
+    def apply_filter(self):
+        matches = self.tag_index.search(self.inp_filter.text())
+        mode = self.combo_quality.currentData()
+        self.grid_container.setUpdatesEnabled(False)
         for path, card in self.image_cards.items():
-            # Filter by Filename OR Caption content
-            match = (search in os.path.basename(path).lower()) or \
-                    (search in card.txt_caption.toPlainText().lower())
-            
-            if not search: match = True
-            card.setVisible(match)
+            visible = (matches is None or path in matches) and quality.matches(self.quality.get(path), mode)
+            # Only touch cards whose state actually flips
+            if card.isHidden() == visible:
+                card.setVisible(visible)
+        self.grid_container.setUpdatesEnabled(True)
+        QTimer.singleShot(0, self.refresh_visible_cards)
+
+    # --- CAPTION STORE SYNC ---
+    def on_store_changed(self, paths):
+        store = self.store
+        cards = self.image_cards
+        self.stats_pending.update(paths)
+        if not self.stats_timer.isActive():
+            self.stats_timer.start()
+        for path in paths:
+            self.tag_index.update(path, store.text(path))
+            card = cards.get(path)
+            if card is not None:
+                card.stale = True
+        self.refresh_visible_cards()
+        if self.active_card and self.tag_editor.tags != store.tags(self.active_card.path):
+            self.tag_editor.set_tags(store.text(self.active_card.path))
+
+    def refresh_visible_cards(self):
+        """
+        Pushes store text into stale cards inside the viewport (building their editors on first
+        sight); the rest catch up when scrolled to. Only the grid rows under the viewport are visited.
+        """
+        layout = self.grid_layout
+        rows = layout.rowCount()
+        if self.grid_container.height() < layout.sizeHint().height():
+            # Cards were just added and the rows are still squeezed into the old height;
+            # rangeChanged calls back once the grid has grown
+            return
+        top = self.scroll.verticalScrollBar().value()
+        view = self.scroll.viewport().rect().translated(0, top)
+        # Rows only grow downwards (filtered-out rows collapse): bisect to the first one reaching the view
+        lo, hi = 0, rows
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if layout.cellRect(mid, 0).bottom() < view.top():
+                lo = mid + 1
+            else:
+                hi = mid
+        for row in range(lo, rows):
+            if layout.cellRect(row, 0).top() > view.bottom():
+                break
+            for col in range(GRID_COLS):
+                item = layout.itemAtPosition(row, col)
+                card = item.widget() if item else None
+                if isinstance(card, ImageCard) and card.stale and not card.isHidden():
+                    card.set_text(self.store.text(card.path))
+
+    # --- TAG STATISTICS ---
+    def process_stats_slice(self):
+        deadline = time.perf_counter() + STATS_SLICE_MS / 1000
+        pending = self.stats_pending
+        stats = self.tag_stats
+        text = self.store.text
+        while pending and time.perf_counter() < deadline:
+            for _ in range(min(64, len(pending))):
+                path = pending.pop()
+                if path in self.store:
+                    stats.update(path, text(path))
+                else:
+                    stats.remove(path)
+        if pending:
+            self.lbl_stats.setText(f"Indexing... {len(stats):,} / {len(self.store):,} images")
+        else:
+            self.stats_timer.stop()
+            self.stats_refresh_timer.start()
+
+    def refresh_stats_panel(self):
+        stats = self.tag_stats
+        view = self.combo_stats_view.currentData()
+        contains = self.inp_stats_filter.text().strip().lower()
+        total = max(1, len(self.store))
+        if view == "pairs":
+            rows = [(f"{a}  +  {b}", (a, b), c) for (a, b), c in stats.top_pairs(STATS_ROWS, contains)]
+        elif view == "rare":
+            rows = [(t, (t,), c) for t, c in stats.rare(STATS_ROWS, contains)]
+        else:
+            rows = [(t, (t,), c) for t, c in stats.top(STATS_ROWS, contains)]
+
+        self.table_stats.setUpdatesEnabled(False)
+        self.table_stats.setRowCount(len(rows))
+        for i, (label, tags, count) in enumerate(rows):
+            item = QTableWidgetItem(label)
+            item.setData(Qt.UserRole, tags)
+            self.table_stats.setItem(i, 0, item)
+            self.table_stats.setItem(i, 1, QTableWidgetItem(f"{count:,}"))
+            self.table_stats.setItem(i, 2, QTableWidgetItem(f"{100 * count / total:.1f}"))
+        self.table_stats.setUpdatesEnabled(True)
+        if not self.stats_pending:
+            self.lbl_stats.setText(f"{len(self.store):,} images · {len(stats.counts):,} tags · {len(stats.pairs):,} pairs")
+
+    def filter_by_stats_row(self, item):
+        tags = self.table_stats.item(item.row(), 0).data(Qt.UserRole)
+        self.inp_filter.setText(", ".join(f'"{t}"' for t in tags))
+
+    def on_card_edited(self, card):
+        self.store.set(card.path, card.txt_caption.toPlainText())
+
+    # --- SELECTION ---
+    @property
+    def selected_paths(self):
+        return self.selection.selected
+
+    def visible_paths(self):
+        return [p for p, c in self.image_cards.items() if not c.isHidden()]
 
     def select_all(self):
         """Modified to respect Filter (Visibility)"""
-        # Get visible cards only
-        visible_cards = [c for c in self.image_cards.values() if not c.isHidden()]
-        
-        if not visible_cards: return
-
         # If all visible are selected, deselect all visible. Otherwise select all visible.
-        all_vis_selected = all(c.is_selected for c in visible_cards)
-        target = not all_vis_selected
-        
-        for card in visible_cards:
-            card.toggle_selection(target)
+        self.selection.toggle_all(self.visible_paths())
+
+    def invert_selection(self):
+        self.selection.invert(self.visible_paths())
+
+    def select_filtered(self):
+        self.selection.select_only(self.visible_paths())
+
+    def on_card_clicked(self, path, shift):
+        if shift:
+            self.selection.select_range(path, lambda p: not self.image_cards[p].isHidden())
+        else:
+            self.selection.toggle(path)
 
     # --- TAG EDITOR SYNC ---
-    def on_card_selection(self, path, is_selected):
-        if is_selected:
-            self.selected_paths.add(path)
+    def on_selection_changed(self, added, removed):
+        restyle_cards(self.grid_container, self.image_cards, added, removed)
+        if added:
+            path = self.selection.current
             self.image_selected.emit(path)
             self.active_card = self.image_cards[path]
-            self.tag_editor.set_tags(self.active_card.txt_caption.toPlainText())
-        else:
-            self.selected_paths.discard(path)
-            # If deselecting active card, verify if we should clear editor or switch
-            if self.active_card and self.active_card.path == path:
-                # Pick another selected card if available, else clear
-                if self.selected_paths:
-                    next_path = list(self.selected_paths)[-1]
-                    self.active_card = self.image_cards[next_path]
-                    self.tag_editor.set_tags(self.active_card.txt_caption.toPlainText())
-                else:
-                    self.active_card = None
-                    self.tag_editor.set_tags("")
+            self.tag_editor.set_tags(self.store.text(path))
+        elif self.active_card and self.active_card.path in removed:
+            # Pick another selected card if available, else clear
+            if self.selected_paths:
+                next_path = next(iter(self.selected_paths))
+                self.active_card = self.image_cards[next_path]
+                self.tag_editor.set_tags(self.store.text(next_path))
+            else:
+                self.active_card = None
+                self.tag_editor.set_tags("")
 
     def sync_tags_from_inspector(self, new_text):
         if self.active_card:
-            old_text = self.active_card.txt_caption.toPlainText()
+            path = self.active_card.path
+            old_text = self.store.text(path)
             if old_text != new_text:
-                self.active_card.txt_caption.setPlainText(new_text)
-                cmd = UpdateCaptionCommand(self.active_card, old_text, new_text)
+                cmd = UpdateCaptionCommand(self.store, path, old_text, new_text)
                 self.undo_stack.push(cmd)
 
     def handle_manual_text_change(self, path, old, new):
-        if path in self.image_cards:
-            cmd = UpdateCaptionCommand(self.image_cards[path], old, new)
+        if path in self.store:
+            # The store already holds `new` from live typing, redo on push is a no-op
+            cmd = UpdateCaptionCommand(self.store, path, old, new)
             self.undo_stack.push(cmd)
-            if self.active_card and self.active_card.path == path:
-                self.tag_editor.set_tags(new)
 
     # --- AUTO TAGGER ---
     def run_auto_tagger(self):
@@ -410,22 +631,33 @@ class GalleryTab(QWidget):
             return
 
         dlg = AutoTagDialog(self)
+        dlg.chk_int8.setChecked(self.tagger.use_int8)
+        dlg.combo_model.setCurrentIndex(dlg.combo_model.findData(self.tagger.model_name))
+        if self.tagger.ensemble:
+            dlg.combo_ensemble.setCurrentIndex(dlg.combo_ensemble.findData(self.tagger.ensemble[0]))
         if dlg.exec():
             self.auto_tag_settings = dlg.get_settings()
+            self.tagger.set_int8(self.auto_tag_settings['int8'])
+            self.tagger.set_models(self.auto_tag_settings['model'], self.auto_tag_settings['ensemble'])
             self.btn_auto_tag.setText("⏳ Tagging...")
             self.btn_auto_tag.setEnabled(False)
             self.pending_tag_updates = {}
-            self.total_tag_jobs = len(self.selected_paths)
+            self.pending_tag_old = {}
+            paths = [p for p in self.selected_paths if p in self.store]
+            self.total_tag_jobs = len(paths)
 
-            for path in self.selected_paths:
-                if path in self.image_cards:
-                    card = self.image_cards[path]
-                    worker = TaggerWorker(self.tagger, card, self.auto_tag_settings)
-                    worker.signals.finished.connect(self.on_tagger_finished)
-                    self.thread_pool.start(worker)
+            worker = TaggerWorker(self.tagger, paths, self.auto_tag_settings)
+            worker.signals.finished.connect(self.on_tagger_finished)
+            self.thread_pool.start(worker)
 
-    def on_tagger_finished(self, card, tags):
-        current_text = card.txt_caption.toPlainText().strip()
+    def on_tagger_finished(self, path, tags):
+        if path not in self.store:
+            # Folder changed while tagging
+            self.total_tag_jobs -= 1
+            if self.total_tag_jobs <= len(self.pending_tag_updates):
+                self.finalize_auto_tagging()
+            return
+        current_text = self.store.text(path).strip()
         settings = self.auto_tag_settings
         
         all_tags = settings['prepend'] + tags + settings['append']
@@ -442,25 +674,60 @@ class GalleryTab(QWidget):
                 final_text = ", ".join(all_tags)
         
         final_text = final_text.replace(", ,", ",").replace(" , ", ", ").strip(", ")
+        if tag_normalizer.normalize_options()["after_autotag"]:
+            final_text = tag_normalizer.get_normalizer().normalize(final_text)
 
-        self.pending_tag_updates[card] = final_text
-        card.txt_caption.setPlainText(final_text)
-        
-        if self.active_card == card:
-            self.tag_editor.set_tags(final_text)
+        # Show results live, the undo entry is pushed once the batch is done
+        self.pending_tag_old.setdefault(path, self.store.text(path))
+        self.pending_tag_updates[path] = final_text
+        self.store.set(path, final_text)
 
         if len(self.pending_tag_updates) >= self.total_tag_jobs:
             self.finalize_auto_tagging()
 
     def finalize_auto_tagging(self):
-        cards = list(self.pending_tag_updates.keys())
+        paths = list(self.pending_tag_updates.keys())
         new_texts = list(self.pending_tag_updates.values())
-        cmd = BatchUpdateCommand(cards, new_texts, "Auto Tag (WD14)")
-        self.undo_stack.push(cmd)
+        old_texts = [self.pending_tag_old[p] for p in paths]
+        if paths:
+            cmd = BatchUpdateCommand(self.store, paths, new_texts, "Auto Tag (WD14)", old_texts=old_texts)
+            self.undo_stack.push(cmd)
+        self.pending_tag_updates = {}
+        self.pending_tag_old = {}
         self.btn_auto_tag.setText("✨ Auto Tag Selected...")
         self.btn_auto_tag.setEnabled(True)
         self.pending_tag_updates = {}
 
+    def run_int8_report(self):
+        if not self.selected_paths:
+            QMessageBox.warning(self, "No Selection", "Select a sample of images to compare.")
+            return
+
+        sample = sorted(self.selected_paths)[:INT8_REPORT_SAMPLE]
+        self.btn_int8_report.setText("⏳ Comparing...")
+        self.btn_int8_report.setEnabled(False)
+        worker = Int8ReportWorker(sample, self.tagger.model_name)
+        worker.signals.finished.connect(self.on_int8_report)
+        self.thread_pool.start(worker)
+
+    def on_int8_report(self, report):
+        self.btn_int8_report.setText("📊 Int8 Agreement Report")
+        self.btn_int8_report.setEnabled(True)
+        if not report:
+            QMessageBox.critical(self, "Error", "Could not build the int8 report (see console).")
+            return
+
+        QMessageBox.information(self, "Int8 vs FP32", (
+            f"Model: {report['model']}\n"
+            f"Images compared: {report['images']}\n\n"
+            f"Top-{report['top_k']} overlap: {report['top_k_overlap']:.1%} (worst {report['min_top_k_overlap']:.1%})\n"
+            f"Tag agreement @ {report['threshold']:.2f}: {report['tag_jaccard']:.1%} (Jaccard)\n"
+            f"Max probability drift: {report['max_prob_diff']:.3f}\n\n"
+            f"FP32: {report['fp32_ms']:.0f} ms/image\n"
+            f"Int8: {report['int8_ms']:.0f} ms/image\n"
+            f"Speedup: {report['speedup']:.2f}x"
+        ))
+
     # --- STANDARD LOGIC ---
     def select_folder(self):
         folder = QFileDialog.getExistingDirectory(self, "Select Image Folder")
@@ -470,64 +737,176 @@ class GalleryTab(QWidget):
 
     def load_grid(self):
         self.undo_stack.clear()
+        self.on_undo_index_changed(0)
         for i in reversed(range(self.grid_layout.count())): 
             self.grid_layout.itemAt(i).widget().setParent(None)
         self.image_cards.clear()
-        self.selected_paths.clear()
+        self.cancel_quality_scan()
+        self.selection.set_items([])
+        self.tag_stats.clear()
+        self.stats_pending.clear()
+        self.active_card = None
+        self.tag_editor.set_tags("")
+        self.tag_index.clear()
+
+        loading = LoadingLabel()
+        self.grid_layout.addWidget(loading, 0, 0, 1, GRID_COLS)
+        worker = CatalogLoadWorker(self.current_folder, GALLERY_EXTS, self.combo_sort.currentData())
+        worker.signals.progress.connect(loading.set_progress)
+        worker.signals.finished.connect(self.on_grid_loaded)
+        worker.signals.failed.connect(self.on_grid_load_failed)
+        # Ahead of thumbnails still queued for the previous folder
+        self.thread_pool.start(worker, 1)
+
+    def on_grid_loaded(self, folder, entries):
+        # Another folder was opened meanwhile
+        if folder != self.current_folder: return
+        for i in reversed(range(self.grid_layout.count())): 
+            self.grid_layout.itemAt(i).widget().setParent(None)
 
-        exts = ('.jpg', '.jpeg', '.png', '.webp')
-        try:
-            files = [f for f in os.listdir(self.current_folder) if f.lower().endswith(exts)]
-        except Exception as e:
-            QMessageBox.critical(self, "Error", f"Failed to read directory: {e}")
-            return
+        paths = [e.path for e in entries]
+        self.reset_quality(entries)
+        self.selection.set_items(paths)
+        self.store.load(paths, {e.path: e.caption for e in entries})
 
-        cols = 4
-        for i, f in enumerate(files):
-            path = os.path.join(self.current_folder, f)
+        for i, path in enumerate(paths):
             card = ImageCard(path)
-            card.selection_changed.connect(self.on_card_selection)
+            card.clicked.connect(self.on_card_clicked)
             card.undo_req.connect(self.handle_manual_text_change)
-            self.grid_layout.addWidget(card, i // cols, i % cols)
+            card.edited.connect(lambda c=card: self.on_card_edited(c))
+            self.grid_layout.addWidget(card, i // GRID_COLS, i % GRID_COLS)
             self.image_cards[path] = card
+            if path in self.quality:
+                card.setToolTip(quality.describe(self.quality[path]))
             worker = ThumbnailWorker(path, (250, 200))
             worker.signals.loaded.connect(card.set_image)
             self.thread_pool.start(worker)
 
+        if self.inp_filter.text().strip() or self.combo_quality.currentData():
+            self.apply_filter()
+        # Editors for the first screen, once the grid is laid out
+        QTimer.singleShot(0, self.refresh_visible_cards)
+        self.analyze_quality_if_needed()
+
+    def on_grid_load_failed(self, folder, message):
+        if folder != self.current_folder: return
+        for i in reversed(range(self.grid_layout.count())): 
+            self.grid_layout.itemAt(i).widget().setParent(None)
+        QMessageBox.critical(self, "Error", f"Failed to read directory: {message}")
+
+    def quality_cards(self):
+        return self.image_cards
+
+    def sort_source(self):
+        return self.current_folder, GALLERY_EXTS
+
     def delete_text_selection(self):
         if self.tag_editor.inp_add.hasFocus() or self.inp_new_tag.hasFocus() or self.inp_filter.hasFocus(): return
         focus_widget = QApplication.focusWidget()
         if isinstance(focus_widget, QTextEdit): return
 
         if self.selected_paths:
-            cards = []
-            new_texts = []
-            for path in self.selected_paths:
-                if path in self.image_cards:
-                    cards.append(self.image_cards[path])
-                    new_texts.append("")
-            
-            if cards:
-                cmd = BatchUpdateCommand(cards, new_texts, "Clear Captions")
+            paths = [p for p in self.selected_paths if p in self.store]
+            if paths:
+                cmd = BatchUpdateCommand(self.store, paths, [""] * len(paths), "Clear Captions")
                 self.undo_stack.push(cmd)
 
     def sanitize_selection(self):
         if not self.selected_paths: return
-        cards = []
+        paths = []
         new_texts = []
         for path in self.selected_paths:
-            if path in self.image_cards:
-                card = self.image_cards[path]
-                org = card.txt_caption.toPlainText()
+            if path in self.store:
+                org = self.store.text(path)
                 clean = unicodedata.normalize('NFKD', org).encode('ascii', 'ignore').decode('ascii')
                 if org != clean:
-                    cards.append(card)
+                    paths.append(path)
                     new_texts.append(clean)
         
-        if cards:
-            cmd = BatchUpdateCommand(cards, new_texts, "Sanitize Text")
+        if paths:
+            cmd = BatchUpdateCommand(self.store, paths, new_texts, "Sanitize Text")
             self.undo_stack.push(cmd)
-            QMessageBox.information(self, "Sanitized", f"Cleaned {len(cards)} captions.")
+            QMessageBox.information(self, "Sanitized", f"Cleaned {len(paths)} captions.")
+
+    def save_before_disk_rewrite(self, action):
+        """Disk-wide rewrites read the sidecars, so unsaved edits are saved first. Returns False if cancelled."""
+        if rewrite_pool().activeThreadCount():
+            QMessageBox.information(self, "Busy", "An undo/redo of caption files is still being written, try again in a moment.")
+            return False
+        dirty = self.store.dirty_paths()
+        if dirty:
+            reply = QMessageBox.question(self, "Unsaved Captions",
+                                         f"{action} works on the caption files on disk.\nSave {len(dirty)} unsaved captions first?",
+                                         QMessageBox.Yes | QMessageBox.Cancel)
+            if reply != QMessageBox.Yes: return False
+            self.store.save_dirty()
+        CAPTION_WRITER.flush()
+        return True
+
+    def open_find_replace(self):
+        if not self.save_before_disk_rewrite("Find/Replace"): return
+        dlg = FindReplaceDialog([self.current_folder] if self.current_folder else [], self)
+        dlg.applied.connect(self.on_find_replace_applied)
+        dlg.exec()
+
+    def on_find_replace_applied(self, changes, description):
+        # Already on disk, the command only needs to know how to revert it
+        self.undo_stack.push(CaptionFilesCommand(changes, description, on_written=self.on_caption_files_written,
+                                                 on_failed=self.on_caption_files_failed,
+                                                 on_started=self.caption_files_snapshot))
+        self.on_caption_files_written({path: new for path, _, new in changes})
+
+    def caption_files_snapshot(self, txt_paths):
+        """{image path: store text} of the loaded captions an undo/redo is about to rewrite."""
+        by_caption = {caption_path(p): p for p in self.store.paths()}
+        return {by_caption[t]: self.store.text(by_caption[t]) for t in txt_paths if t in by_caption}
+
+    def on_caption_files_written(self, texts, started=None):
+        by_caption = {caption_path(p): p for p in self.store.paths()}
+        loaded = {by_caption[t]: text for t, text in texts.items() if t in by_caption}
+        if started is not None:
+            # Edited (or undone) in the store while the files were written: the newer text stays
+            # and remains unsaved against what is now on disk
+            for path in [p for p in loaded if self.store.text(p) != started.get(p)]:
+                self.store.mark_saved(path, loaded.pop(path))
+        if loaded:
+            self.store.set_saved(loaded)
+
+    def on_caption_files_failed(self, description, message):
+        QMessageBox.critical(self, "Undo Failed",
+                             f"Could not rewrite the caption files for '{description}', nothing was changed.\n\n"
+                             f"{message}\n\nThis step was removed from the history.")
+
+    # --- TAG NORMALIZATION ---
+    def normalize_selection(self):
+        if not self.selected_paths:
+            QMessageBox.warning(self, "No Selection", "Select images in the grid first.")
+            return
+        normalizer = tag_normalizer.get_normalizer()
+        paths = []
+        new_texts = []
+        for path in self.selected_paths:
+            if path in self.store:
+                org = self.store.text(path)
+                clean = normalizer.normalize(org)
+                if org != clean:
+                    paths.append(path)
+                    new_texts.append(clean)
+
+        if paths:
+            cmd = BatchUpdateCommand(self.store, paths, new_texts, "Normalize Tags")
+            self.undo_stack.push(cmd)
+        QMessageBox.information(self, "Normalized", f"Normalized {len(paths)} captions.")
+
+    def normalize_folder(self):
+        if not self.current_folder:
+            QMessageBox.warning(self, "No Folder", "Open a folder first.")
+            return
+        if not self.save_before_disk_rewrite("Normalizing a folder"): return
+        preset = ("Normalize Folder", tag_normalizer.get_normalizer(), tag_normalizer.rewrite)
+        dlg = FindReplaceDialog([self.current_folder], self, preset=preset)
+        dlg.applied.connect(self.on_find_replace_applied)
+        dlg.exec()
 
     def apply_tag_to_selection(self, item):
         tag = item.text()
@@ -535,39 +914,35 @@ class GalleryTab(QWidget):
             QMessageBox.warning(self, "No Selection", "Select images in the grid first.")
             return
 
-        cards = []
+        paths = []
         new_texts = []
+        prepend = self.rad_prepend.isChecked()
 
         for path in self.selected_paths:
-            card = self.image_cards.get(path)
-            if card:
-                current = card.txt_caption.toPlainText().strip()
+            if path in self.store:
+                current = self.store.text(path).strip()
                 new_t = ""
                 
                 if not current:
                     new_t = tag
                 else:
-                    tags = [t.strip() for t in current.split(',')]
-                    if tag in tags: continue # Skip if exists
+                    if tag in self.store.tags(path): continue # Skip if exists
                     
-                    if self.rad_prepend.isChecked():
+                    if prepend:
                         new_t = f"{tag}, {current}"
                     else:
                         new_t = f"{current}, {tag}"
                 
-                cards.append(card)
+                paths.append(path)
                 new_texts.append(new_t)
         
-        if cards:
-            cmd = BatchUpdateCommand(cards, new_texts, f"Add Tag: {tag}")
+        if paths:
+            cmd = BatchUpdateCommand(self.store, paths, new_texts, f"Add Tag: {tag}")
             self.undo_stack.push(cmd)
 
     def save_all(self):
-        count = 0
-        for card in self.image_cards.values():
-            card.save_text()
-            count += 1
-        QMessageBox.information(self, "Saved", f"Saved captions for {count} images.")
+        count = self.store.save_dirty()
+        QMessageBox.information(self, "Saved", f"Saved captions for {count} changed images.")
 
     def save_to_dataset(self):
         if not self.selected_paths:
@@ -580,9 +955,13 @@ class GalleryTab(QWidget):
         target_dir = os.path.join(dataset_root, name.strip())
         if not os.path.exists(target_dir): os.makedirs(target_dir)
             
+        for path in self.selected_paths:
+            if path in self.store: self.store.save(path)
+        # The copy below reads the sidecars from disk
+        CAPTION_WRITER.flush()
+
         count = 0
         for path in self.selected_paths:
-            if path in self.image_cards: self.image_cards[path].save_text()
             try:
                 shutil.copy2(path, target_dir)
                 txt_path = os.path.splitext(path)[0] + ".txt"
@@ -7,12 +7,100 @@ from PySide6.QtWidgets import (
     QSplitter, QFileDialog, QMessageBox, QGroupBox, QListWidget,
     QAbstractItemView, QFrame
 )
-from PySide6.QtCore import Qt, Signal
+from collections import OrderedDict
+from PySide6.QtCore import Qt, Signal, QObject, QRunnable, QThreadPool, QTimer, Slot
 from PySide6.QtGui import QPixmap
-from core.image_utils import load_thumbnail
+from core.image_utils import load_thumbnail_image
+from core.widgets import CatalogLoadWorker
 
 # Common tags to map to the "Quick Editor"
 PROMPT_KEYS = ["parameters", "UserComment", "ImageDescription", "Description", "Comment"]
+PREVIEW_SIZE = (500, 500)
+# Gallery selection bursts (Select All) collapse into one load of the last path
+REQUEST_COALESCE_MS = 50
+METADATA_CACHE_ITEMS = 32
+
+# --- FORMAT SPECIFIC LOADERS ---
+def read_png_metadata(path):
+    with Image.open(path) as img:
+        img.load() # Force load to get info
+        png_info = dict(img.info)
+    
+    rows, prompt = [], ""
+    for key, value in png_info.items():
+        # Filter out binary or unreadable keys if necessary
+        str_val = str(value)
+        
+        # Populate Prompt Box if it matches
+        if key in PROMPT_KEYS:
+            prompt = str_val
+        rows.append((key, str_val, None))
+    return {"is_png": True, "png_info": png_info, "exif": {}, "rows": rows, "prompt": prompt}
+
+def read_jpg_metadata(path):
+    data = {"is_png": False, "png_info": {}, "exif": {}, "rows": [], "prompt": ""}
+    try:
+        exif_dict = piexif.load(path)
+    except:
+        return data # No EXIF or error reading it
+    data["exif"] = exif_dict
+
+    rows = data["rows"]
+    # Iterate over IFDs (0th, Exif, GPS, 1st)
+    for ifd in ("0th", "Exif", "GPS", "1st"):
+        if ifd in exif_dict:
+            for tag, value in exif_dict[ifd].items():
+                tag_name = piexif.TAGS[ifd].get(tag, {"name": str(tag)})["name"]
+                
+                # Decode Bytes
+                if isinstance(value, bytes):
+                    try:
+                        # Try generic decode
+                        str_val = value.decode('utf-8').strip('\x00')
+                        # Handle EXIF UserComment specifically (often has 'UNICODE' or 'ASCII' header)
+                        if tag_name == "UserComment":
+                            if value.startswith(b'UNICODE'):
+                                str_val = value[8:].decode('utf-16').strip('\x00')
+                            elif value.startswith(b'ASCII'):
+                                str_val = value[5:].decode('ascii').strip('\x00')
+                    except:
+                        str_val = "<Binary Data>"
+                else:
+                    str_val = str(value)
+
+                # Populate Prompt Box
+                if tag_name in PROMPT_KEYS:
+                    data["prompt"] = str_val
+
+                rows.append((f"{ifd} - {tag_name}", str_val, (ifd, tag)))
+    return data
+
+def read_metadata(path):
+    try:
+        if path.lower().endswith('.png'):
+            return read_png_metadata(path)
+        return read_jpg_metadata(path)
+    except Exception as e:
+        print(f"Metadata load error: {e}")
+        return {"is_png": path.lower().endswith('.png'), "png_info": {}, "exif": {}, "rows": [], "prompt": ""}
+
+# --- WORKER ---
+class MetadataSignals(QObject):
+    loaded = Signal(object)  # (token, path, mtime, QImage, metadata)
+
+class MetadataWorker(QRunnable):
+    def __init__(self, token, path, mtime):
+        super().__init__()
+        self.token = token
+        self.path = path
+        self.mtime = mtime
+        self.signals = MetadataSignals()
+
+    @Slot()
+    def run(self):
+        image = load_thumbnail_image(self.path, PREVIEW_SIZE)
+        data = read_metadata(self.path)
+        self.signals.loaded.emit((self.token, self.path, self.mtime, image, data))
 
 class MetadataTab(QWidget):
     def __init__(self):
@@ -22,6 +110,15 @@ class MetadataTab(QWidget):
         self.exif_dict = {}     # For JPG
         self.png_info = {}      # For PNG
         self.is_png = False
+        self.requested_path = None
+        self.load_token = 0
+        self.worker_running = False
+        self.cache = OrderedDict()  # (path, mtime) -> (QImage, metadata)
+        self.thread_pool = QThreadPool()
+        self.request_timer = QTimer(self)
+        self.request_timer.setSingleShot(True)
+        self.request_timer.setInterval(REQUEST_COALESCE_MS)
+        self.request_timer.timeout.connect(self.load_requested)
         
         layout = QHBoxLayout(self)
         splitter = QSplitter(Qt.Horizontal)
@@ -112,9 +209,20 @@ class MetadataTab(QWidget):
 
     def load_file_list(self):
         self.list_files.clear()
-        exts = ('.jpg', '.jpeg', '.png', '.webp', '.tiff')
-        files = [f for f in os.listdir(self.current_folder) if f.lower().endswith(exts)]
-        self.list_files.addItems(files)
+        worker = CatalogLoadWorker(self.current_folder, ('.jpg', '.jpeg', '.png', '.webp', '.tiff'))
+        worker.signals.finished.connect(self.on_file_list_loaded)
+        worker.signals.failed.connect(self.on_file_list_failed)
+        self.thread_pool.start(worker, 1)
+
+    def on_file_list_failed(self, folder, message):
+        if folder != self.current_folder: return
+        QMessageBox.critical(self, "Error", f"Failed to read folder: {message}")
+
+    def on_file_list_loaded(self, folder, entries):
+        # Another folder was opened meanwhile
+        if folder != self.current_folder: return
+        self.list_files.clear()
+        self.list_files.addItems([e.name for e in entries])
 
     def on_file_selected(self, item, prev):
         if not item: return
@@ -122,99 +230,85 @@ class MetadataTab(QWidget):
         self.load_image_data()
 
     def load_metadata(self, path):
-        # Slot for external signals (e.g. from Gallery)
+        # Slot for external signals (e.g. from Gallery). Select All fires this once per card,
+        # so only the latest path is kept and nothing is read while the tab is hidden.
+        self.requested_path = path
+        if self.isVisible():
+            self.request_timer.start()
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        if self.requested_path:
+            self.request_timer.start()
+
+    def load_requested(self):
+        path = self.requested_path
+        self.requested_path = None
+        if not path: return
         self.current_image_path = path
-        # Update list selection visually if possible
+        # Update list selection visually if possible, without re-triggering a load
         if self.current_folder and os.path.dirname(path) == self.current_folder:
             items = self.list_files.findItems(os.path.basename(path), Qt.MatchExactly)
-            if items: self.list_files.setCurrentItem(items[0])
-        else:
-            # If from different folder, just load data directly
-            self.load_image_data()
+            if items:
+                self.list_files.blockSignals(True)
+                self.list_files.setCurrentItem(items[0])
+                self.list_files.blockSignals(False)
+        self.load_image_data()
 
     def load_image_data(self):
-        if not self.current_image_path or not os.path.exists(self.current_image_path):
+        path = self.current_image_path
+        if not path or not os.path.exists(path):
+            return
+        self.load_token += 1
+        mtime = os.path.getmtime(path)
+        cached = self.cache.get((path, mtime))
+        if cached:
+            self.cache.move_to_end((path, mtime))
+            self.show_metadata(path, *cached)
             return
 
-        # 1. Load Preview
-        pix = load_thumbnail(self.current_image_path, (500, 500))
-        self.lbl_image.setPixmap(pix)
-        
-        # 2. Reset Data
-        self.table.setRowCount(0)
-        self.txt_prompt.clear()
-        self.exif_dict = {}
-        self.png_info = {}
-        self.is_png = self.current_image_path.lower().endswith('.png')
+        self.lbl_image.setPixmap(QPixmap())
+        self.lbl_image.setText("Loading...")
+        # One read at a time; when it returns, the latest request is started
+        if self.worker_running: return
+        self.worker_running = True
+        worker = MetadataWorker(self.load_token, path, mtime)
+        worker.signals.loaded.connect(self.on_metadata_loaded)
+        self.thread_pool.start(worker)
 
-        try:
-            if self.is_png:
-                self.load_png_metadata()
-            else:
-                self.load_jpg_metadata()
-        except Exception as e:
-            print(f"Metadata load error: {e}")
+    def on_metadata_loaded(self, result):
+        token, path, mtime, image, data = result
+        self.worker_running = False
+        self.cache[(path, mtime)] = (image, data)
+        while len(self.cache) > METADATA_CACHE_ITEMS:
+            self.cache.popitem(last=False)
+        if token == self.load_token:
+            self.show_metadata(path, image, data)
+        else:
+            # Selection moved on while reading
+            self.load_image_data()
 
-    # --- FORMAT SPECIFIC LOADERS ---
-    def load_png_metadata(self):
-        img = Image.open(self.current_image_path)
-        img.load() # Force load to get info
-        self.png_info = img.info
+    def show_metadata(self, path, image, data):
+        self.lbl_image.setPixmap(QPixmap.fromImage(image))
         
-        row = 0
-        for key, value in self.png_info.items():
-            # Filter out binary or unreadable keys if necessary
-            str_val = str(value)
-            
-            # Populate Prompt Box if it matches
-            if key in PROMPT_KEYS:
-                self.txt_prompt.setText(str_val)
-            
-            self.table.insertRow(row)
-            self.table.setItem(row, 0, QTableWidgetItem(key))
-            self.table.setItem(row, 1, QTableWidgetItem(str_val))
-            row += 1
+        # Copies: saving edits these in place, the cached originals must stay intact
+        self.exif_dict = {ifd: dict(v) if isinstance(v, dict) else v for ifd, v in data["exif"].items()}
+        self.png_info = dict(data["png_info"])
+        self.is_png = data["is_png"]
+        self.txt_prompt.setText(data["prompt"])
 
-    def load_jpg_metadata(self):
-        try:
-            self.exif_dict = piexif.load(self.current_image_path)
-        except:
-            return # No EXIF or error reading it
-
-        row = 0
-        # Iterate over IFDs (0th, Exif, GPS, 1st)
-        for ifd in ("0th", "Exif", "GPS", "1st"):
-            if ifd in self.exif_dict:
-                for tag, value in self.exif_dict[ifd].items():
-                    tag_name = piexif.TAGS[ifd].get(tag, {"name": str(tag)})["name"]
-                    
-                    # Decode Bytes
-                    if isinstance(value, bytes):
-                        try:
-                            # Try generic decode
-                            str_val = value.decode('utf-8').strip('\x00')
-                            # Handle EXIF UserComment specifically (often has 'UNICODE' or 'ASCII' header)
-                            if tag_name == "UserComment":
-                                if value.startswith(b'UNICODE'):
-                                    str_val = value[8:].decode('utf-16').strip('\x00')
-                                elif value.startswith(b'ASCII'):
-                                    str_val = value[5:].decode('ascii').strip('\x00')
-                        except:
-                            str_val = "<Binary Data>"
-                    else:
-                        str_val = str(value)
-
-                    # Populate Prompt Box
-                    if tag_name in PROMPT_KEYS:
-                        self.txt_prompt.setText(str_val)
-
-                    self.table.insertRow(row)
-                    # Store IFD and Tag ID in UserRole for saving later
-                    key_item = QTableWidgetItem(f"{ifd} - {tag_name}")
-                    key_item.setData(Qt.UserRole, (ifd, tag)) 
-                    self.table.setItem(row, 0, key_item)
-                    self.table.setItem(row, 1, QTableWidgetItem(str_val))
-                    row += 1
+        rows = data["rows"]
+        self.table.setUpdatesEnabled(False)
+        self.table.setRowCount(0)
+        self.table.setRowCount(len(rows))
+        for row, (key, str_val, tag_data) in enumerate(rows):
+            key_item = QTableWidgetItem(key)
+            if tag_data:
+                # Store IFD and Tag ID in UserRole for saving later
+                key_item.setData(Qt.UserRole, tag_data)
+            self.table.setItem(row, 0, key_item)
+            self.table.setItem(row, 1, QTableWidgetItem(str_val))
+        self.table.setUpdatesEnabled(True)
 
     # --- SAVING LOGIC ---
     def save_metadata(self):
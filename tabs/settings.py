@@ -3,10 +3,17 @@ import json
 from PySide6.QtWidgets import (
     QWidget, QVBoxLayout, QHBoxLayout, QPushButton, QLabel, 
     QComboBox, QGroupBox, QSpinBox, QDoubleSpinBox, QListWidget, 
-    QMessageBox, QApplication, QFormLayout, QScrollArea
+    QMessageBox, QApplication, QFormLayout, QScrollArea, QTableWidget,
+    QTableWidgetItem, QHeaderView, QAbstractItemView, QCheckBox, QLineEdit,
+    QFileDialog
 )
-from PySide6.QtCore import Qt
+from PySide6.QtCore import Qt, QTimer
 from qt_material import list_themes, apply_stylesheet
+from core.tagger import SESSION_CACHE, DEFAULT_CACHE_MB
+from core.model_manager import MODEL_MANAGER, DEFAULT_IDLE_MINUTES
+from core.undo import set_undo_budget, DEFAULT_UNDO_MB
+from core import tag_normalizer
+from core.tag_normalizer import DEFAULT_NORMALIZE, ORDER_MODES
 
 CONFIG_FILE = "config.json"
 TAG_FILE = "user_tags.txt"
@@ -16,13 +23,22 @@ DEFAULT_CONFIG = {
     "ai_max_tokens": 512,
     "ai_temperature": 0.7,
     "ai_top_p": 0.9,
-    "default_prompt_template": "Detailed Description"
+    "default_prompt_template": "Detailed Description",
+    "tagger_cache_mb": DEFAULT_CACHE_MB,
+    "idle_unload_minutes": dict(DEFAULT_IDLE_MINUTES),
+    "undo_memory_mb": DEFAULT_UNDO_MB,
+    "tag_normalization": dict(DEFAULT_NORMALIZE)
 }
 
 class SettingsTab(QWidget):
     def __init__(self):
         super().__init__()
         self.config = self.load_config()
+        SESSION_CACHE.set_budget(self.config.get("tagger_cache_mb", DEFAULT_CACHE_MB))
+        for key, minutes in self.config.get("idle_unload_minutes", DEFAULT_IDLE_MINUTES).items():
+            MODEL_MANAGER.set_idle_minutes(key, minutes)
+        set_undo_budget(self.config.get("undo_memory_mb", DEFAULT_UNDO_MB))
+        tag_normalizer.configure(self.config.get("tag_normalization", DEFAULT_NORMALIZE))
         
         layout = QVBoxLayout(self)
         
@@ -108,6 +124,156 @@ class SettingsTab(QWidget):
         lyt_tags.addLayout(btn_tag_box)
         main_layout.addWidget(grp_tags)
 
+        # --- 4. AUTO TAGGER ---
+        grp_tagger = QGroupBox("4. Auto Tagger (WD14)")
+        lyt_tagger = QFormLayout(grp_tagger)
+        
+        self.spin_tagger_cache = QSpinBox()
+        self.spin_tagger_cache.setRange(256, 65536)
+        self.spin_tagger_cache.setSingleStep(256)
+        self.spin_tagger_cache.setSuffix(" MB")
+        self.spin_tagger_cache.setValue(self.config.get("tagger_cache_mb", DEFAULT_CACHE_MB))
+        self.spin_tagger_cache.setToolTip("Loaded tagger models are kept in RAM up to this budget (least recently used are dropped first)")
+        
+        self.btn_save_tagger = QPushButton("Save Tagger Settings")
+        self.btn_save_tagger.clicked.connect(self.save_settings)
+        self.btn_save_tagger.setStyleSheet("background-color: #00b894; color: white;")
+        
+        lyt_tagger.addRow("Model Cache Budget:", self.spin_tagger_cache)
+        lyt_tagger.addRow("", self.btn_save_tagger)
+        main_layout.addWidget(grp_tagger)
+
+        # --- 5. MODEL MEMORY ---
+        grp_mem = QGroupBox("5. Model Memory (Idle Auto-Unload)")
+        lyt_mem = QVBoxLayout(grp_mem)
+        
+        form_idle = QFormLayout()
+        self.spin_idle = {}
+        idle_cfg = self.config.get("idle_unload_minutes", DEFAULT_IDLE_MINUTES)
+        for key, model in MODEL_MANAGER.models.items():
+            spin = QSpinBox()
+            spin.setRange(0, 1440)
+            spin.setSuffix(" min")
+            spin.setSpecialValueText("Never")
+            spin.setValue(idle_cfg.get(key, DEFAULT_IDLE_MINUTES.get(key, 0)))
+            self.spin_idle[key] = spin
+            form_idle.addRow(f"Unload {model.label} after:", spin)
+        lyt_mem.addLayout(form_idle)
+        
+        self.table_models = QTableWidget()
+        self.table_models.setColumnCount(4)
+        self.table_models.setHorizontalHeaderLabels(["Model", "Status", "Resident", "Idle"])
+        self.table_models.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        self.table_models.verticalHeader().setVisible(False)
+        self.table_models.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.table_models.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.table_models.setFixedHeight(120)
+        lyt_mem.addWidget(self.table_models)
+        
+        mem_btns = QHBoxLayout()
+        self.btn_unload_model = QPushButton("Unload Selected Now")
+        self.btn_unload_model.clicked.connect(self.unload_selected_model)
+        self.btn_unload_model.setStyleSheet("background-color: #636e72; color: white;")
+        self.btn_save_mem = QPushButton("Save Unload Policy")
+        self.btn_save_mem.clicked.connect(self.save_settings)
+        self.btn_save_mem.setStyleSheet("background-color: #00b894; color: white;")
+        mem_btns.addWidget(self.btn_unload_model)
+        mem_btns.addWidget(self.btn_save_mem)
+        lyt_mem.addLayout(mem_btns)
+        main_layout.addWidget(grp_mem)
+
+        # --- 6. UNDO HISTORY ---
+        grp_undo = QGroupBox("6. Undo History")
+        lyt_undo = QFormLayout(grp_undo)
+        
+        self.spin_undo_mb = QSpinBox()
+        self.spin_undo_mb.setRange(8, 4096)
+        self.spin_undo_mb.setSingleStep(16)
+        self.spin_undo_mb.setSuffix(" MB")
+        self.spin_undo_mb.setValue(self.config.get("undo_memory_mb", DEFAULT_UNDO_MB))
+        self.spin_undo_mb.setToolTip("Gallery undo steps are kept up to this much memory (oldest steps are dropped first)")
+        
+        self.btn_save_undo = QPushButton("Save Undo Settings")
+        self.btn_save_undo.clicked.connect(self.save_settings)
+        self.btn_save_undo.setStyleSheet("background-color: #00b894; color: white;")
+        
+        lyt_undo.addRow("Undo Memory Cap:", self.spin_undo_mb)
+        lyt_undo.addRow("", self.btn_save_undo)
+        main_layout.addWidget(grp_undo)
+
+        # --- 7. TAG NORMALIZATION ---
+        grp_norm = QGroupBox("7. Tag Normalization")
+        lyt_norm = QFormLayout(grp_norm)
+        norm_cfg = tag_normalizer.normalize_options()
+        
+        self.chk_norm = {}
+        for key, label in (("lowercase", "Lowercase tags"),
+                           ("underscores", "Underscores to spaces"),
+                           ("dedupe", "Remove duplicate tags"),
+                           ("aliases", "Apply alias table"),
+                           ("implications", "Prune implied tags")):
+            chk = QCheckBox(label)
+            chk.setChecked(norm_cfg[key])
+            self.chk_norm[key] = chk
+            lyt_norm.addRow("", chk)
+        
+        self.combo_norm_order = QComboBox()
+        for key, label in ORDER_MODES.items():
+            self.combo_norm_order.addItem(label, key)
+        self.combo_norm_order.setCurrentIndex(max(0, self.combo_norm_order.findData(norm_cfg["order"])))
+        
+        self.inp_norm_pin = QLineEdit(norm_cfg["pin_first"])
+        self.inp_norm_pin.setPlaceholderText("e.g. masterpiece, best quality, 1girl")
+        self.inp_norm_pin.setToolTip("These tags are moved to the front, in this order")
+        
+        self.inp_alias_csv = QLineEdit(norm_cfg["alias_csv"])
+        self.inp_alias_csv.setToolTip("CSV rows: alias,canonical  (e.g. solo female,1girl)")
+        btn_alias = QPushButton("...")
+        btn_alias.setFixedWidth(30)
+        btn_alias.clicked.connect(lambda: self.browse_csv(self.inp_alias_csv))
+        row_alias = QHBoxLayout()
+        row_alias.addWidget(self.inp_alias_csv)
+        row_alias.addWidget(btn_alias)
+        
+        self.inp_impl_csv = QLineEdit(norm_cfg["implication_csv"])
+        self.inp_impl_csv.setToolTip("CSV rows: tag,implied  (e.g. long hair,hair). The implied tag is removed when both are present")
+        btn_impl = QPushButton("...")
+        btn_impl.setFixedWidth(30)
+        btn_impl.clicked.connect(lambda: self.browse_csv(self.inp_impl_csv))
+        row_impl = QHBoxLayout()
+        row_impl.addWidget(self.inp_impl_csv)
+        row_impl.addWidget(btn_impl)
+        
+        self.chk_norm_autotag = QCheckBox("Normalize after Auto Tag (Gallery)")
+        self.chk_norm_autotag.setChecked(norm_cfg["after_autotag"])
+        self.chk_norm_caption = QCheckBox("Normalize after captioning (Auto Caption)")
+        self.chk_norm_caption.setChecked(norm_cfg["after_caption"])
+        self.chk_norm_caption.setToolTip("Only useful for tag-style output, prose captions are split on commas too")
+        
+        self.lbl_norm_tables = QLabel("")
+        self.lbl_norm_tables.setStyleSheet("color: #888;")
+        self.refresh_normalizer_label()
+        
+        self.btn_save_norm = QPushButton("Save Normalization Rules")
+        self.btn_save_norm.clicked.connect(self.save_settings)
+        self.btn_save_norm.setStyleSheet("background-color: #00b894; color: white;")
+        
+        lyt_norm.addRow("Tag Order:", self.combo_norm_order)
+        lyt_norm.addRow("Always First:", self.inp_norm_pin)
+        lyt_norm.addRow("Alias Table:", row_alias)
+        lyt_norm.addRow("Implication Table:", row_impl)
+        lyt_norm.addRow("", self.lbl_norm_tables)
+        lyt_norm.addRow("", self.chk_norm_autotag)
+        lyt_norm.addRow("", self.chk_norm_caption)
+        lyt_norm.addRow("", self.btn_save_norm)
+        main_layout.addWidget(grp_norm)
+        
+        self.mem_timer = QTimer(self)
+        self.mem_timer.timeout.connect(self.refresh_model_table)
+        self.mem_timer.start(2000)
+        MODEL_MANAGER.status_changed.connect(self.refresh_model_table)
+        self.refresh_model_table()
+
         layout.addWidget(scroll)
 
     # --- LOGIC ---
@@ -125,12 +291,67 @@ class SettingsTab(QWidget):
         self.config["ai_max_tokens"] = self.spin_tokens.value()
         self.config["ai_temperature"] = self.spin_temp.value()
         self.config["ai_top_p"] = self.spin_top.value()
+        self.config["tagger_cache_mb"] = self.spin_tagger_cache.value()
+        SESSION_CACHE.set_budget(self.config["tagger_cache_mb"])
+        self.config["idle_unload_minutes"] = {k: spin.value() for k, spin in self.spin_idle.items()}
+        for key, minutes in self.config["idle_unload_minutes"].items():
+            MODEL_MANAGER.set_idle_minutes(key, minutes)
+        self.config["undo_memory_mb"] = self.spin_undo_mb.value()
+        set_undo_budget(self.config["undo_memory_mb"])
+        norm_cfg = {key: chk.isChecked() for key, chk in self.chk_norm.items()}
+        norm_cfg.update({
+            "order": self.combo_norm_order.currentData(),
+            "pin_first": self.inp_norm_pin.text().strip(),
+            "alias_csv": self.inp_alias_csv.text().strip(),
+            "implication_csv": self.inp_impl_csv.text().strip(),
+            "after_autotag": self.chk_norm_autotag.isChecked(),
+            "after_caption": self.chk_norm_caption.isChecked()
+        })
+        self.config["tag_normalization"] = norm_cfg
+        tag_normalizer.configure(norm_cfg)
+        self.refresh_normalizer_label()
         
         with open(CONFIG_FILE, 'w') as f:
             json.dump(self.config, f, indent=4)
         
         QMessageBox.information(self, "Saved", "Settings saved successfully.")
 
+    # --- TAG NORMALIZATION ---
+    def browse_csv(self, line_edit):
+        path, _ = QFileDialog.getOpenFileName(self, "Select CSV Table", "", "CSV Files (*.csv);;All Files (*)")
+        if path: line_edit.setText(path)
+
+    def refresh_normalizer_label(self):
+        normalizer = tag_normalizer.get_normalizer()
+        self.lbl_norm_tables.setText(f"Loaded: {len(normalizer.aliases)} aliases, {len(normalizer.implied)} tags with implications")
+
+    # --- MODEL MEMORY ---
+    def refresh_model_table(self):
+        if not self.isVisible(): return
+        rows = MODEL_MANAGER.snapshot()
+        self.table_models.setRowCount(len(rows))
+        for i, (key, label, resident, idle, timeout, in_use) in enumerate(rows):
+            if in_use: status = "In use"
+            elif resident: status = "Loaded"
+            else: status = "Unloaded"
+            idle_txt = "-" if not resident or in_use else f"{int(idle // 60)}m {int(idle % 60)}s"
+            name_item = QTableWidgetItem(label)
+            name_item.setData(Qt.UserRole, key)
+            self.table_models.setItem(i, 0, name_item)
+            self.table_models.setItem(i, 1, QTableWidgetItem(status))
+            self.table_models.setItem(i, 2, QTableWidgetItem(f"{resident / (1024 * 1024):.0f} MB"))
+            self.table_models.setItem(i, 3, QTableWidgetItem(idle_txt))
+
+    def unload_selected_model(self):
+        row = self.table_models.currentRow()
+        if row < 0: return
+        key = self.table_models.item(row, 0).data(Qt.UserRole)
+        MODEL_MANAGER.unload_async(key)
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        self.refresh_model_table()
+
     def apply_theme(self):
         selected_theme = self.combo_theme.currentText()
         app = QApplication.instance()